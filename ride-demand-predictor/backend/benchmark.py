@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from services.analytics import parse_hours
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`; the data lives in the project's `data/` folder.
+TEST_DATA_PATH = '../../data/Test.csv'
+TRAIN_DATA_PATH = '../../data/Train.csv'
+RESULTS_PATH = './benchmark_results.json'
+
+REQUESTS_PER_SCENARIO = 500
+WARMUP_REQUESTS = 20
+ALLOCATION_SAMPLES = 100  # Requests re-run under tracemalloc, separately from the timed run
+HEATMAP_RADII = (3, 7, 12)
+BATCH_SIZE = 100
+STANDIN_ITERATIONS = 100  # The stand-in model is small; latency depends little on its size
+REGRESSION_TOLERANCE = 0.20  # Fail when p95 or throughput is this much worse than the baseline
+SEED = 42
+
+# Fallback scenarios group Test.csv points by the ring where the nearest known cell is.
+FALLBACK_RINGS = {'predict_fallback_ring1': (1,), 'predict_fallback_ring2_3': (2, 3),
+                  'predict_fallback_ring4_5': (4, 5)}
+
+
+def build_standin_model(model_dir):
+    """Trains a small model on Train.csv with the production pipeline (see train.py)."""
+    from core.config import H3_RESOLUTION
+    from services.feature_store import aggregate_order_file
+    from train import build_training_frame, save_artifacts, train
+
+    frame = build_training_frame(aggregate_order_file(TRAIN_DATA_PATH, H3_RESOLUTION))
+    model, scaler, metrics = train(frame, iterations=STANDIN_ITERATIONS, holdout=0)
+    version_info = {'version': f'benchmark-standin-{STANDIN_ITERATIONS}', 'metrics': metrics}
+    save_artifacts(model_dir, model, scaler, frame['h3_cell'].unique(), version_info)
+
+
+def load_test_points(path):
+    """Pickup coordinates, weekday and hour of every order in Test.csv."""
+    orders = pd.read_csv(path, usecols=['Pickup Lat', 'Pickup Long', 'Placement - Weekday (Mo = 1)',
+                                        'Placement - Time'])
+    return pd.DataFrame({
+        'lat': orders['Pickup Lat'].to_numpy(),
+        'lon': orders['Pickup Long'].to_numpy(),
+        'day': orders['Placement - Weekday (Mo = 1)'].to_numpy() - 1,
+        'hour': parse_hours(orders['Placement - Time']),
+    })
+
+
+def classify_points(app_module, points):
+    """Labels each point as an in-cell hit, a fallback at ring k, or no data nearby (k = -1)."""
+    from core.geo import latlng_to_uint64
+    predictor = app_module.get_predictor(app_module.require_model())
+    cells = latlng_to_uint64(points['lat'], points['lon'], app_module.config.H3_RESOLUTION)
+    rings = []
+    for cell, is_known in zip(cells.tolist(), predictor.artifacts.is_known(cells).tolist()):
+        if is_known:
+            rings.append(0)
+        else:
+            k, _ = predictor.nearest_known(cell)
+            rings.append(-1 if k is None else k)
+    return np.asarray(rings)
+
+
+def predict_request(point):
+    return ('POST', '/predict', {'json': {
+        'latitude': point.lat, 'longitude': point.lon, 'day_of_week': int(point.day),
+        'hour_of_day': int(point.hour), 'business_ratio': 0.7}})
+
+
+def heatmap_request(point, radius):
+    return ('GET', '/heatmap', {'params': {
+        'lat': point.lat, 'lon': point.lon, 'day': int(point.day), 'hour': int(point.hour), 'radius': radius}})
+
+
+def hotspots_request(point, k):
+    return ('GET', '/hotspots/top', {'params': {'day': int(point.day), 'hour': int(point.hour), 'k': k}})
+
+
+def batch_request(points):
+    return ('POST', '/predict/batch', {'json': {
+        'latitudes': points['lat'].tolist(), 'longitudes': points['lon'].tolist(),
+        'day_of_week': points['day'].astype(int).tolist(), 'hour_of_day': points['hour'].astype(int).tolist(),
+        'business_ratio': [0.7] * len(points)}})
+
+
+def build_scenarios(points, rings, n_requests, rng):
+    """
+    Request lists per scenario, sampled (with a fixed seed) from the Test.csv points.
+    Each entry is (method, path, request kwargs, expected status codes).
+    """
+    def sample(mask):
+        pool = points[mask]
+        if len(pool) == 0:
+            return None
+        return pool.iloc[rng.integers(0, len(pool), n_requests)]
+
+    scenarios = {}
+    everything = np.ones(len(points), dtype=bool)
+    # Points in Test.csv order: the natural mix of hits and fallbacks.
+    mixed = points.iloc[np.arange(n_requests) % len(points)]
+    scenarios['predict_mixed'] = [predict_request(p) + ((200, 404),) for p in mixed.itertuples()]
+    for name, mask in [('predict_hit', rings == 0)] + [
+            (name, np.isin(rings, ring_range)) for name, ring_range in FALLBACK_RINGS.items()] + [
+            ('predict_no_data', rings == -1)]:
+        sampled = sample(mask)
+        if sampled is None:
+            print(f"Skipping '{name}': no Test.csv points fall in it.")
+            continue
+        expected = (404,) if name == 'predict_no_data' else (200,)
+        scenarios[name] = [predict_request(p) + (expected,) for p in sampled.itertuples()]
+    for radius in HEATMAP_RADII:
+        scenarios[f'heatmap_r{radius}'] = [heatmap_request(p, radius) + ((200,),)
+                                           for p in sample(everything).itertuples()]
+    scenarios['hotspots_top_k50'] = [hotspots_request(p, 50) + ((200,),) for p in sample(everything).itertuples()]
+    batches = max(1, n_requests // 10)
+    scenarios[f'predict_batch_{BATCH_SIZE}'] = [
+        batch_request(points.iloc[rng.integers(0, len(points), BATCH_SIZE)]) + ((200,),) for _ in range(batches)]
+    return scenarios
+
+
+def _send(client, request):
+    method, path, kwargs, expected = request
+    response = client.request(method, path, **kwargs)
+    return response.status_code in expected
+
+
+def run_scenario(app_module, client_factory, requests, concurrency, warmup):
+    # Heatmaps start from an empty cache in every scenario, so results do not depend on order.
+    app_module.heatmap_cache.invalidate()
+    client = client_factory()
+    for request in requests[:warmup]:
+        _send(client, request)
+    app_module.heatmap_cache.invalidate()
+
+    latencies = np.empty(len(requests))
+    errors = [0]
+    errors_lock = threading.Lock()
+
+    def worker(indices):
+        worker_client = client if concurrency == 1 else client_factory()
+        failed = 0
+        for i in indices:
+            started = time.perf_counter()
+            ok = _send(worker_client, requests[i])
+            latencies[i] = time.perf_counter() - started
+            failed += not ok
+        with errors_lock:
+            errors[0] += failed
+
+    chunks = [range(start, len(requests), concurrency) for start in range(concurrency)]
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(chunks[0])
+    else:
+        threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = latencies * 1000
+    return {
+        'requests': len(requests),
+        'errors': errors[0],
+        'throughput_rps': round(len(requests) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(float(latencies_ms.mean()), 3),
+            'p50': round(float(np.percentile(latencies_ms, 50)), 3),
+            'p95': round(float(np.percentile(latencies_ms, 95)), 3),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 3),
+            'max': round(float(latencies_ms.max()), 3),
+        },
+        **measure_allocations(app_module, client, requests[:ALLOCATION_SAMPLES]),
+    }
+
+
+def measure_allocations(app_module, client, requests):
+    """
+    Peak traced Python memory and net allocated blocks per request, from a separate run
+    under tracemalloc (which slows requests down too much to time them at the same time).
+    Figures include the in-process test client.
+    """
+    app_module.heatmap_cache.invalidate()
+    peaks, blocks = [], []
+    tracemalloc.start()
+    try:
+        for request in requests:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            blocks_before = sys.getallocatedblocks()
+            _send(client, request)
+            blocks.append(sys.getallocatedblocks() - blocks_before)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kb_per_request': round(float(np.mean(peaks)) / 1024, 1),
+        'net_blocks_per_request': round(float(np.mean(blocks)), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Scenarios with more failed requests than in the baseline, or whose p95 latency or
+    throughput is worse than the baseline by more than `tolerance`.
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['errors'] > previous.get('errors', 0):
+            regressions.append(f"{name}: errors {previous.get('errors', 0)} -> {current['errors']}")
+        p95, previous_p95 = current['latency_ms']['p95'], previous['latency_ms']['p95']
+        if p95 > previous_p95 * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous_p95:.2f}ms -> {p95:.2f}ms")
+        throughput, previous_throughput = current['throughput_rps'], previous['throughput_rps']
+        if throughput < previous_throughput * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous_throughput:.0f} -> {throughput:.0f} req/s")
+    return regressions
+
+
+def run(model_dir=None, n_requests=REQUESTS_PER_SCENARIO, concurrency=1, only=None, output=RESULTS_PATH,
+        baseline_path=None, tolerance=REGRESSION_TOLERANCE):
+    for path in (TEST_DATA_PATH, TRAIN_DATA_PATH):
+        if not os.path.exists(path):
+            print(f"Error: Cannot find '{path}'.")
+            print("Please ensure the script is being run from the 'ride-demand-predictor/backend/' directory.")
+            return 1
+
+    with tempfile.TemporaryDirectory() as standin_dir:
+        # Settings are read once, on first import, so point them at the model before anything
+        # imports core.config.
+        os.environ['MODEL_DIR'] = model_dir or standin_dir
+        if model_dir is None:
+            print("Training a stand-in model on Train.csv...")
+            build_standin_model(standin_dir)
+        from fastapi.testclient import TestClient
+        import main as app_module
+
+        if app_module.model_registry.current is None:
+            print("Error: The app could not load a model.")
+            return 1
+        points = load_test_points(TEST_DATA_PATH)
+        rings = classify_points(app_module, points)
+        scenarios = build_scenarios(points, rings, n_requests, np.random.default_rng(SEED))
+        if only:
+            scenarios = {name: requests for name, requests in scenarios.items() if name in only}
+
+        results = {
+            'meta': {
+                'run_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'model_version': app_module.model_registry.current.version,
+                'requests_per_scenario': n_requests,
+                'concurrency': concurrency,
+                'seed': SEED,
+                'point_mix': {str(k): int(n) for k, n in zip(*np.unique(rings, return_counts=True))},
+            },
+            'scenarios': {},
+        }
+        with TestClient(app_module.app):  # Runs the app's startup and shutdown
+            for name, requests in scenarios.items():
+                scenario = run_scenario(app_module, lambda: TestClient(app_module.app), requests,
+                                        concurrency, WARMUP_REQUESTS)
+                results['scenarios'][name] = scenario
+                latency = scenario['latency_ms']
+                print(f"{name:28s} {scenario['throughput_rps']:8.1f} req/s  p50 {latency['p50']:7.2f}ms  "
+                      f"p95 {latency['p95']:7.2f}ms  p99 {latency['p99']:7.2f}ms  "
+                      f"{scenario['alloc_peak_kb_per_request']:8.1f} KB/req  errors {scenario['errors']}")
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {output}")
+
+    status = 0
+    failed = {name: scenario['errors'] for name, scenario in results['scenarios'].items() if scenario['errors']}
+    if failed:
+        # Failed requests are usually fast, so their timings would flatter the results.
+        print("\n❌ Requests failed in: " + ", ".join(f"{name} ({errors})" for name, errors in failed.items()))
+        status = 1
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            regressions = compare(results, json.load(f), tolerance)
+        if regressions:
+            print("\n❌ Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\n✅ No regressions against the baseline.")
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay request mixes built from Test.csv against the app in-process and report latency.")
+    parser.add_argument('--model-dir', help="Benchmark these artifacts instead of training a stand-in model.")
+    parser.add_argument('--requests', type=int, default=REQUESTS_PER_SCENARIO, help="Requests per scenario.")
+    parser.add_argument('--concurrency', type=int, default=1, help="Client threads per scenario.")
+    parser.add_argument('--only', nargs='+', help="Run only these scenarios.")
+    parser.add_argument('--output', default=RESULTS_PATH, help="Where to write the JSON results.")
+    parser.add_argument('--baseline', help="Earlier results to compare against; exits with 1 on a regression "
+                                           "(including more failed requests).")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help="Allowed relative slowdown before a scenario counts as a regression.")
+    args = parser.parse_args(argv)
+    return run(args.model_dir, args.requests, args.concurrency, args.only, args.output, args.baseline,
+               args.tolerance)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
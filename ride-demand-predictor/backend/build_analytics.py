@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import time
+
+import h3
+
+from services.analytics import aggregate_orders
+from services.geocoding import CachedGeocoder, GazetteerGeocoder, NominatimGeocoder
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`; the data lives in the project's `data/` folder.
+TRAIN_DATA_PATH = '../../data/Train.csv'
+FRONTEND_DATA_DIR = '../frontend/src'
+HOURLY_DATA_OUTPUT_PATH = os.path.join(FRONTEND_DATA_DIR, 'hourly_demand.json')
+DAILY_DATA_OUTPUT_PATH = os.path.join(FRONTEND_DATA_DIR, 'daily_demand.json')
+HOTSPOTS_OUTPUT_PATH = os.path.join(FRONTEND_DATA_DIR, 'core_hotspots.json')
+ZONE_COUNTS_OUTPUT_PATH = os.path.join(FRONTEND_DATA_DIR, 'zone_counts.json')
+
+HOTSPOT_RESOLUTION = 9  # Regional hotspots (~0.74 km² hexagons)
+ZONE_COUNT_RESOLUTIONS = (9, 7)
+TOP_HOTSPOTS = 10
+CHUNK_SIZE = 100_000
+
+# Zone names are cached per H3 cell, so only new zones are ever looked up again.
+GEOCODE_CACHE_PATH = './geocode_cache.json'
+# Optional offline gazetteer (CSV with name, latitude, longitude columns).
+GAZETTEER_PATH = './gazetteer.csv'
+UNKNOWN_NAME = 'Unknown Area'
+
+
+def write_json(path, data):
+    output_dir = os.path.dirname(path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"Saved {path}")
+
+
+def make_geocoder(mode):
+    """
+    'http': cache, then the local gazetteer (if present), then rate-limited Nominatim.
+    'offline': cache, then the local gazetteer only (no network).
+    'none': do not name zones.
+    """
+    if mode == 'none':
+        return None
+    backends = []
+    if os.path.exists(GAZETTEER_PATH):
+        backends.append(GazetteerGeocoder(GAZETTEER_PATH))
+    elif mode == 'offline':
+        print(f"Warning: no gazetteer at '{GAZETTEER_PATH}'; only cached names will be used.")
+    if mode == 'http':
+        backends.append(NominatimGeocoder())
+    return CachedGeocoder(GEOCODE_CACHE_PATH, backends)
+
+
+def build_hotspots(aggregates, geocoder, top_n=TOP_HOTSPOTS, resolution=HOTSPOT_RESOLUTION):
+    top_zones = aggregates.top_cells(resolution, top_n)
+    cells = [h3_cell for h3_cell, _ in top_zones]
+    print(f"\nResolving names for the top {len(cells)} zones...")
+    names = geocoder.names_for_cells(cells) if geocoder else [None] * len(cells)
+
+    hotspots = []
+    for (h3_cell, count), name in zip(top_zones, names):
+        lat, lon = h3.cell_to_latlng(h3_cell)
+        hotspots.append({
+            "name": name or UNKNOWN_NAME,
+            "h3_cell": h3_cell,
+            "latitude": lat,
+            "longitude": lon,
+            "ride_count": int(count)
+        })
+    return hotspots
+
+
+def name_zone_counts(zone_counts, geocoder, top_n):
+    """Adds a name to the top zones at every resolution, with one cache/backend pass."""
+    top_entries = [entry for entries in zone_counts.values() for entry in entries[:top_n]]
+    names = geocoder.names_for_cells([entry['h3_cell'] for entry in top_entries])
+    for entry, name in zip(top_entries, names):
+        entry['name'] = name or UNKNOWN_NAME
+    return zone_counts
+
+
+def run(train_path=TRAIN_DATA_PATH, chunksize=CHUNK_SIZE, charts=True, hotspots=True, top_n=TOP_HOTSPOTS,
+        geocoder_mode='http', named_zones=0):
+    """Reads the orders once and writes every requested analytics file."""
+    if not os.path.exists(train_path):
+        print(f"Error: Cannot find training data at '{train_path}'.")
+        print("Please ensure the script is being run from the 'ride-demand-predictor/backend/' directory.")
+        return
+
+    resolutions = set(ZONE_COUNT_RESOLUTIONS) | {HOTSPOT_RESOLUTION}
+    print(f"Aggregating orders from '{train_path}' in chunks of {chunksize} rows...")
+    started = time.perf_counter()
+    aggregates = aggregate_orders(train_path, resolutions, chunksize)
+    elapsed = time.perf_counter() - started
+    print(f"Aggregated {aggregates.rows} rides in {elapsed:.2f}s.")
+
+    geocoder = make_geocoder(geocoder_mode)
+    if charts:
+        write_json(HOURLY_DATA_OUTPUT_PATH, aggregates.hourly_demand())
+        write_json(DAILY_DATA_OUTPUT_PATH, aggregates.daily_demand())
+        zone_counts = aggregates.zone_counts()
+        if geocoder and named_zones > 0:
+            zone_counts = name_zone_counts(zone_counts, geocoder, named_zones)
+        write_json(ZONE_COUNTS_OUTPUT_PATH, zone_counts)
+    if hotspots:
+        write_json(HOTSPOTS_OUTPUT_PATH, build_hotspots(aggregates, geocoder, top_n))
+    if geocoder:
+        print(f"Geocoding: {geocoder.hits} cached, {geocoder.misses} looked up.")
+
+    print("\n✅ Analytics data generated successfully!")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the frontend analytics files in one pass over the orders.")
+    parser.add_argument('--input', default=TRAIN_DATA_PATH, help="Order CSV (same columns as Train.csv).")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Rows read per chunk.")
+    parser.add_argument('--top', type=int, default=TOP_HOTSPOTS, help="Number of named hotspots.")
+    parser.add_argument('--skip-hotspots', action='store_true', help="Do not rebuild core_hotspots.json.")
+    parser.add_argument('--only-hotspots', action='store_true', help="Only rebuild core_hotspots.json.")
+    parser.add_argument('--geocoder', choices=['http', 'offline', 'none'], default='http',
+                        help="How to name zones missing from the cache (see make_geocoder).")
+    parser.add_argument('--named-zones', type=int, default=0,
+                        help="Also name the top N zones per resolution in zone_counts.json.")
+    args = parser.parse_args(argv)
+    run(args.input, args.chunksize, charts=not args.only_hotspots, hotspots=not args.skip_hotspots,
+        top_n=args.top, geocoder_mode=args.geocoder, named_zones=args.named_zones)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import json
+import os
+import time
+
+from core import config
+from services.neighbor_index import NeighborIndex
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`. The index is saved next to h3_categories.json.
+H3_MAP_PATH = os.path.join(config.MODEL_DIR, 'h3_categories.json')
+OUTPUT_DIR = config.NEIGHBOR_INDEX_DIR
+
+
+def main():
+    if not os.path.exists(H3_MAP_PATH):
+        print(f"Error: Cannot find the known cell list at '{H3_MAP_PATH}'.")
+        return
+
+    with open(H3_MAP_PATH, 'r') as f:
+        known_h3_cells = list(json.load(f).keys())
+
+    print(f"Building nearest-known-cell index for {len(known_h3_cells)} cells "
+          f"(up to {config.FALLBACK_MAX_RING} rings)...")
+    started = time.perf_counter()
+    index = NeighborIndex.build(known_h3_cells, max_ring=config.FALLBACK_MAX_RING)
+    print(f"Indexed {len(index.cells)} cells in {time.perf_counter() - started:.1f}s.")
+
+    index.save(OUTPUT_DIR)
+    print(f"\n✅ Neighbor index saved to '{OUTPUT_DIR}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from core import config
+from core.geo import latlng_to_uint64
+from services.analytics import parse_hours
+from services.od_matrix import FlowAggregator, ODMatrix
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`; the data lives in the project's `data/` folder.
+TRAIN_DATA_PATH = '../../data/Train.csv'
+CHUNK_SIZE = 100_000
+
+# Only the columns the flows need, with compact dtypes.
+TRIP_COLUMNS = {
+    'Placement - Weekday (Mo = 1)': 'int8',
+    'Placement - Time': 'object',
+    'Pickup Lat': 'float64',
+    'Pickup Long': 'float64',
+    'Destination Lat': 'float64',
+    'Destination Long': 'float64',
+    'Distance (KM)': 'float64',
+}
+
+
+def aggregate_trips(path, resolution, chunksize=CHUNK_SIZE):
+    """Streams an order CSV in chunks into per-(day, hour, origin, destination) trip counts."""
+    aggregator = FlowAggregator()
+    for chunk in pd.read_csv(path, usecols=list(TRIP_COLUMNS), dtype=TRIP_COLUMNS, chunksize=chunksize):
+        aggregator.add(
+            latlng_to_uint64(chunk['Pickup Lat'], chunk['Pickup Long'], resolution),
+            latlng_to_uint64(chunk['Destination Lat'], chunk['Destination Long'], resolution),
+            # Weekdays are 1-indexed in the data; use 0=Monday, 6=Sunday like the rest of the app.
+            chunk['Placement - Weekday (Mo = 1)'].to_numpy().astype(int) - 1,
+            parse_hours(chunk['Placement - Time']),
+            chunk['Distance (KM)'].to_numpy(),
+        )
+    return aggregator
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the zone-to-zone trip matrix served on /od/*.")
+    parser.add_argument('--input', default=TRAIN_DATA_PATH, help="Order CSV (same columns as Train.csv).")
+    parser.add_argument('--output', default=config.OD_MATRIX_DIR, help="Directory to write the matrix to.")
+    parser.add_argument('--resolution', type=int, default=config.OD_RESOLUTION, help="H3 resolution of the zones.")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Rows read per chunk.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: Cannot find order data at '{args.input}'.")
+        return
+
+    print(f"Counting trips between resolution-{args.resolution} zones in '{args.input}'...")
+    started = time.perf_counter()
+    matrix = ODMatrix.build(aggregate_trips(args.input, args.resolution, args.chunksize), args.resolution)
+    stats = matrix.stats()
+    print(f"{stats['trips']} trips, {stats['flows']} flows between {stats['zones']} zones "
+          f"({stats['size_bytes'] / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s.")
+
+    matrix.save(args.output)
+    print(f"\n✅ OD matrix saved to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
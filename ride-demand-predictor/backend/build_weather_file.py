@@ -0,0 +1,85 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import config
+from core.geo import latlng_to_uint64, uint64_to_cells
+from services.analytics import parse_hours
+from services.weather_service import write_weather_file
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`; the data lives in the project's `data/` folder.
+TRAIN_DATA_PATH = '../../data/Train.csv'
+CHUNK_SIZE = 100_000
+
+# Only the columns the weather needs, with compact dtypes.
+WEATHER_COLUMNS = {
+    'Placement - Weekday (Mo = 1)': 'int8',
+    'Placement - Time': 'object',
+    'Pickup Lat': 'float64',
+    'Pickup Long': 'float64',
+    'Temperature': 'float64',
+    'Precipitation in millimeters': 'float64',
+}
+KEY_COLUMNS = ['region', 'day_of_week', 'hour_of_day']
+
+
+def aggregate_weather(path, resolution, chunksize=CHUNK_SIZE):
+    """
+    Mean temperature and precipitation per (region, day, hour) over the orders in a CSV.
+    Orders without a precipitation reading count as dry; those without a temperature are left out of its mean.
+    """
+    partials = []
+    for chunk in pd.read_csv(path, usecols=list(WEATHER_COLUMNS), dtype=WEATHER_COLUMNS, chunksize=chunksize):
+        temperature = chunk['Temperature']
+        orders = pd.DataFrame({
+            'region': latlng_to_uint64(chunk['Pickup Lat'], chunk['Pickup Long'], resolution),
+            # Weekdays are 1-indexed in the data; use 0=Monday, 6=Sunday like the rest of the app.
+            'day_of_week': chunk['Placement - Weekday (Mo = 1)'].to_numpy().astype(np.int64) - 1,
+            'hour_of_day': parse_hours(chunk['Placement - Time']),
+            'temperature_sum': temperature.fillna(0).to_numpy(),
+            'temperature_count': temperature.notna().to_numpy().astype(np.int64),
+            'precipitation_sum': chunk['Precipitation in millimeters'].fillna(0).to_numpy(),
+            'orders': 1,
+        })
+        partials.append(orders.groupby(KEY_COLUMNS, as_index=False).sum())
+    totals = pd.concat(partials, ignore_index=True).groupby(KEY_COLUMNS, as_index=False).sum()
+    return pd.DataFrame({
+        'region': uint64_to_cells(totals['region'].to_numpy()),
+        'day_of_week': totals['day_of_week'],
+        'hour_of_day': totals['hour_of_day'],
+        'temperature': (totals['temperature_sum'] / totals['temperature_count'].replace(0, np.nan)).round(2),
+        'precipitation_mm': (totals['precipitation_sum'] / totals['orders']).round(3),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the local weather file (a stand-in for a forecast service) from order data.")
+    parser.add_argument('--input', default=TRAIN_DATA_PATH, help="Order CSV (same columns as Train.csv).")
+    parser.add_argument('--output', default=config.WEATHER_FILE, help="Weather CSV to write.")
+    parser.add_argument('--resolution', type=int, default=config.WEATHER_RESOLUTION,
+                        help="H3 resolution of the weather regions.")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Rows read per chunk.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: Cannot find order data at '{args.input}'.")
+        return
+
+    print(f"Averaging weather per resolution-{args.resolution} region and hour in '{args.input}'...")
+    started = time.perf_counter()
+    weather = aggregate_weather(args.input, args.resolution, args.chunksize)
+    print(f"{len(weather)} (region, day, hour) rows over {weather['region'].nunique()} regions "
+          f"in {time.perf_counter() - started:.1f}s.")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    write_weather_file(weather, args.output)
+    print(f"\n✅ Weather file saved to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import json
+import os
+import time
+
+import joblib
+
+from core import config
+from services.model_registry import (CATEGORIES_FILE, FAST_STAMP_FILE, KNOWN_CELLS_FILE, MODEL_CBM_FILE,
+                                     MODEL_FILE, SCALER_FILE, SCALER_PARAMS_FILE, VERSION_FILE, read_version,
+                                     save_fast_artifacts)
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`. Writes the fast-loading copies of the
+# artifacts (see services/model_registry.py) next to the originals, which are kept.
+# They are stamped with the model version, and an unstamped set gets a version file
+# (a hash of the originals), so the API only uses them while they match the originals.
+MODEL_DIR = config.MODEL_DIR
+
+
+def main():
+    paths = [os.path.join(MODEL_DIR, name) for name in (MODEL_FILE, SCALER_FILE, CATEGORIES_FILE)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        print(f"Error: Cannot find the model artifacts {missing}.")
+        return
+
+    model = joblib.load(paths[0])
+    scaler = joblib.load(paths[1])
+    with open(paths[2], 'r') as f:
+        known_h3_cells = list(json.load(f).keys())
+
+    started = time.perf_counter()
+    version = read_version(MODEL_DIR, paths)
+    save_fast_artifacts(MODEL_DIR, model, scaler, known_h3_cells, version)
+    version_path = os.path.join(MODEL_DIR, VERSION_FILE)
+    if not os.path.exists(version_path):
+        with open(version_path, 'w') as f:
+            json.dump({'version': version}, f, indent=2)
+    print(f"Converted {len(known_h3_cells)} cells and the model in {time.perf_counter() - started:.2f}s.")
+    print(f"\n✅ Saved {MODEL_CBM_FILE}, {SCALER_PARAMS_FILE}, {KNOWN_CELLS_FILE} and {FAST_STAMP_FILE} "
+          f"(version {version}) to '{MODEL_DIR}'.")
+
+
+if __name__ == '__main__':
+    main()
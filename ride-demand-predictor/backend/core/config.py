@@ -0,0 +1,119 @@
+import os
+from dotenv import load_dotenv
+
+# Settings are read from the environment (or a local .env file) once, at import time.
+load_dotenv()
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- Model artifacts ---
+MODEL_DIR = os.getenv("MODEL_DIR", "./ml_models/")
+H3_RESOLUTION = 12  # The resolution the model was trained on
+FALLBACK_MAX_RING = 5  # How many rings to search for a known cell before giving up
+# Precomputed nearest-known-cell index (built offline with build_neighbor_index.py).
+NEIGHBOR_INDEX_DIR = os.getenv("NEIGHBOR_INDEX_DIR", os.path.join(MODEL_DIR, "neighbor_index"))
+# When set, derived tables (demand cube, pyramid, hotspot index) are written here once per
+# model version and memory-mapped, so worker processes share one copy. Empty disables it.
+SHARED_TABLES_DIR = os.getenv("SHARED_TABLES_DIR", "")
+
+# --- Model reloads ---
+# New artifacts in MODEL_DIR are loaded, validated and warmed up in the background, then
+# swapped in. Reloads are triggered with POST /model/reload, or by watching the files.
+MODEL_WATCH_INTERVAL_SECONDS = float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "0"))  # 0 disables the watcher
+MODEL_WARMUP_ROWS = int(os.getenv("MODEL_WARMUP_ROWS", "256"))  # Synthetic rows scored before a swap
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Admin endpoints need a matching X-Admin-Token header; empty disables them
+
+# --- Batch predictions ---
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# --- Demand cube (precomputed predictions) ---
+# When enabled, the model is evaluated once at startup over every known cell, weekday,
+# hour and a grid of business ratios, and requests are answered by indexing. By default the
+# grid follows the model's business_ratio split borders, so lookups match the model exactly;
+# otherwise it is uniform and lookups interpolate (the measured error is on /demand-cube).
+DEMAND_CUBE_ENABLED = _env_flag("DEMAND_CUBE_ENABLED")
+DEMAND_CUBE_MODEL_BORDERS = _env_flag("DEMAND_CUBE_MODEL_BORDERS", True)
+DEMAND_CUBE_RATIO_STEPS = int(os.getenv("DEMAND_CUBE_RATIO_STEPS", "11"))  # Uniform grid: 0.0, 0.1, ..., 1.0
+DEMAND_CUBE_DTYPE = os.getenv("DEMAND_CUBE_DTYPE", "float32")  # or "float16" to halve memory
+DEMAND_CUBE_VALIDATION_SAMPLES = int(os.getenv("DEMAND_CUBE_VALIDATION_SAMPLES", "2000"))
+
+# --- Inference micro-batching ---
+# Coalesces model calls from concurrent requests. Not used when the demand cube is enabled,
+# since cube lookups never reach the model.
+INFERENCE_BATCHING_ENABLED = _env_flag("INFERENCE_BATCHING_ENABLED")
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "2"))
+INFERENCE_MAX_BATCH_ROWS = int(os.getenv("INFERENCE_MAX_BATCH_ROWS", "4096"))
+INFERENCE_RESULT_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_RESULT_TIMEOUT_SECONDS", "30"))  # Longest wait for a batch
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "0"))  # 0 keeps the default (40 threads)
+
+# --- Heatmap response cache ---
+HEATMAP_CACHE_SIZE = int(os.getenv("HEATMAP_CACHE_SIZE", "2048"))  # 0 disables the cache
+HEATMAP_CACHE_TTL_SECONDS = float(os.getenv("HEATMAP_CACHE_TTL_SECONDS", "0"))  # 0 means no expiry
+
+# --- Weekly demand profiles ---
+# Each profile is 7x24 float32 values (672 bytes), cached per (model version, cell, business ratio).
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "4096"))  # 0 disables the cache
+PROFILE_MAX_LOCATIONS = int(os.getenv("PROFILE_MAX_LOCATIONS", "20"))
+
+# --- Viewport heatmaps ---
+# Resolutions of the demand pyramid: the model's resolution plus the coarser levels
+# that demand is summed into (res 9 matches the zones in generate_hotspots.py).
+PYRAMID_RESOLUTIONS = tuple(int(r) for r in os.getenv("PYRAMID_RESOLUTIONS", "12,10,9,7").split(","))
+VIEWPORT_MAX_CELLS = int(os.getenv("VIEWPORT_MAX_CELLS", "5000"))
+
+# --- Pushed heatmap updates ---
+# Clients subscribe to a viewport over a WebSocket and are sent only the cells whose
+# demand changed by more than HEATMAP_PUSH_MIN_CHANGE (relative) since they last got them.
+HEATMAP_PUSH_MAX_SUBSCRIBERS = int(os.getenv("HEATMAP_PUSH_MAX_SUBSCRIBERS", "500"))  # 0 disables subscriptions
+HEATMAP_PUSH_MIN_CHANGE = float(os.getenv("HEATMAP_PUSH_MIN_CHANGE", "0.05"))
+HEATMAP_PUSH_UTC_OFFSET_HOURS = float(os.getenv("HEATMAP_PUSH_UTC_OFFSET_HOURS", "3"))  # Nairobi time, for the hour rollover
+# Per connection: viewport messages are applied at most this often (the latest wins), and a
+# client with more unread updates than HEATMAP_PUSH_MAX_QUEUED is sent one snapshot instead.
+HEATMAP_PUSH_MIN_INTERVAL_SECONDS = float(os.getenv("HEATMAP_PUSH_MIN_INTERVAL_SECONDS", "0.25"))
+HEATMAP_PUSH_MAX_QUEUED = int(os.getenv("HEATMAP_PUSH_MAX_QUEUED", "16"))
+
+# --- Top hotspots ---
+# The best HOTSPOTS_MAX_K cells of every pyramid level ranked by demand per (day, hour), for
+# GET /hotspots/top. Built on the first request, or while a model loads when enabled.
+HOTSPOT_INDEX_AT_LOAD = _env_flag("HOTSPOT_INDEX_AT_LOAD")
+HOTSPOTS_MAX_K = int(os.getenv("HOTSPOTS_MAX_K", "500"))
+
+# --- Origin-destination flows ---
+# Zone-to-zone trips per (day, hour), built offline with build_od_matrix.py.
+OD_RESOLUTION = int(os.getenv("OD_RESOLUTION", "9"))  # Same zones as generate_hotspots.py
+OD_MATRIX_DIR = os.getenv("OD_MATRIX_DIR", os.path.join(MODEL_DIR, "od_matrix"))
+OD_MAX_K = int(os.getenv("OD_MAX_K", "100"))
+
+# --- Weather ---
+# For models trained with weather features (train.py --weather). Conditions are looked up
+# per coarse region and hour from an in-memory cache that a background thread fills and
+# refreshes; a prediction never waits for them (missing weather is scored as unknown).
+WEATHER_ENABLED = _env_flag("WEATHER_ENABLED")
+WEATHER_FILE = os.getenv("WEATHER_FILE", os.path.join(MODEL_DIR, "weather.csv"))  # Local stand-in provider
+WEATHER_RESOLUTION = int(os.getenv("WEATHER_RESOLUTION", "7"))  # H3 resolution of the weather regions
+WEATHER_TTL_SECONDS = float(os.getenv("WEATHER_TTL_SECONDS", "1800"))
+WEATHER_REFRESH_SECONDS = float(os.getenv("WEATHER_REFRESH_SECONDS", "60"))  # How often expiring entries are refetched
+
+# --- Live analytics ---
+# Hourly and daily demand and the busiest zones, counted from ride events as they arrive
+# (POST /events/rides, or lines appended to LIVE_EVENTS_FILE) over a sliding window.
+LIVE_ANALYTICS_ENABLED = _env_flag("LIVE_ANALYTICS_ENABLED")
+LIVE_WINDOW_HOURS = int(os.getenv("LIVE_WINDOW_HOURS", "168"))  # One week of hourly buckets
+LIVE_RESOLUTIONS = tuple(int(r) for r in os.getenv("LIVE_RESOLUTIONS", "9,7").split(","))
+LIVE_MAX_CELLS = int(os.getenv("LIVE_MAX_CELLS", "2048"))  # Cells tracked per resolution
+LIVE_UTC_OFFSET_HOURS = float(os.getenv("LIVE_UTC_OFFSET_HOURS", "3"))  # Nairobi time, for hours and weekdays
+LIVE_EVENTS_FILE = os.getenv("LIVE_EVENTS_FILE", "")  # JSON lines to follow; empty disables the tailer
+LIVE_EVENTS_POLL_SECONDS = float(os.getenv("LIVE_EVENTS_POLL_SECONDS", "1"))
+LIVE_EVENTS_MAX_ITEMS = int(os.getenv("LIVE_EVENTS_MAX_ITEMS", "1000"))  # Events per POST
+
+# --- Logging ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Fraction of per-request events (e.g. fallbacks to a neighbouring cell) that are logged.
+# Errors and startup messages are always logged; per-request numbers are on /metrics.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# --- Response encoding ---
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "0"))  # 0 disables gzip
@@ -0,0 +1,132 @@
+from typing import List
+
+import h3
+import h3.api.numpy_int as h3_int
+import numpy as np
+
+# Bit layout of an H3 cell index (see the H3 docs): resolution in bits 52-55, then one
+# 3-bit digit per resolution 1-15, where unused digits are all ones.
+_RESOLUTION_SHIFT = np.uint64(52)
+_RESOLUTION_MASK = np.uint64(0xF << 52)
+_MODE_SHIFT = np.uint64(59)
+_CELL_MODE = 1
+
+
+def latlng_to_uint64(latitudes, longitudes, resolution: int) -> np.ndarray:
+    """
+    Converts arrays of coordinates to uint64 H3 cells in one pass.
+    Repeated coordinates (common in order data) are only converted once.
+    """
+    # Each (lat, lng) pair as one complex number: a 1-D sort is much faster than np.unique(axis=0).
+    coords = np.asarray(latitudes, dtype=np.float64) + 1j * np.asarray(longitudes, dtype=np.float64)
+    if len(coords) == 0:
+        return np.empty(0, dtype=np.uint64)
+    unique_coords, inverse = np.unique(coords, return_inverse=True)
+    unique_cells = np.fromiter((h3_int.latlng_to_cell(coord.real, coord.imag, resolution)
+                                for coord in unique_coords.tolist()),
+                               dtype=np.uint64, count=len(unique_coords))
+    return unique_cells[inverse.ravel()]
+
+
+def latlng_to_cells(latitudes, longitudes, resolution: int) -> List[str]:
+    """Same as latlng_to_uint64, as hex strings."""
+    return uint64_to_cells(latlng_to_uint64(latitudes, longitudes, resolution))
+
+
+def cells_to_uint64(h3_cells: List[str]) -> np.ndarray:
+    """Converts hex H3 strings to their uint64 representation."""
+    return np.fromiter((int(cell, 16) for cell in h3_cells), dtype=np.uint64, count=len(h3_cells))
+
+
+def uint64_to_cells(values: np.ndarray) -> List[str]:
+    """Converts uint64 H3 cells back to hex strings."""
+    return [format(value, 'x') for value in np.asarray(values, dtype=np.uint64).tolist()]
+
+
+def cell_resolutions(cells: np.ndarray) -> np.ndarray:
+    return ((np.asarray(cells, dtype=np.uint64) & _RESOLUTION_MASK) >> _RESOLUTION_SHIFT).astype(np.int8)
+
+
+def are_cells(cells: np.ndarray) -> np.ndarray:
+    """True where a uint64 value is in H3 cell mode (a cheap check, not full validation)."""
+    return (np.asarray(cells, dtype=np.uint64) >> _MODE_SHIFT) == _CELL_MODE
+
+
+def cells_to_parents(cells: np.ndarray, resolution: int) -> np.ndarray:
+    """Parents of uint64 cells (all at a finer resolution) by rewriting their index bits."""
+    unused_digits = 0
+    for digit in range(resolution + 1, 16):
+        unused_digits |= 7 << (3 * (15 - digit))
+    cells = np.asarray(cells, dtype=np.uint64)
+    return (cells & ~_RESOLUTION_MASK) | np.uint64((resolution << 52) | unused_digits)
+
+
+def grid_disk(cell: int, k: int) -> np.ndarray:
+    """uint64 cells within `k` rings of a cell, including it."""
+    return np.asarray(h3_int.grid_disk(int(cell), k), dtype=np.uint64)
+
+
+def isin_sorted(values: np.ndarray, sorted_set: np.ndarray) -> np.ndarray:
+    """Membership of `values` in a sorted uint64 array, by binary search."""
+    values = np.asarray(values, dtype=np.uint64)
+    if len(sorted_set) == 0:
+        return np.zeros(values.shape, dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_set, values), len(sorted_set) - 1)
+    return sorted_set[positions] == values
+
+
+def padded_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: int):
+    """
+    A bounding box grown by one cell edge, so that hexagons cut by its border (whose centers
+    fall just outside) are included. Returns (south, west, north, east).
+    """
+    pad_lat = h3.average_hexagon_edge_length(resolution, 'km') / 111.32
+    pad_lon = pad_lat / max(np.cos(np.radians((min_lat + max_lat) / 2)), 1e-6)
+    return min_lat - pad_lat, min_lon - pad_lon, max_lat + pad_lat, max_lon + pad_lon
+
+
+def bbox_to_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: int) -> np.ndarray:
+    """
+    uint64 cells covering a bounding box (padded, see padded_bbox). The fill enumerates every
+    cell in the box, so callers should only use it for boxes of a bounded size; boxes spanning
+    180 degrees of longitude or more are rejected, since H3 would fill them the other way round.
+    """
+    if max_lon - min_lon >= 180:
+        raise ValueError("Boxes spanning 180 degrees of longitude or more cannot be filled.")
+    south, west, north, east = padded_bbox(min_lat, min_lon, max_lat, max_lon, resolution)
+    polygon = h3.LatLngPoly([(south, west), (south, east), (north, east), (north, west)])
+    return np.asarray(h3_int.polygon_to_cells(polygon, resolution), dtype=np.uint64)
+
+
+def centers_in_bbox(latitudes: np.ndarray, longitudes: np.ndarray, min_lat: float, min_lon: float,
+                    max_lat: float, max_lon: float, resolution: int) -> np.ndarray:
+    """
+    Which cell centers fall inside a bounding box (padded, see padded_bbox): the same cells
+    bbox_to_cells would give, out of a known set, without enumerating the box.
+    """
+    south, west, north, east = padded_bbox(min_lat, min_lon, max_lat, max_lon, resolution)
+    return (latitudes >= south) & (latitudes <= north) & (longitudes >= west) & (longitudes <= east)
+
+
+def cell_centers(cells: np.ndarray):
+    """(latitudes, longitudes) of the centers of uint64 cells."""
+    cells = np.asarray(cells, dtype=np.uint64)
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in cells.tolist()], dtype=np.float64).reshape(-1, 2)
+    return centers[:, 0], centers[:, 1]
+
+
+def estimate_bbox_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: int) -> float:
+    """Rough number of cells a bounding box covers at a resolution, without enumerating them."""
+    height_km = (max_lat - min_lat) * 111.32
+    width_km = (max_lon - min_lon) * 111.32 * np.cos(np.radians((min_lat + max_lat) / 2))
+    return abs(height_km * width_km) / h3.average_hexagon_area(resolution, 'km^2')
+
+
+def tile_to_bbox(z: int, x: int, y: int):
+    """Bounds (min_lat, min_lon, max_lat, max_lon) of a z/x/y web map tile."""
+    n = 2 ** z
+
+    def tile_lat(tile_y):
+        return float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * tile_y / n)))))
+
+    return tile_lat(y + 1), x / n * 360.0 - 180.0, tile_lat(y), (x + 1) / n * 360.0 - 180.0
@@ -0,0 +1,38 @@
+import logging
+import random
+import sys
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# Loggers of this app's own code; libraries stay at the root logger's WARNING level.
+APP_LOGGERS = ("ridepulse", "core", "services")
+
+
+def configure_logging(level: str = "INFO"):
+    """Sends log records to stdout, at `level` for the app's own loggers."""
+    logging.basicConfig(format=LOG_FORMAT, stream=sys.stdout)
+    for name in APP_LOGGERS:
+        logging.getLogger(name).setLevel(level.upper())
+
+
+class SampledLogger:
+    """
+    Logs a random `rate` fraction of events, for messages that would otherwise be written
+    on every request. Arguments are only formatted for the events that are kept.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        self.logger = logger
+        self.rate = rate
+
+    def log(self, level: int, msg: str, *args):
+        if self.rate > 0 and self.logger.isEnabledFor(level) and random.random() < self.rate:
+            self.logger.log(level, msg, *args)
+
+    def debug(self, msg: str, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args):
+        self.log(logging.WARNING, msg, *args)
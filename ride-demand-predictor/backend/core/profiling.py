@@ -0,0 +1,99 @@
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def memory_usage() -> Optional[Dict[str, float]]:
+    """
+    Resident memory of this process in MB, split into pages shared with other processes
+    (e.g. forked workers, memory-mapped files) and pages private to it. `pss_mb` counts
+    each shared page divided by the number of processes using it, so summing it over
+    workers gives their real total. Linux only; None elsewhere.
+    """
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1),
+        "private_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 1),
+    }
+
+
+class StartupProfile:
+    """
+    Milliseconds spent in each startup phase, the time to the first served prediction and
+    peak RSS. The clock starts when this module is first imported, so interpreter startup
+    itself is not included.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last_mark = self.started
+        self.phases: Dict[str, float] = {}
+        self.ready_ms: Optional[float] = None
+        self.first_prediction_ms: Optional[float] = None
+
+    def _since_start_ms(self, now: float) -> float:
+        return round((now - self.started) * 1000, 1)
+
+    def mark(self, name: str):
+        """Records the time since the previous mark or phase as `name`."""
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last_mark) * 1000, 1)
+        self._last_mark = now
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self.phases[name] = round((now - started) * 1000, 1)
+            self._last_mark = now
+
+    def mark_ready(self):
+        self.ready_ms = self._since_start_ms(time.perf_counter())
+
+    def mark_first_prediction(self):
+        if self.first_prediction_ms is None:
+            self.first_prediction_ms = self._since_start_ms(time.perf_counter())
+
+    def report(self) -> dict:
+        return {
+            "phases_ms": dict(self.phases),
+            "ready_ms": self.ready_ms,
+            "first_prediction_ms": self.first_prediction_ms,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {ms:.0f}ms" for name, ms in self.phases.items())
+        return f"ready in {self.ready_ms:.0f}ms ({phases}), peak RSS {peak_rss_mb()} MB"
+
+
+# Shared by the app's startup code; importing this module first starts the clock.
+startup_profile = StartupProfile()
@@ -0,0 +1,21 @@
+import gc
+import os
+
+# Run from `ride-demand-predictor/backend/`:
+#
+#     gunicorn -c gunicorn.conf.py main:app
+#
+# The app (model, scaler, known cells and the tables prepared with them) is loaded once
+# in the master process, then the workers are forked from it and share those pages for as
+# long as nobody writes to them. Check each worker's private and shared memory on /memory.
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Objects loaded so far are moved out of the garbage collector's reach: otherwise the
+    # first collection in each worker writes to all of them and un-shares their pages.
+    gc.freeze()
@@ -1,20 +1,87 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-import pandas as pd
-import joblib
-import json
+from core.profiling import startup_profile  # Imported first: starts the startup clock
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+import numpy as np
 import os
-import h3 
-from catboost import Pool
+import secrets
+import h3.api.numpy_int as h3_int
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
+from pydantic import ValidationError, confloat
+import anyio
+import asyncio
+import logging
+
+from core import config
+from core.log import SampledLogger, configure_logging
+from core.profiling import memory_usage
+from core.geo import latlng_to_uint64, uint64_to_cells, tile_to_bbox
+from schemas.prediction import (BatchPredictionInput, BatchPredictionOutput, DailyDemand, DemandProfileOutput,
+                                HeatmapOutput, HeatmapSubscriptionInput, HourlyDemand, LiveZone, NetFlowOutput, PredictionInput,
+                                PredictionOutput, RideEventBatch, RideEventResult, ViewportHeatmapOutput,
+                                ZoneFlowOutput)
+from services.demand_cube import DemandCube
+from services import neighbor_index
+from services.response_cache import ResponseCache
+from services.inference_batcher import InferenceBatcher
+from services import wire_format
+from services.demand_pyramid import DemandPyramid
+from services.hotspot_index import HotspotIndex
+from services.heatmap_push import HeatmapConnection, HeatmapHub
+from services import shared_tables
+from services.model_registry import ModelArtifacts, ModelRegistry
+from services.prediction_service import Predictor
+from services.od_matrix import ODMatrix, ODMatrixStore
+from services.weather_service import FileWeatherProvider, WeatherCache
+from services.live_aggregates import EventFileTailer, LiveAggregates, to_epoch_seconds
+from services import metrics
+from services.metrics import time_stage
+
+startup_profile.mark("imports")
+
+configure_logging(config.LOG_LEVEL)
+logger = logging.getLogger("ridepulse")
+# Per-request events are sampled; their counts and timings are exported on /metrics.
+request_logger = SampledLogger(logger, config.LOG_SAMPLE_RATE)
 
 
 #Application Setup 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.THREADPOOL_SIZE > 0:
+        # Sync endpoints run in this pool; a bigger pool lets more requests queue for one batch.
+        anyio.to_thread.current_default_thread_limiter().total_tokens = config.THREADPOOL_SIZE
+    if inference_batcher is not None:
+        inference_batcher.start()
+    if weather_cache is not None:
+        weather_cache.start()
+    if event_tailer is not None:
+        event_tailer.start()
+    heatmap_hub.start()
+    if config.MODEL_WATCH_INTERVAL_SECONDS > 0:
+        model_registry.start_watching(config.MODEL_WATCH_INTERVAL_SECONDS)
+    memory = memory_usage()
+    if memory is not None:
+        logger.info("✅ Worker %d serving: %.1f MB private, %.1f MB shared.",
+                    os.getpid(), memory["private_mb"], memory["shared_mb"])
+    yield
+    model_registry.stop_watching()
+    if inference_batcher is not None:
+        inference_batcher.stop()
+    if weather_cache is not None:
+        weather_cache.stop()
+    if event_tailer is not None:
+        event_tailer.stop()
+    heatmap_hub.stop()
+
+
 app = FastAPI(
     title="RidePulse Nairobi - Demand Predictor API",
     description="Predicts boda-boda ride demand for specific hexagonal zones in Nairobi.",
-    version="1.1.0" # Version bump for new feature
+    version="1.1.0", # Version bump for new feature
+    lifespan=lifespan,
 )
 
  
@@ -34,184 +101,839 @@ app.add_middleware(
     allow_origins=["*"], 
     allow_headers=["*"],
 )
+
+# Optional gzip for clients that send `Accept-Encoding: gzip` (e.g. riders on slow networks)
+if config.RESPONSE_GZIP_MIN_BYTES > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=config.RESPONSE_GZIP_MIN_BYTES)
+# Outermost, so it times everything above (see GET /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
 # ---------------------------------------------------------
 
-#Pydantic Schemas 
-class PredictionInput(BaseModel):
-    latitude: float = Field(..., example=-1.2843, description="Latitude of the location.")
-    longitude: float = Field(..., example=36.8248, description="Longitude of the location.")
-    day_of_week: int = Field(..., ge=0, le=6, example=2, description="Day of the week (0=Monday, 6=Sunday).")
-    hour_of_day: int = Field(..., ge=0, le=23, example=16, description="Hour of the day (0-23).")
-    business_ratio: float = Field(..., ge=0.0, le=1.0, example=0.95, description="Estimated ratio of business rides (0.0 to 1.0).")
+#Loading Model Artifacts 
+MODEL_DIR = config.MODEL_DIR
+# Every response that used the model says which version answered it.
+MODEL_VERSION_HEADER = "X-Model-Version"
+
+# Heatmap responses are cached per (model version, center cell, day, hour): users panning
+# back and forth keep sending the same requests.
+heatmap_cache = ResponseCache(
+    max_entries=config.HEATMAP_CACHE_SIZE,
+    ttl_seconds=config.HEATMAP_CACHE_TTL_SECONDS,
+)
+# Weekly demand profiles, cached per (model version, cell, business ratio).
+profile_cache = ResponseCache(max_entries=config.PROFILE_CACHE_SIZE)
 
-class PredictionOutput(BaseModel):
-    requested_h3_cell: str
-    prediction_h3_cell: str
-    predicted_demand: float
-    predicted_demand_rounded: int
-    is_fallback: bool = Field(..., description="True if the prediction is for the nearest known cell, not the exact requested cell.")
+# Optional weather for weather-aware models, fetched and refreshed in the background.
+# Cached responses are dropped whenever new conditions arrive.
+weather_cache = None
+if config.WEATHER_ENABLED:
+    weather_cache = WeatherCache(
+        FileWeatherProvider(config.WEATHER_FILE),
+        resolution=config.WEATHER_RESOLUTION,
+        ttl_seconds=config.WEATHER_TTL_SECONDS,
+        refresh_seconds=config.WEATHER_REFRESH_SECONDS,
+        on_update=[heatmap_cache.invalidate, profile_cache.invalidate],
+    )
 
+# Optional live analytics, counted from ride events as they arrive. Responses are cached
+# per generation of the counts, which every new event or passing hour moves on.
+live_aggregates = None
+event_tailer = None
+if config.LIVE_ANALYTICS_ENABLED:
+    live_aggregates = LiveAggregates(
+        resolutions=config.LIVE_RESOLUTIONS,
+        window_hours=config.LIVE_WINDOW_HOURS,
+        max_cells=config.LIVE_MAX_CELLS,
+        utc_offset_hours=config.LIVE_UTC_OFFSET_HOURS,
+    )
+    if config.LIVE_EVENTS_FILE:
+        event_tailer = EventFileTailer(config.LIVE_EVENTS_FILE, live_aggregates, config.LIVE_EVENTS_POLL_SECONDS)
+analytics_cache = ResponseCache(max_entries=256)
+# Generations restart with the process, so ETags carry a per-process prefix.
+ANALYTICS_ETAG_PREFIX = secrets.token_hex(4)
 
-class HeatmapPoint(BaseModel):
-    h3_cell: str
-    demand: float
 
-class HeatmapOutput(BaseModel):
-    center_h3_cell: str
-    hotspots: List[HeatmapPoint]
+# The business ratio the demand pyramid (viewports, pushed heatmaps, hotspots) is scored at.
+PYRAMID_BUSINESS_RATIO = 0.70
 
-#Loading Model Artifacts 
-MODEL_DIR = './ml_models/'
-MODEL_PATH = os.path.join(MODEL_DIR, 'catboost_model.joblib')
-SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.joblib')
-H3_MAP_PATH = os.path.join(MODEL_DIR, 'h3_categories.json')
 
-try:
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    with open(H3_MAP_PATH, 'r') as f:
-        # We need a set for fast lookups
-        known_h3_cells = set(json.load(f).keys())
-    print("✅ Model and artifacts loaded successfully on startup.")
-except FileNotFoundError as e:
-    print(f"❌ Critical Error: Could not load model artifacts on startup. {e}")
-    model = None
-    known_h3_cells = set()
+def shared_table(artifacts: ModelArtifacts, name: str, build, from_arrays, params: dict):
+    """
+    Builds a derived table, or maps the copy in SHARED_TABLES_DIR (see services/shared_tables.py)
+    built for this model version with the same `params` (every setting the table depends on).
+    """
+    if not config.SHARED_TABLES_DIR:
+        return build()
+    return shared_tables.load_or_build(config.SHARED_TABLES_DIR, artifacts.version, name, build, from_arrays,
+                                       params)
 
-#Prediction Logic
-def get_prediction(input_data: PredictionInput) -> dict:
-    if not model:
+
+def demand_cube_params() -> dict:
+    return {"model_borders": config.DEMAND_CUBE_MODEL_BORDERS, "ratio_steps": config.DEMAND_CUBE_RATIO_STEPS,
+            "dtype": config.DEMAND_CUBE_DTYPE, "validation_samples": config.DEMAND_CUBE_VALIDATION_SAMPLES}
+
+
+def demand_pyramid_params(artifacts: ModelArtifacts) -> dict:
+    # Built from the demand cube when there is one, so its values depend on the cube's settings.
+    return {"resolutions": list(config.PYRAMID_RESOLUTIONS), "business_ratio": PYRAMID_BUSINESS_RATIO,
+            "demand_cube": demand_cube_params() if artifacts.has_derived("demand_cube") else None}
+
+
+def build_demand_cube(artifacts: ModelArtifacts) -> DemandCube:
+    """
+    Evaluates the model once over the whole discrete input space: every interval between
+    the model's business_ratio borders, or a uniform grid if those are off or unavailable.
+    """
+    def build():
+        ratio_cuts = artifacts.business_ratio_cuts() if config.DEMAND_CUBE_MODEL_BORDERS else None
+        if config.DEMAND_CUBE_MODEL_BORDERS and ratio_cuts is None:
+            logger.warning("⚠️ The model does not expose its business_ratio borders; "
+                           "the demand cube interpolates over a uniform grid.")
+        demand_cube = DemandCube.build(
+            artifacts.predict_rows,
+            artifacts.known_cells,
+            ratio_steps=config.DEMAND_CUBE_RATIO_STEPS,
+            dtype=config.DEMAND_CUBE_DTYPE,
+            validation_samples=config.DEMAND_CUBE_VALIDATION_SAMPLES,
+            ratio_cuts=ratio_cuts,
+        )
+        cube_stats = demand_cube.stats()
+        logger.info("✅ Demand cube built in %ss (%.1f MB, %d %s ratio grid points, error bound %s).",
+                    cube_stats['build_seconds'], cube_stats['size_bytes'] / 1e6, len(cube_stats['ratio_grid']),
+                    cube_stats['ratio_grid_kind'], cube_stats['error_bound'])
+        return demand_cube
+
+    return shared_table(artifacts, "demand_cube", build, DemandCube.from_arrays, demand_cube_params())
+
+
+def _prepare_artifacts(artifacts: ModelArtifacts):
+    # Optional mode: the demand cube is built before the model starts serving.
+    if config.DEMAND_CUBE_ENABLED:
+        artifacts.derived("demand_cube", build_demand_cube)
+    # Optionally, the ranked hotspot index (and the demand pyramid under it) is ready before the swap.
+    if config.HOTSPOT_INDEX_AT_LOAD:
+        artifacts.derived("hotspot_index", build_hotspot_index)
+
+
+# Artifacts are loaded once at the end of this module, and again (then swapped in) on every reload.
+model_registry = ModelRegistry(
+    MODEL_DIR,
+    config.H3_RESOLUTION,
+    prepare=_prepare_artifacts,
+    on_swap=[lambda artifacts: heatmap_cache.invalidate(), lambda artifacts: profile_cache.invalidate(),
+             lambda artifacts: heatmap_hub.refresh("model")],
+    warmup_rows=config.MODEL_WARMUP_ROWS,
+)
+
+
+def require_model() -> ModelArtifacts:
+    """
+    The artifacts currently serving. A request takes them once and uses them throughout,
+    so it finishes on the same model version even if a reload swaps in a new one.
+    """
+    artifacts = model_registry.current
+    if artifacts is None:
         raise HTTPException(status_code=503, detail="Model is not available. Please check server logs.")
-        
-    H3_RESOLUTION = 12
-    
-    # 1. Convert input lat/lon to an H3 cell
-    requested_h3_cell = h3.latlng_to_cell(input_data.latitude, input_data.longitude, H3_RESOLUTION)
-    
-    prediction_cell = requested_h3_cell
-    is_fallback = False
-    
-    # Define the categorical features list just once
-    categorical_features_indices = [0] # 'h3_cell' is the first column
-
-    # 2. Check if the cell is in our known data
-    if requested_h3_cell not in known_h3_cells:
-        is_fallback = True
-        print(f"⚠️ H3 cell {requested_h3_cell} not in training data. Searching for neighbors...")
-        
-        found_cell = False
-        for k in range(1, 6):
-            neighbors = h3.grid_disk(requested_h3_cell, k)
-            known_neighbors = [cell for cell in neighbors if cell in known_h3_cells]
-            
-            if known_neighbors:
-                print(f"Found {len(known_neighbors)} known neighbors at distance k={k}.")
-                
-                neighbor_inputs = []
-                for neighbor_cell in known_neighbors:
-                    neighbor_inputs.append({
-                        'h3_cell': neighbor_cell,
-                        'day_of_week': input_data.day_of_week,
-                        'hour_of_day': input_data.hour_of_day,
-                        'business_ratio': input_data.business_ratio
-                    })
-                
-                neighbor_df = pd.DataFrame(neighbor_inputs)
-                neighbor_df['business_ratio'] = scaler.transform(neighbor_df[['business_ratio']])
-                
-                # IMPORTANT FIX: Create a CatBoost Pool to explicitly pass cat features
-                prediction_pool = Pool(data=neighbor_df, cat_features=categorical_features_indices)
-                predictions = model.predict(prediction_pool)
-                
-                best_neighbor_index = predictions.argmax()
-                prediction_cell = known_neighbors[best_neighbor_index]
-                prediction_value = predictions[best_neighbor_index]
-                
-                print(f"Best neighbor is {prediction_cell} with predicted demand {prediction_value:.2f}")
-                found_cell = True
-                break
-        
-        if not found_cell:
-            raise HTTPException(status_code=404, detail="No known ride data available near the requested location.")
-    
-    else: # If it's not a fallback, predict on the original cell
-        input_dict = {
-            'h3_cell': requested_h3_cell,
-            'day_of_week': input_data.day_of_week,
-            'hour_of_day': input_data.hour_of_day,
-            'business_ratio': input_data.business_ratio
-        }
-        
-        input_df = pd.DataFrame([input_dict])
-        input_df['business_ratio'] = scaler.transform(input_df[['business_ratio']])
-        
-        # IMPORTANT FIX: Also use a Pool for the non-fallback case for consistency
-        prediction_pool = Pool(data=input_df, cat_features=categorical_features_indices)
-        prediction_value = model.predict(prediction_pool)[0]
+    return artifacts
+
+
+# Optional micro-batching: rows from concurrent requests are scored together in one model call.
+# Each request pins its own model version, so a batch spanning a reload is scored per version.
+inference_batcher = None
+if config.INFERENCE_BATCHING_ENABLED and not config.DEMAND_CUBE_ENABLED:
+    inference_batcher = InferenceBatcher(
+        lambda *features: require_model().predict_rows(*features),
+        window_ms=config.INFERENCE_BATCH_WINDOW_MS,
+        max_batch_rows=config.INFERENCE_MAX_BATCH_ROWS,
+        result_timeout=config.INFERENCE_RESULT_TIMEOUT_SECONDS,
+    )
+
+
+def predict_cells(artifacts: ModelArtifacts, h3_cells: np.ndarray, day_of_week: int, hour_of_day: int,
+                  business_ratio: float, weather: Optional[np.ndarray] = None):
+    """
+    Predicts demand for known uint64 cells, from the demand cube when it is available,
+    otherwise through the inference batcher or a direct model call. The cube is
+    precomputed, so it answers without weather.
+    """
+    startup_profile.mark_first_prediction()
+    if artifacts.has_derived("demand_cube"):
+        demand_cube = artifacts.derived("demand_cube", build_demand_cube)
+        with time_stage("cube_lookup"):
+            return demand_cube.lookup(h3_cells, day_of_week, hour_of_day, business_ratio)
+    if inference_batcher is not None:
+        return inference_batcher.predict(h3_cells, day_of_week, hour_of_day, business_ratio, weather,
+                                         predict_fn=artifacts.predict_rows)
+    return artifacts.predict_rows(h3_cells, day_of_week, hour_of_day, business_ratio, weather)
+
+
+def get_neighbor_index(artifacts: ModelArtifacts):
+    # The nearest-known-cell index is loaded with the predictor, if one has been built
+    # for this model's known cells.
+    return artifacts.derived("neighbor_index", lambda a: neighbor_index.load_if_current(
+        config.NEIGHBOR_INDEX_DIR, a.known_cells, config.FALLBACK_MAX_RING))
+
+
+def get_predictor(artifacts: ModelArtifacts) -> Predictor:
+    """
+    The shared predictor of these artifacts, scoring known cells through predict_cells,
+    with weather from the cache when the model uses it (and the demand cube is off).
+    """
+    weather = None
+    if weather_cache is not None and not artifacts.has_derived("demand_cube"):
+        weather = weather_cache.lookup
+    return artifacts.derived("predictor", lambda a: Predictor(
+        a, config.H3_RESOLUTION, config.FALLBACK_MAX_RING, index=get_neighbor_index(a),
+        score=lambda *features: predict_cells(a, *features), weather=weather))
+
+
+#Prediction Logic
+def get_prediction(artifacts: ModelArtifacts, input_data: PredictionInput) -> dict:
+    prediction = get_predictor(artifacts).predict(input_data.latitude, input_data.longitude,
+                                                  input_data.day_of_week, input_data.hour_of_day,
+                                                  input_data.business_ratio)
+    requested_h3_cell = prediction["requested_h3_cell"]
+    prediction_cell = prediction["prediction_h3_cell"]
+    if not prediction_cell:
+        request_logger.info("⚠️ H3 cell %x not in training data and no known neighbors within %d rings.",
+                            requested_h3_cell, config.FALLBACK_MAX_RING)
+        raise HTTPException(status_code=404, detail="No known ride data available near the requested location.")
+    if prediction["is_fallback"]:
+        request_logger.info("⚠️ H3 cell %x not in training data; best known neighbor at k=%d is %x (%.2f).",
+                            requested_h3_cell, prediction["ring"], prediction_cell, prediction["predicted_demand"])
+
+    return {
+        "requested_h3_cell": format(requested_h3_cell, 'x'),
+        "prediction_h3_cell": format(prediction_cell, 'x'),
+        "predicted_demand": prediction["predicted_demand"],
+        "predicted_demand_rounded": round(float(prediction["predicted_demand"])),
+        "is_fallback": prediction["is_fallback"]
+    }
+
+
+def score_batch(artifacts: ModelArtifacts, input_data: BatchPredictionInput) -> dict:
+    """Predicts demand for many locations at once; see Predictor.predict_batch."""
+    n_items = len(input_data.latitudes)
+    columns = (input_data.longitudes, input_data.day_of_week, input_data.hour_of_day, input_data.business_ratio)
+    if any(len(column) != n_items for column in columns):
+        raise HTTPException(status_code=422, detail="All input arrays must have the same length.")
+    if n_items > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"A batch may contain at most {config.BATCH_MAX_ITEMS} locations.")
+
+    return get_predictor(artifacts).predict_batch(input_data.latitudes, *columns)
 
+
+def batch_prediction_payload(batch: dict) -> dict:
+    """Builds the BatchPredictionOutput JSON shape from the columns of score_batch."""
+    results = []
+    for requested_cell, prediction_cell, demand in zip(
+            batch["requested_h3_cell"].tolist(), batch["prediction_h3_cell"].tolist(),
+            batch["predicted_demand"].tolist()):
+        if not prediction_cell:
+            results.append(None)
+            continue
+        results.append({
+            "requested_h3_cell": format(requested_cell, 'x'),
+            "prediction_h3_cell": format(prediction_cell, 'x'),
+            "predicted_demand": demand,
+            "predicted_demand_rounded": round(demand),
+            "is_fallback": prediction_cell != requested_cell,
+        })
+    return {"predictions": results}
+
+
+def batch_prediction_columns(batch: dict) -> Dict[str, np.ndarray]:
+    """Columnar form of score_batch: uint64 cells (0 when nothing was found) and float32 demand."""
+    requested = batch["requested_h3_cell"]
+    predicted = batch["prediction_h3_cell"]
+    found = predicted != 0
+    return {
+        "requested_h3_cell": requested,
+        "prediction_h3_cell": predicted,
+        "predicted_demand": batch["predicted_demand"].astype(np.float32),
+        "is_fallback": (found & (requested != predicted)).astype(np.uint8),
+        "found": found.astype(np.uint8),
+    }
+
+
+def get_batch_prediction(artifacts: ModelArtifacts, input_data: BatchPredictionInput) -> dict:
+    return batch_prediction_payload(score_batch(artifacts, input_data))
+
+def score_weekly_profiles(artifacts: ModelArtifacts, cells: np.ndarray, business_ratio: float) -> List[np.ndarray]:
+    """
+    Predicted demand of known uint64 cells for all 168 hours of the week, as (7, 24) arrays.
+    Cached profiles are reused; the others are scored together in one model call.
+    """
+    def compute(keys):
+        missing = np.array([key[1] for key in keys], dtype=np.uint64)
+        grid = get_predictor(artifacts).predict_grid(missing, range(7), range(24), business_ratio)
+        return list(grid.astype(np.float32))
+
+    keys = [(artifacts.version, cell, business_ratio) for cell in cells.tolist()]
+    return profile_cache.get_or_compute_many(keys, compute)
+
+
+def get_demand_profiles(artifacts: ModelArtifacts, latitudes: List[float], longitudes: List[float],
+                        business_ratio: float) -> dict:
+    """
+    Weekly demand profiles for several locations. An unknown location gets the profile
+    of the known neighbour with the highest weekly demand.
+    """
+    if len(latitudes) != len(longitudes):
+        raise HTTPException(status_code=422, detail="lat and lon must be given the same number of times.")
+    if len(latitudes) > config.PROFILE_MAX_LOCATIONS:
+        raise HTTPException(status_code=422, detail=f"At most {config.PROFILE_MAX_LOCATIONS} locations may be compared at once.")
+
+    with time_stage("h3_convert"):
+        requested_cells = latlng_to_uint64(latitudes, longitudes, config.H3_RESOLUTION)
+    candidates_per_item = get_predictor(artifacts).resolve(requested_cells)
+
+    scored_cells = np.unique(np.concatenate(candidates_per_item))
+    profiles = dict(zip(scored_cells.tolist(), score_weekly_profiles(artifacts, scored_cells, business_ratio)))
+
+    prediction_cells = np.zeros(len(requested_cells), dtype=np.uint64)
+    for i, candidates in enumerate(candidates_per_item):
+        if len(candidates):
+            prediction_cells[i] = max(candidates.tolist(), key=lambda cell: profiles[cell].sum())
     return {
-        "requested_h3_cell": requested_h3_cell,
-        "prediction_h3_cell": prediction_cell,
-        "predicted_demand": prediction_value,
-        "predicted_demand_rounded": round(float(prediction_value)),
-        "is_fallback": is_fallback
+        "business_ratio": business_ratio,
+        "requested_h3_cell": requested_cells,
+        "prediction_h3_cell": prediction_cells,
+        "demand": [profiles.get(cell) for cell in prediction_cells.tolist()],
+    }
+
+
+def render_demand_profiles(result: dict, media_type: str) -> Response:
+    requested = result["requested_h3_cell"]
+    predicted = result["prediction_h3_cell"]
+    if media_type == wire_format.JSON:
+        profiles = []
+        for requested_cell, prediction_cell, demand in zip(requested.tolist(), predicted.tolist(), result["demand"]):
+            profiles.append(None if not prediction_cell else {
+                "requested_h3_cell": format(requested_cell, 'x'),
+                "prediction_h3_cell": format(prediction_cell, 'x'),
+                "is_fallback": prediction_cell != requested_cell,
+                "demand": demand.astype(np.float64).tolist(),
+            })
+        return wire_format.json_response({"business_ratio": result["business_ratio"], "profiles": profiles})
+
+    # One row per location; `demand` is 168 values per row, day-major (NaN if nothing was found).
+    found = predicted != 0
+    demand = np.full((len(found), 7, 24), np.nan, dtype=np.float32)
+    for i in np.flatnonzero(found):
+        demand[i] = result["demand"][i]
+    columns = {
+        "requested_h3_cell": requested,
+        "prediction_h3_cell": predicted,
+        "is_fallback": (found & (requested != predicted)).astype(np.uint8),
+        "found": found.astype(np.uint8),
+        "demand": demand.reshape(len(found), -1),
+    }
+    return wire_format.columnar_response(
+        media_type, columns, {"business_ratio": result["business_ratio"], "days": 7, "hours": 24})
+
+
+@app.get("/profile", response_model=DemandProfileOutput, tags=["Prediction"])
+def get_demand_profile(
+    request: Request,
+    lat: List[confloat(ge=-90, le=90)] = Query(..., description="Latitude of each location; repeat to compare zones."),
+    lon: List[confloat(ge=-180, le=180)] = Query(..., description="Longitude of each location, in the same order."),
+    business_ratio: float = Query(0.70, ge=0.0, le=1.0),
+):
+    """
+    Predicted demand for every hour of the week (7 days x 24 hours) at one or more
+    locations, with the same nearest-known-location fallback as /predict.
+    Send an `Accept` header for a columnar encoding (see services/wire_format.py).
+    """
+    artifacts = require_model()
+    result = get_demand_profiles(artifacts, lat, lon, business_ratio)
+    response = render_demand_profiles(result, wire_format.negotiate(request.headers.get("accept")))
+    response.headers[MODEL_VERSION_HEADER] = artifacts.version
+    return response
+
+
+HEATMAP_GRID_RADIUS = 7  # How many rings of hexagons to calculate around the center by default
+HEATMAP_MAX_RADIUS = 15
+
+
+def _compute_heatmap(artifacts: ModelArtifacts, center_cell: int, day: int, hour: int,
+                     radius: int = HEATMAP_GRID_RADIUS) -> dict:
+    """Scores the known cells around a center. Returns columns, rendered per request format."""
+    # Use an average business_ratio for the heatmap
+    relevant_cells, predictions = get_predictor(artifacts).predict_around(center_cell, radius, day, hour, 0.70)
+    return {"center_h3_cell": center_cell, "h3_cells": relevant_cells, "demand": predictions}
+
+
+def render_heatmap(heatmap: dict, media_type: str) -> Response:
+    center_h3_cell = format(heatmap["center_h3_cell"], 'x')
+    if media_type == wire_format.JSON:
+        # Same shape as HeatmapOutput, without building one model per point
+        return wire_format.json_response({
+            "center_h3_cell": center_h3_cell,
+            "hotspots": [
+                {"h3_cell": cell, "demand": demand}
+                for cell, demand in zip(uint64_to_cells(heatmap["h3_cells"]), heatmap["demand"].tolist())
+            ],
+        })
+    columns = {
+        "h3_cell": heatmap["h3_cells"],
+        "demand": heatmap["demand"].astype(np.float32),
     }
+    return wire_format.columnar_response(media_type, columns, {"center_h3_cell": center_h3_cell})
 
 
 @app.get("/heatmap", response_model=HeatmapOutput, tags=["Prediction"])
-def get_heatmap_data(lat: float, lon: float, day: int, hour: int):
+def get_heatmap_data(lat: float, lon: float, request: Request,
+                     day: int = Query(..., ge=0, le=6),
+                     hour: int = Query(..., ge=0, le=23),
+                     radius: int = Query(HEATMAP_GRID_RADIUS, ge=1, le=HEATMAP_MAX_RADIUS,
+                                         description="Rings of hexagons around the center.")):
     """
     Generates demand prediction data for a grid of H3 cells around a central point.
+    Send an `Accept` header for a columnar encoding (see services/wire_format.py).
     """
-    if not model:
-        raise HTTPException(status_code=503, detail="Model is not available.")
+    artifacts = require_model()
     
-    H3_RESOLUTION = 12 # Use the fine resolution for the grid
-    GRID_RADIUS = 7      # How many rings of hexagons to calculate around the center
+    H3_RESOLUTION = config.H3_RESOLUTION # Use the fine resolution for the grid
 
     try:
-        center_cell = h3.latlng_to_cell(lat, lon, H3_RESOLUTION)
-        # Get all cells within the specified radius
-        grid_cells = h3.grid_disk(center_cell, GRID_RADIUS)
-        
-        # Filter for only the cells we have historical data for
-        relevant_cells = [cell for cell in grid_cells if cell in known_h3_cells]
-
-        if not relevant_cells:
-            return HeatmapOutput(center_h3_cell=center_cell, hotspots=[])
-
-        # Prepare a DataFrame for batch prediction
-        heatmap_inputs = [{
-            'h3_cell': cell,
-            'day_of_week': day,
-            'hour_of_day': hour,
-            'business_ratio': 0.70 # Use an average business_ratio for the heatmap
-        } for cell in relevant_cells]
-        
-        heatmap_df = pd.DataFrame(heatmap_inputs)
-        
-        # Preprocessing
-        heatmap_df['business_ratio'] = scaler.transform(heatmap_df[['business_ratio']])
-        
-        # Create CatBoost Pool
-        prediction_pool = Pool(data=heatmap_df, cat_features=[0])
-        
-        # Get predictions
-        predictions = model.predict(prediction_pool)
-        
-        # Format the output
-        hotspots = [
-            HeatmapPoint(h3_cell=cell, demand=demand) 
-            for cell, demand in zip(relevant_cells, predictions)
-        ]
-        
-        return HeatmapOutput(center_h3_cell=center_cell, hotspots=hotspots)
-
-    except Exception as e:
-        print(f"Error generating heatmap: {e}")
+        with time_stage("h3_convert"):
+            center_cell = h3_int.latlng_to_cell(lat, lon, H3_RESOLUTION)
+        heatmap = heatmap_cache.get_or_compute(
+            (artifacts.version, center_cell, day, hour, radius),
+            lambda: _compute_heatmap(artifacts, center_cell, day, hour, radius),
+        )
+        response = render_heatmap(heatmap, wire_format.negotiate(request.headers.get("accept")))
+        response.headers[MODEL_VERSION_HEADER] = artifacts.version
+        return response
+
+    except Exception:
+        logger.exception("Error generating heatmap")
         raise HTTPException(status_code=500, detail="Could not generate heatmap data.")
 
 
+def build_demand_pyramid(artifacts: ModelArtifacts) -> DemandPyramid:
+    # One large call, so it skips the inference batcher (it may also run before the batcher
+    # exists, while a model is being prepared).
+    def build():
+        if artifacts.has_derived("demand_cube"):
+            predict_fn = artifacts.derived("demand_cube", build_demand_cube).lookup
+        else:
+            predict_fn = artifacts.predict_rows
+        pyramid = DemandPyramid.build(
+            predict_fn, artifacts.known_cells, config.PYRAMID_RESOLUTIONS, business_ratio=PYRAMID_BUSINESS_RATIO)
+        logger.info("✅ Demand pyramid built in %.2fs: %s", pyramid.build_seconds, pyramid.stats()['levels'])
+        return pyramid
+
+    return shared_table(artifacts, "demand_pyramid", build, DemandPyramid.from_arrays,
+                        demand_pyramid_params(artifacts))
+
+
+def get_demand_pyramid(artifacts: ModelArtifacts) -> DemandPyramid:
+    # Multi-resolution demand pyramid behind the viewport/tile endpoints, built on first use.
+    return artifacts.derived("demand_pyramid", build_demand_pyramid)
+
+
+def get_viewport_heatmap(artifacts: ModelArtifacts, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                         zoom: int, day: int, hour: int) -> dict:
+    """
+    Demand for the cells covering a bounding box, at a resolution picked from the zoom.
+    Falls back to coarser levels until the box covers at most VIEWPORT_MAX_CELLS cells, and
+    boxes larger than a level are answered from its known cells, so the response size and
+    the work stay flat however much of the map is on screen.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=422, detail="The bounding box minimums must not exceed its maximums.")
+
+    pyramid = get_demand_pyramid(artifacts)
+    resolution, candidates = pyramid.viewport_cells(min_lat, min_lon, max_lat, max_lon, zoom, config.VIEWPORT_MAX_CELLS)
+    cells, demand = pyramid.query(resolution, candidates, day, hour)
+    return {"resolution": resolution, "h3_cells": cells, "demand": demand}
+
+
+def render_viewport_heatmap(viewport: dict, media_type: str) -> Response:
+    if media_type == wire_format.JSON:
+        return wire_format.json_response({
+            "resolution": viewport["resolution"],
+            "hotspots": [
+                {"h3_cell": cell, "demand": demand}
+                for cell, demand in zip(uint64_to_cells(viewport["h3_cells"]), viewport["demand"].tolist())
+            ],
+        })
+    columns = {"h3_cell": viewport["h3_cells"], "demand": viewport["demand"].astype(np.float32)}
+    return wire_format.columnar_response(media_type, columns, {"resolution": viewport["resolution"]})
+
+
+@app.get("/heatmap/viewport", response_model=ViewportHeatmapOutput, tags=["Prediction"])
+def get_viewport_heatmap_data(
+    request: Request,
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level; picks the H3 resolution."),
+    day: int = Query(..., ge=0, le=6),
+    hour: int = Query(..., ge=0, le=23),
+):
+    """
+    Predicted demand for everything inside a map viewport, served from precomputed
+    per-(day, hour) pyramids (H3 resolutions 12, 10, 9 and 7 by default).
+    """
+    artifacts = require_model()
+    viewport = get_viewport_heatmap(artifacts, min_lat, min_lon, max_lat, max_lon, zoom, day, hour)
+    response = render_viewport_heatmap(viewport, wire_format.negotiate(request.headers.get("accept")))
+    response.headers[MODEL_VERSION_HEADER] = artifacts.version
+    return response
+
+
+@app.get("/heatmap/tiles/{z}/{x}/{y}", response_model=ViewportHeatmapOutput, tags=["Prediction"])
+def get_tile_heatmap_data(
+    request: Request,
+    z: int,
+    x: int,
+    y: int,
+    day: int = Query(..., ge=0, le=6),
+    hour: int = Query(..., ge=0, le=23),
+):
+    """
+    Same as /heatmap/viewport for one z/x/y web map tile.
+    """
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile coordinates are out of range.")
+    artifacts = require_model()
+    min_lat, min_lon, max_lat, max_lon = tile_to_bbox(z, x, y)
+    viewport = get_viewport_heatmap(artifacts, min_lat, min_lon, max_lat, max_lon, z, day, hour)
+    response = render_viewport_heatmap(viewport, wire_format.negotiate(request.headers.get("accept")))
+    response.headers[MODEL_VERSION_HEADER] = artifacts.version
+    return response
+
+
+def current_demand_pyramid():
+    artifacts = model_registry.current
+    return None if artifacts is None else (artifacts.version, get_demand_pyramid(artifacts))
+
+
+# Subscribers to pushed heatmap updates; refreshed on hour rollovers and model swaps.
+heatmap_hub = HeatmapHub(
+    current_demand_pyramid,
+    max_cells=config.VIEWPORT_MAX_CELLS,
+    min_change=config.HEATMAP_PUSH_MIN_CHANGE,
+    utc_offset_hours=config.HEATMAP_PUSH_UTC_OFFSET_HOURS,
+    max_subscribers=config.HEATMAP_PUSH_MAX_SUBSCRIBERS,
+)
+
+
+@app.websocket("/heatmap/subscribe")
+async def subscribe_heatmap(websocket: WebSocket):
+    """
+    Pushed viewport heatmaps. The client sends a HeatmapSubscriptionInput as JSON, and
+    again whenever the map moves or the time changes. The server answers with every cell,
+    then only sends the cells whose demand changed (see services/heatmap_push.py).
+    """
+    await websocket.accept()
+    connection = HeatmapConnection(heatmap_hub, asyncio.get_running_loop(),
+                                   max_queued=config.HEATMAP_PUSH_MAX_QUEUED,
+                                   min_interval=config.HEATMAP_PUSH_MIN_INTERVAL_SECONDS)
+    if connection.subscription is None:
+        if config.HEATMAP_PUSH_MAX_SUBSCRIBERS <= 0:
+            detail = "Heatmap subscriptions are not enabled (set HEATMAP_PUSH_MAX_SUBSCRIBERS above 0)."
+        else:
+            detail = "Too many heatmap subscribers; try again later."
+        await websocket.send_json({"type": "error", "detail": detail})
+        await websocket.close(code=1013)
+        return
+
+    async def receive_viewports():
+        while True:
+            try:
+                viewport = HeatmapSubscriptionInput(**await websocket.receive_json())
+            except (ValidationError, ValueError, TypeError) as error:
+                connection.error(str(error))
+                continue
+            connection.request(viewport.min_lat, viewport.min_lon, viewport.max_lat, viewport.max_lon,
+                               viewport.zoom, viewport.day, viewport.hour, viewport.hours_ahead)
+
+    async def send_updates():
+        while True:
+            await websocket.send_json(await connection.outbox.get())
+
+    try:
+        async with anyio.create_task_group() as tasks:
+            async def run(task):
+                try:
+                    await task()
+                except WebSocketDisconnect:
+                    pass
+                tasks.cancel_scope.cancel()
+
+            tasks.start_soon(run, receive_viewports)
+            tasks.start_soon(run, send_updates)
+            tasks.start_soon(run, connection.apply_updates)
+    finally:
+        heatmap_hub.unsubscribe(connection.subscription)
+
+
+def build_hotspot_index(artifacts: ModelArtifacts) -> HotspotIndex:
+    pyramid = get_demand_pyramid(artifacts)
+
+    def build():
+        index = HotspotIndex.build(pyramid, config.HOTSPOTS_MAX_K)
+        logger.info("✅ Hotspot index built in %.2fs (%.1f MB).", index.build_seconds, index.stats()['size_bytes'] / 1e6)
+        return index
+
+    return shared_table(artifacts, "hotspot_index", build,
+                        lambda arrays, meta: HotspotIndex.from_arrays(pyramid, arrays, meta),
+                        {"pyramid": demand_pyramid_params(artifacts), "max_k": config.HOTSPOTS_MAX_K})
+
+
+@app.get("/hotspots/top", response_model=ViewportHeatmapOutput, tags=["Prediction"])
+def get_top_hotspots(
+    request: Request,
+    day: int = Query(..., ge=0, le=6),
+    hour: int = Query(..., ge=0, le=23),
+    k: int = Query(10, ge=1, le=config.HOTSPOTS_MAX_K, description="How many hotspots to return."),
+    resolution: Optional[int] = Query(None, description="Roll demand up to this H3 resolution (one of PYRAMID_RESOLUTIONS)."),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+):
+    """
+    The K cells with the highest predicted demand in the city (or inside an optional
+    bounding box) for a day and hour, best first, read from a ranked index built on the
+    first request (or when the model loads, with HOTSPOT_INDEX_AT_LOAD).
+    """
+    artifacts = require_model()
+    index = artifacts.derived("hotspot_index", build_hotspot_index)
+    if resolution is None:
+        resolution = max(index.rankings)
+    elif resolution not in index.rankings:
+        raise HTTPException(status_code=422, detail=f"resolution must be one of {sorted(index.rankings)}.")
+
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if all(bound is None for bound in bbox):
+        bbox = None
+    elif any(bound is None for bound in bbox):
+        raise HTTPException(status_code=422, detail="Give all of min_lat, min_lon, max_lat and max_lon, or none.")
+    elif min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=422, detail="The bounding box minimums must not exceed its maximums.")
+
+    with time_stage("hotspot_lookup"):
+        cells, demand = index.top(resolution, day, hour, k, bbox)
+    hotspots = {"resolution": resolution, "h3_cells": cells, "demand": demand}
+    response = render_viewport_heatmap(hotspots, wire_format.negotiate(request.headers.get("accept")))
+    response.headers[MODEL_VERSION_HEADER] = artifacts.version
+    return response
+
+
+# Zone-to-zone trips, built offline with build_od_matrix.py and reloaded when rebuilt.
+od_matrix_store = ODMatrixStore(config.OD_MATRIX_DIR)
+
+
+def require_od_matrix() -> ODMatrix:
+    od_matrix = od_matrix_store.current()
+    if od_matrix is None:
+        raise HTTPException(status_code=404, detail="No OD matrix has been built (run build_od_matrix.py).")
+    return od_matrix
+
+
+def get_zone_flows(direction: str, lat: float, lon: float, day: int, hour: int, k: int) -> dict:
+    """The busiest flows out of or into the zone containing a point, read as one CSR row slice."""
+    od_matrix = require_od_matrix()
+    zone = h3_int.latlng_to_cell(lat, lon, od_matrix.resolution)
+    with time_stage("od_lookup"):
+        cells, trips, distance_km = od_matrix.top_flows(direction, zone, day, hour, k)
+        outbound, inbound = od_matrix.zone_totals(zone, day, hour)
+    return {"h3_cell": zone, "resolution": od_matrix.resolution,
+            "total_trips": outbound if direction == "outbound" else inbound,
+            "h3_cells": cells, "trips": trips, "distance_km": distance_km}
+
+
+def render_zone_flows(flows: dict, media_type: str) -> Response:
+    meta = {"h3_cell": format(flows["h3_cell"], 'x'), "resolution": flows["resolution"],
+            "total_trips": flows["total_trips"]}
+    if media_type == wire_format.JSON:
+        return wire_format.json_response({**meta, "flows": [
+            {"h3_cell": cell, "trips": trips, "mean_distance_km": round(distance_km, 2)}
+            for cell, trips, distance_km in zip(uint64_to_cells(flows["h3_cells"]), flows["trips"].tolist(),
+                                                flows["distance_km"].tolist())
+        ]})
+    columns = {"h3_cell": flows["h3_cells"], "trips": flows["trips"], "mean_distance_km": flows["distance_km"]}
+    return wire_format.columnar_response(media_type, columns, meta)
+
+
+@app.get("/od/outbound", response_model=ZoneFlowOutput, tags=["Flows"])
+def get_outbound_flows(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    day: int = Query(..., ge=0, le=6),
+    hour: int = Query(..., ge=0, le=23),
+    k: int = Query(10, ge=1, le=config.OD_MAX_K, description="How many destination zones to return."),
+):
+    """
+    Where riders end up after a pickup in the zone containing a point, at a day and hour:
+    the busiest destination zones with their historical trip counts.
+    """
+    flows = get_zone_flows("outbound", lat, lon, day, hour, k)
+    return render_zone_flows(flows, wire_format.negotiate(request.headers.get("accept")))
+
+
+@app.get("/od/inbound", response_model=ZoneFlowOutput, tags=["Flows"])
+def get_inbound_flows(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    day: int = Query(..., ge=0, le=6),
+    hour: int = Query(..., ge=0, le=23),
+    k: int = Query(10, ge=1, le=config.OD_MAX_K, description="How many origin zones to return."),
+):
+    """
+    Where the trips ending in the zone containing a point came from, at a day and hour:
+    the busiest origin zones with their historical trip counts.
+    """
+    flows = get_zone_flows("inbound", lat, lon, day, hour, k)
+    return render_zone_flows(flows, wire_format.negotiate(request.headers.get("accept")))
+
+
+@app.get("/od/net-flow", response_model=NetFlowOutput, tags=["Flows"])
+def get_net_flow(
+    request: Request,
+    day: int = Query(..., ge=0, le=6),
+    hour: int = Query(..., ge=0, le=23),
+):
+    """
+    Trips out of and into every zone at a day and hour, and their difference. Zones with
+    a net inflow collect riders; zones with a net outflow need them.
+    """
+    od_matrix = require_od_matrix()
+    with time_stage("od_lookup"):
+        cells, outbound, inbound = od_matrix.net_flow(day, hour)
+    net_flow = inbound.astype(np.int32) - outbound
+    media_type = wire_format.negotiate(request.headers.get("accept"))
+    if media_type == wire_format.JSON:
+        return wire_format.json_response({"resolution": od_matrix.resolution, "zones": [
+            {"h3_cell": cell, "outbound": cell_outbound, "inbound": cell_inbound, "net_flow": cell_net_flow}
+            for cell, cell_outbound, cell_inbound, cell_net_flow in zip(
+                uint64_to_cells(cells), outbound.tolist(), inbound.tolist(), net_flow.tolist())
+        ]})
+    columns = {"h3_cell": cells, "outbound": outbound, "inbound": inbound, "net_flow": net_flow}
+    return wire_format.columnar_response(media_type, columns, {"resolution": od_matrix.resolution})
+
+
+def require_live_aggregates() -> LiveAggregates:
+    if live_aggregates is None:
+        raise HTTPException(status_code=404, detail="Live analytics are not enabled (set LIVE_ANALYTICS_ENABLED=true).")
+    return live_aggregates
+
+
+def live_analytics_response(request: Request, key: tuple, compute) -> Response:
+    """
+    Answers from the counts as they are now: 304 when the client's ETag is still current,
+    otherwise the cached (or freshly computed) entries of this generation.
+    """
+    generation = require_live_aggregates().refresh()
+    etag = f'"{ANALYTICS_ETAG_PREFIX}-{generation}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response = wire_format.json_response(analytics_cache.get_or_compute(key + (generation,), compute))
+    response.headers["ETag"] = etag
+    return response
+
+
+@app.post("/events/rides", response_model=RideEventResult, tags=["Analytics"])
+def ingest_ride_events(batch: RideEventBatch, x_admin_token: Optional[str] = Header(None)):
+    """
+    Counts ride placement events into the live analytics. Events older than the window
+    or placed in a later hour than now are rejected.
+    """
+    check_admin_token(x_admin_token)
+    aggregates = require_live_aggregates()
+    if len(batch.events) > config.LIVE_EVENTS_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {config.LIVE_EVENTS_MAX_ITEMS} events may be sent at once.")
+    accepted = 0
+    for event in batch.events:
+        placed_at = None if event.placed_at is None else to_epoch_seconds(event.placed_at, aggregates.utc_offset_hours)
+        accepted += aggregates.add(event.latitude, event.longitude, placed_at, event.is_business)
+    return {"accepted": accepted, "rejected": len(batch.events) - accepted}
+
+@app.get("/analytics/hourly", response_model=List[HourlyDemand], tags=["Analytics"])
+def get_live_hourly_demand(
+    request: Request,
+    window_hours: Optional[int] = Query(None, ge=1, le=config.LIVE_WINDOW_HOURS,
+                                        description="Only count the last hours (default: the whole window)."),
+):
+    """
+    Rides per hour of the day over the live window, as in hourly_demand.json.
+    Send the ETag back in `If-None-Match` to get a 304 while nothing has changed.
+    """
+    return live_analytics_response(request, ("hourly", window_hours),
+                                   lambda: live_aggregates.hourly_demand(window_hours))
+
+@app.get("/analytics/daily", response_model=List[DailyDemand], tags=["Analytics"])
+def get_live_daily_demand(
+    request: Request,
+    window_hours: Optional[int] = Query(None, ge=1, le=config.LIVE_WINDOW_HOURS,
+                                        description="Only count the last hours (default: the whole window)."),
+):
+    """
+    Rides per day of the week over the live window, as in daily_demand.json.
+    """
+    return live_analytics_response(request, ("daily", window_hours),
+                                   lambda: live_aggregates.daily_demand(window_hours))
+
+@app.get("/analytics/zones", response_model=List[LiveZone], tags=["Analytics"])
+def get_live_zones(
+    request: Request,
+    resolution: int = Query(config.LIVE_RESOLUTIONS[0], description="H3 resolution of the zones (one of LIVE_RESOLUTIONS)."),
+    k: int = Query(10, ge=1, le=config.LIVE_MAX_CELLS, description="How many zones to return."),
+    window_hours: Optional[int] = Query(None, ge=1, le=config.LIVE_WINDOW_HOURS,
+                                        description="Only count the last hours (default: the whole window)."),
+):
+    """
+    The zones with the most rides over the live window, busiest first, as in core_hotspots.json.
+    """
+    if resolution not in config.LIVE_RESOLUTIONS:
+        raise HTTPException(status_code=422, detail=f"resolution must be one of {list(config.LIVE_RESOLUTIONS)}.")
+    return live_analytics_response(request, ("zones", resolution, k, window_hours),
+                                   lambda: live_aggregates.top_zones(resolution, k, window_hours))
+
+@app.get("/analytics/live", tags=["Analytics"])
+def get_live_analytics_stats():
+    """
+    Reports events counted and rejected, cells tracked per resolution and the file tailer.
+    """
+    aggregates = require_live_aggregates()
+    tailer = None
+    if event_tailer is not None:
+        tailer = {"path": event_tailer.path, "lines": event_tailer.lines, "invalid": event_tailer.invalid}
+    return {**aggregates.stats(), "tailer": tailer}
+
+
+@app.get("/heatmap/subscribers", tags=["General"])
+def get_heatmap_push_stats():
+    """
+    Reports heatmap subscribers, the shared lookups behind their updates and how many
+    cells were pushed, left unchanged or removed.
+    """
+    return heatmap_hub.stats()
+
+@app.get("/heatmap/cache", tags=["General"])
+def get_heatmap_cache_stats():
+    """
+    Reports heatmap cache hits, misses, coalesced requests and evictions.
+    """
+    return heatmap_cache.stats()
+
+@app.delete("/heatmap/cache", tags=["General"])
+def clear_heatmap_cache():
+    """
+    Drops every cached heatmap. Model reloads already do this.
+    """
+    heatmap_cache.invalidate()
+    return heatmap_cache.stats()
+
+
 # --- API Endpoints ---
 @app.get("/", tags=["General"])
 def read_root():
@@ -223,5 +945,170 @@ def predict_ride_demand(input_data: PredictionInput):
     Accepts latitude/longitude and time, then returns the predicted demand,
     falling back to the nearest known location if necessary.
     """
-    prediction_result = get_prediction(input_data)
-    return prediction_result
\ No newline at end of file
+    artifacts = require_model()
+    prediction_result = get_prediction(artifacts, input_data)
+    prediction_result["predicted_demand"] = float(prediction_result["predicted_demand"])
+    # Serialized directly (and timed as a stage); the shape is PredictionOutput.
+    response = wire_format.json_response(prediction_result)
+    response.headers[MODEL_VERSION_HEADER] = artifacts.version
+    return response
+
+@app.post("/predict/batch", response_model=BatchPredictionOutput, tags=["Prediction"])
+def predict_ride_demand_batch(input_data: BatchPredictionInput, request: Request):
+    """
+    Accepts arrays of locations and times and returns one prediction per location,
+    in the same order, using the same nearest-known-location fallback as /predict.
+    Send an `Accept` header for a columnar encoding (see services/wire_format.py).
+    """
+    artifacts = require_model()
+    batch = score_batch(artifacts, input_data)
+    media_type = wire_format.negotiate(request.headers.get("accept"))
+    if media_type == wire_format.JSON:
+        response = wire_format.json_response(batch_prediction_payload(batch))
+    else:
+        response = wire_format.columnar_response(media_type, batch_prediction_columns(batch), {})
+    response.headers[MODEL_VERSION_HEADER] = artifacts.version
+    return response
+
+@app.get("/inference/stats", tags=["General"])
+def get_inference_stats():
+    """
+    Reports batch size and queue wait distributions of the inference batcher.
+    """
+    if inference_batcher is None:
+        raise HTTPException(status_code=404, detail="Inference batching is not enabled (set INFERENCE_BATCHING_ENABLED=true).")
+    artifacts = model_registry.current
+    return {**inference_batcher.stats(), "model_version": artifacts.version if artifacts else None}
+
+@app.get("/demand-cube", tags=["General"])
+def get_demand_cube_stats():
+    """
+    Reports the size of the precomputed demand cube, its business ratio grid and its measured
+    error against the live model (zero, up to the storage dtype, on the model's borders).
+    """
+    artifacts = require_model()
+    if not artifacts.has_derived("demand_cube"):
+        raise HTTPException(status_code=404, detail="The demand cube is not enabled (set DEMAND_CUBE_ENABLED=true).")
+    return {**artifacts.derived("demand_cube", build_demand_cube).stats(), "model_version": artifacts.version}
+
+
+@app.get("/weather", tags=["General"])
+def get_weather_stats():
+    """
+    Reports the weather cache: hits, misses and stale entries served, background fetches
+    and whether the serving model uses weather.
+    """
+    if weather_cache is None:
+        raise HTTPException(status_code=404, detail="Weather is not enabled (set WEATHER_ENABLED=true).")
+    artifacts = model_registry.current
+    return {**weather_cache.stats(), "model_uses_weather": artifacts.uses_weather if artifacts else None}
+
+
+def _model_info():
+    artifacts = model_registry.current
+    return [((artifacts.version,), 1)] if artifacts is not None else []
+
+metrics.REGISTRY.callback("ridepulse_model_info", "The serving model version.", "gauge", ["version"], _model_info)
+metrics.REGISTRY.callback(
+    "ridepulse_model_reloads_total", "Model reloads by outcome.", "counter", ["outcome"],
+    lambda: [(("loaded",), model_registry.reloads), (("failed",), model_registry.failures)])
+metrics.REGISTRY.callback(
+    "ridepulse_heatmap_cache_events_total", "Heatmap cache lookups and removals by kind.", "counter", ["event"],
+    lambda: [((event,), value) for event, value in heatmap_cache.stats().items()
+             if event in ("hits", "misses", "coalesced", "evictions", "expirations")])
+metrics.REGISTRY.callback(
+    "ridepulse_profile_cache_events_total", "Weekly profile cache lookups and removals by kind.", "counter", ["event"],
+    lambda: [((event,), value) for event, value in profile_cache.stats().items()
+             if event in ("hits", "misses", "evictions")])
+metrics.REGISTRY.callback(
+    "ridepulse_weather_cache_events_total", "Weather cache lookups and background fetches by kind.", "counter",
+    ["event"],
+    lambda: [((event,), value) for event, value in weather_cache.stats().items()
+             if event in ("hits", "stale", "misses", "fetches", "failures")] if weather_cache is not None else [])
+metrics.REGISTRY.callback(
+    "ridepulse_live_events_total", "Ride events sent to the live analytics by outcome.", "counter", ["outcome"],
+    lambda: [((outcome,), value) for outcome, value in live_aggregates.stats().items()
+             if outcome in ("accepted", "late", "future")] if live_aggregates is not None else [])
+metrics.REGISTRY.callback(
+    "ridepulse_heatmap_push_subscribers", "Clients subscribed to pushed heatmap updates.", "gauge", [],
+    lambda: [((), heatmap_hub.stats()["subscribers"])])
+metrics.REGISTRY.callback(
+    "ridepulse_heatmap_push_cells_total", "Cells considered for pushed heatmap updates by outcome.", "counter",
+    ["outcome"],
+    lambda: [((outcome[len("cells_"):],), value) for outcome, value in heatmap_hub.stats().items()
+             if outcome in ("cells_pushed", "cells_unchanged", "cells_removed")])
+metrics.REGISTRY.callback(
+    "ridepulse_process_memory_bytes", "Resident memory of this worker by kind (rss, pss, shared, private).",
+    "gauge", ["kind"],
+    lambda: [((kind[:-3],), value * 1024 * 1024) for kind, value in (memory_usage() or {}).items()])
+metrics.REGISTRY.callback(
+    "ridepulse_inference_queue_requests", "Requests waiting for the inference batcher.", "gauge", [],
+    lambda: [((), inference_batcher.stats()["queued_requests"])] if inference_batcher is not None else [])
+
+@app.get("/metrics", tags=["General"])
+def get_metrics():
+    """
+    Prometheus metrics: request counts and latency per route, time per request stage
+    (H3 conversion, neighbour search, preprocessing, Pool construction, model predict,
+    serialization...), fallback ring distances, cache counters and the model version.
+    """
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+def check_admin_token(token: Optional[str]):
+    # Fails closed: without a configured token, admin endpoints are refused for everyone.
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN to enable them).")
+    if not secrets.compare_digest(token or "", config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="A valid X-Admin-Token header is required.")
+
+@app.get("/startup", tags=["General"])
+def get_startup_report():
+    """
+    Reports how long each startup phase took, the time to the first prediction and peak RSS.
+    """
+    return startup_profile.report()
+
+@app.get("/memory", tags=["General"])
+def get_memory_usage():
+    """
+    Reports this worker's resident memory, split into pages shared with other workers
+    (pre-fork loading, memory-mapped tables) and pages private to it.
+    """
+    return {"pid": os.getpid(), "memory": memory_usage(), "shared_tables_dir": config.SHARED_TABLES_DIR or None}
+
+@app.get("/model", tags=["General"])
+def get_model_status():
+    """
+    Reports the serving model version, when it was loaded and the recent reloads.
+    """
+    return model_registry.status()
+
+@app.post("/model/reload", status_code=202, tags=["General"])
+def reload_model(response: Response, wait: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """
+    Loads the artifacts in MODEL_DIR (e.g. after train.py), validates and warms them up,
+    then swaps them in. Requests already running finish on the old version. Returns
+    straight away unless `wait` is true.
+    """
+    check_admin_token(x_admin_token)
+    if not wait:
+        if not model_registry.reload_in_background():
+            raise HTTPException(status_code=409, detail="A reload is already running.")
+        return model_registry.status()
+    try:
+        model_registry.reload()
+    except Exception:
+        raise HTTPException(status_code=422, detail=f"The new artifacts were rejected: {model_registry.last_error}")
+    response.status_code = 200
+    return model_registry.status()
+
+
+startup_profile.mark("routes")
+# Loaded last, once everything that prepares the artifacts (cube, hotspot index) is defined.
+try:
+    model_registry.reload(profile=startup_profile)
+except Exception:
+    pass  # Logged by the registry; requests get a 503 until a reload succeeds.
+startup_profile.mark_ready()
+logger.info("✅ Startup: %s", startup_profile.summary())
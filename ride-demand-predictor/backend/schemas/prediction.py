@@ -0,0 +1,116 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, conint, confloat
+
+
+class PredictionInput(BaseModel):
+    latitude: float = Field(..., example=-1.2843, description="Latitude of the location.")
+    longitude: float = Field(..., example=36.8248, description="Longitude of the location.")
+    day_of_week: int = Field(..., ge=0, le=6, example=2, description="Day of the week (0=Monday, 6=Sunday).")
+    hour_of_day: int = Field(..., ge=0, le=23, example=16, description="Hour of the day (0-23).")
+    business_ratio: float = Field(..., ge=0.0, le=1.0, example=0.95, description="Estimated ratio of business rides (0.0 to 1.0).")
+
+class PredictionOutput(BaseModel):
+    requested_h3_cell: str
+    prediction_h3_cell: str
+    predicted_demand: float
+    predicted_demand_rounded: int
+    is_fallback: bool = Field(..., description="True if the prediction is for the nearest known cell, not the exact requested cell.")
+
+
+class BatchPredictionInput(BaseModel):
+    latitudes: List[confloat(ge=-90, le=90)] = Field(..., example=[-1.2843, -1.3178], description="Latitudes of the locations.")
+    longitudes: List[confloat(ge=-180, le=180)] = Field(..., example=[36.8248, 36.8304], description="Longitudes of the locations.")
+    day_of_week: List[conint(ge=0, le=6)] = Field(..., example=[2, 2], description="Day of the week per location (0=Monday, 6=Sunday).")
+    hour_of_day: List[conint(ge=0, le=23)] = Field(..., example=[16, 16], description="Hour of the day per location (0-23).")
+    business_ratio: List[confloat(ge=0.0, le=1.0)] = Field(..., example=[0.95, 0.7], description="Estimated ratio of business rides per location.")
+
+class BatchPredictionOutput(BaseModel):
+    predictions: List[Optional[PredictionOutput]] = Field(..., description="One entry per input location, in order. Null when there is no known ride data near that location.")
+
+
+class HeatmapPoint(BaseModel):
+    h3_cell: str
+    demand: float
+
+class HeatmapOutput(BaseModel):
+    center_h3_cell: str
+    hotspots: List[HeatmapPoint]
+
+class ViewportHeatmapOutput(BaseModel):
+    resolution: int = Field(..., description="H3 resolution of the returned cells, chosen from the zoom level.")
+    hotspots: List[HeatmapPoint] = Field(..., description="Predicted demand summed over each cell's known sub-cells.")
+
+class HeatmapSubscriptionInput(BaseModel):
+    min_lat: float = Field(..., ge=-90, le=90)
+    min_lon: float = Field(..., ge=-180, le=180)
+    max_lat: float = Field(..., ge=-90, le=90)
+    max_lon: float = Field(..., ge=-180, le=180)
+    zoom: int = Field(..., ge=0, le=22, description="Map zoom level; picks the H3 resolution.")
+    day: Optional[int] = Field(None, ge=0, le=6, description="Day of the week. Omit day and hour to follow the current hour.")
+    hour: Optional[int] = Field(None, ge=0, le=23, description="Hour of the day.")
+    hours_ahead: int = Field(0, ge=0, le=167, description="When following the current hour, how many hours ahead to show.")
+
+class DemandProfile(BaseModel):
+    requested_h3_cell: str
+    prediction_h3_cell: str
+    is_fallback: bool
+    demand: List[List[float]] = Field(..., description="Predicted demand per day of the week (0=Monday) and hour of the day: 7 rows of 24 values.")
+
+class DemandProfileOutput(BaseModel):
+    business_ratio: float
+    profiles: List[Optional[DemandProfile]] = Field(..., description="One entry per input location, in order. Null when there is no known ride data near that location.")
+
+class ZoneFlow(BaseModel):
+    h3_cell: str
+    trips: int
+    mean_distance_km: float
+
+class ZoneFlowOutput(BaseModel):
+    h3_cell: str = Field(..., description="The zone containing the requested point.")
+    resolution: int
+    total_trips: int = Field(..., description="All trips out of (outbound) or into (inbound) the zone in this hour.")
+    flows: List[ZoneFlow] = Field(..., description="The busiest other zones, busiest first.")
+
+class ZoneNetFlow(BaseModel):
+    h3_cell: str
+    outbound: int
+    inbound: int
+    net_flow: int = Field(..., description="inbound - outbound: positive where riders end up, negative where they leave from.")
+
+class NetFlowOutput(BaseModel):
+    resolution: int
+    zones: List[ZoneNetFlow] = Field(..., description="Every zone with trips in this hour, from the largest net inflow to the largest net outflow.")
+
+class RideEvent(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90, example=-1.2843, description="Pickup latitude.")
+    longitude: float = Field(..., ge=-180, le=180, example=36.8248, description="Pickup longitude.")
+    placed_at: Optional[datetime] = Field(None, example="2026-10-18T16:05:00+03:00", description="When the ride was placed. Now if omitted; Nairobi time if no timezone is given.")
+    is_business: bool = Field(False, description="Whether it is a business ride.")
+
+class RideEventBatch(BaseModel):
+    events: List[RideEvent]
+
+class RideEventResult(BaseModel):
+    accepted: int
+    rejected: int = Field(..., description="Events older than the live window or placed in a later hour than now; they are not counted.")
+
+class HourlyDemand(BaseModel):
+    hour: int
+    demand_count: int
+    average_demand: float = Field(..., description="Rides in this hour per day covered by the window.")
+    business_ratio: float
+
+class DailyDemand(BaseModel):
+    day_name: str
+    average_demand: float = Field(..., description="Rides on this weekday per occurrence of it in the window.")
+    demand_count: int
+    business_ratio: float
+
+class LiveZone(BaseModel):
+    h3_cell: str
+    latitude: float
+    longitude: float
+    ride_count: int
+    business_ratio: float
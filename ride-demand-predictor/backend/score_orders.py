@@ -0,0 +1,55 @@
+import argparse
+import os
+import time
+
+from core import config
+from services.bulk_scoring import score_file
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`; the data lives in the project's `data/` folder.
+TEST_DATA_PATH = '../../data/Test.csv'
+OUTPUT_PATH = './scored_orders.parquet'
+CHUNK_SIZE = 100_000
+BUSINESS_RATIO = 0.70  # Same default as GET /profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every order in a CSV with the demand model, without the API.")
+    parser.add_argument('--input', default=TEST_DATA_PATH, help="Order CSV (same columns as Train.csv).")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="Where to write the scores: .parquet or .csv.")
+    parser.add_argument('--model-dir', default=config.MODEL_DIR, help="Model artifacts to score with.")
+    parser.add_argument('--neighbor-index-dir', default=None,
+                        help="Fallback index (default: neighbor_index/ in the model directory).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Scoring processes; each loads the model once. 1 scores in this process.")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Rows read and scored per chunk.")
+    parser.add_argument('--business-ratio', type=float, default=BUSINESS_RATIO,
+                        help="Share of business rides assumed for every order.")
+    parser.add_argument('--id-column', default='Order No', help="Input column copied to the output, if present.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: Cannot find order data at '{args.input}'.")
+        return
+    if args.neighbor_index_dir is None:
+        args.neighbor_index_dir = (config.NEIGHBOR_INDEX_DIR if args.model_dir == config.MODEL_DIR
+                                   else os.path.join(args.model_dir, 'neighbor_index'))
+
+    print(f"Scoring '{args.input}' with {args.workers} worker(s), {args.chunksize} rows per chunk...")
+    started = time.perf_counter()
+
+    def report(rows):
+        elapsed = time.perf_counter() - started
+        print(f"  {rows:,} rows scored ({rows / elapsed:,.0f} rows/s)")
+
+    stats = score_file(args.input, args.output, args.model_dir, args.neighbor_index_dir, config.H3_RESOLUTION,
+                       config.FALLBACK_MAX_RING, args.business_ratio, workers=args.workers,
+                       chunksize=args.chunksize, id_column=args.id_column, progress=report)
+    elapsed = time.perf_counter() - started
+    print(f"\nScored {stats['rows']:,} rows in {elapsed:.1f}s ({stats['rows'] / max(elapsed, 1e-9):,.0f} rows/s): "
+          f"{stats['fallback_rows']:,} from a neighbouring cell, {stats['unscored_rows']:,} with no known cell nearby.")
+    print(f"✅ Scores saved to '{args.output}'.")
+
+
+if __name__ == '__main__':
+    main()
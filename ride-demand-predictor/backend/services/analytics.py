@@ -0,0 +1,120 @@
+from collections import Counter
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import h3
+import numpy as np
+import pandas as pd
+
+from core.geo import latlng_to_cells
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Only the columns the analytics need, with compact dtypes.
+ORDER_COLUMNS = {
+    'Placement - Day of Month': 'int16',
+    'Placement - Weekday (Mo = 1)': 'int8',
+    'Placement - Time': 'object',
+    'Pickup Lat': 'float64',
+    'Pickup Long': 'float64',
+}
+
+
+def read_orders(path: str, chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+    """Streams an order CSV in chunks, reading only the columns the analytics use."""
+    return pd.read_csv(path, usecols=list(ORDER_COLUMNS), dtype=ORDER_COLUMNS, chunksize=chunksize)
+
+
+def parse_hours(times: pd.Series) -> np.ndarray:
+    """
+    Hour of day from 'H:MM:SS AM/PM' strings, without a per-row datetime parse.
+    Each distinct time is parsed once; there are at most 86,400 of them.
+    """
+    codes, unique_times = pd.factorize(times)
+    if (codes < 0).any():
+        raise ValueError("Some order times are missing.")
+    unique_times = pd.Series(unique_times)
+    hours = unique_times.str.split(':', n=1).str[0].astype(np.int64).to_numpy() % 12
+    return (hours + np.where(unique_times.str.endswith('PM').to_numpy(), 12, 0))[codes]
+
+
+class DemandAggregates:
+    """
+    Running counts over a stream of orders: rides per hour and weekday, the distinct
+    days of month seen (overall and per weekday) and rides per H3 cell at several
+    resolutions. Memory depends on the number of distinct cells, not on the row count.
+    """
+
+    def __init__(self, resolutions: Sequence[int]):
+        self.resolutions = sorted(set(resolutions), reverse=True)
+        self.rows = 0
+        self.hour_counts = np.zeros(24, dtype=np.int64)
+        self.weekday_counts = np.zeros(7, dtype=np.int64)
+        self.days_of_month = set()
+        self.weekday_days_of_month = [set() for _ in range(7)]
+        self.cell_counts: Dict[int, Counter] = {resolution: Counter() for resolution in self.resolutions}
+
+    def add_chunk(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        hours = parse_hours(chunk['Placement - Time'])
+        self.hour_counts += np.bincount(hours, minlength=24)
+
+        # Weekdays are 1-indexed in the data; use 0=Monday, 6=Sunday like the rest of the app.
+        weekdays = chunk['Placement - Weekday (Mo = 1)'].to_numpy().astype(np.int64) - 1
+        self.weekday_counts += np.bincount(weekdays, minlength=7)
+        days_of_month = chunk['Placement - Day of Month'].to_numpy()
+        self.days_of_month.update(np.unique(days_of_month).tolist())
+        for weekday, day_of_month in np.unique(np.column_stack([weekdays, days_of_month]), axis=0).tolist():
+            self.weekday_days_of_month[weekday].add(day_of_month)
+
+        # Convert coordinates once at the finest resolution, then roll the counts up to
+        # the parents of each distinct cell.
+        finest = self.resolutions[0]
+        cells = pd.Series(latlng_to_cells(chunk['Pickup Lat'], chunk['Pickup Long'], finest))
+        counts = cells.value_counts()
+        for resolution in self.resolutions:
+            if resolution != finest:
+                parents = [h3.cell_to_parent(cell, resolution) for cell in counts.index]
+                counts = counts.groupby(parents).sum()
+            self.cell_counts[resolution].update(counts.to_dict())
+
+    def hourly_demand(self) -> List[dict]:
+        num_days_total = len(self.days_of_month)
+        return [
+            {
+                'hour': hour,
+                'demand_count': int(count),
+                'average_demand': count / num_days_total if num_days_total > 0 else 0,
+            }
+            for hour, count in enumerate(self.hour_counts.tolist()) if count > 0
+        ]
+
+    def daily_demand(self) -> List[dict]:
+        # The average divides by how many of each weekday (e.g. how many Mondays) were seen.
+        return [
+            {
+                'day_name': DAY_NAMES[day],
+                'average_demand': count / len(self.weekday_days_of_month[day]),
+            }
+            for day, count in enumerate(self.weekday_counts.tolist()) if count > 0
+        ]
+
+    def top_cells(self, resolution: int, n: int) -> List[Tuple[str, int]]:
+        # Ties are broken by cell id so rebuilds are reproducible.
+        ranked = sorted(self.cell_counts[resolution].items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:n]
+
+    def zone_counts(self) -> Dict[str, List[dict]]:
+        return {
+            str(resolution): [
+                {'h3_cell': cell, 'ride_count': int(count)}
+                for cell, count in self.top_cells(resolution, len(self.cell_counts[resolution]))
+            ]
+            for resolution in sorted(self.resolutions)
+        }
+
+
+def aggregate_orders(path: str, resolutions: Sequence[int], chunksize: int = 100_000) -> DemandAggregates:
+    aggregates = DemandAggregates(resolutions)
+    for chunk in read_orders(path, chunksize):
+        aggregates.add_chunk(chunk)
+    return aggregates
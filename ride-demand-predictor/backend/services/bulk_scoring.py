@@ -0,0 +1,230 @@
+"""
+Offline scoring of order files, without going through the API. Orders are read in
+chunks and scored across a pool of processes, each of which loads the model once.
+Every order is mapped to its pickup H3 cell and scored there; unknown cells fall back
+to their nearest known cells like the API does, and the best of those is reported.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.geo import latlng_to_uint64, uint64_to_cells
+from services.analytics import parse_hours
+from services.prediction_service import Predictor
+
+# Only the columns scoring needs, as in the feature store: demand is keyed on the placement time.
+SCORING_COLUMNS = {
+    'Placement - Weekday (Mo = 1)': 'int8',
+    'Placement - Time': 'object',
+    'Pickup Lat': 'float64',
+    'Pickup Long': 'float64',
+}
+# Chunks waiting for or being scored, per worker. Bounds memory on files of any size.
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+
+def _format_cells(cells: np.ndarray) -> np.ndarray:
+    """Hex strings for uint64 cells, formatting each distinct cell once."""
+    codes, unique_cells = pd.factorize(cells)
+    return np.array(uint64_to_cells(unique_cells), dtype=object)[codes]
+
+
+class ChunkScorer:
+    """
+    The predictor one process scores with, and its fallback results: they are kept per
+    distinct unknown cell for the whole run.
+    """
+
+    def __init__(self, predictor: Predictor, business_ratio: float, id_column: Optional[str] = None):
+        self.predictor = predictor
+        self.business_ratio = business_ratio
+        self.id_column = id_column
+        self._fallbacks: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, model_dir: str, index_dir: str, h3_resolution: int, max_ring: int, business_ratio: float,
+             id_column: Optional[str] = None, thread_count: int = -1) -> "ChunkScorer":
+        predictor = Predictor.load(model_dir, h3_resolution, max_ring, index_dir)
+        predictor.artifacts.thread_count = thread_count
+        return cls(predictor, business_ratio, id_column)
+
+    def nearest_known(self, h3_cell: int) -> np.ndarray:
+        """The known uint64 cells an unknown cell falls back to (empty if none is close enough)."""
+        if h3_cell not in self._fallbacks:
+            self._fallbacks[h3_cell] = self.predictor.nearest_known(h3_cell)[1]
+        return self._fallbacks[h3_cell]
+
+    def score(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Scores one chunk of orders. Every candidate (cell, day, hour) is scored once, however
+        many orders share it, in a single model call. Orders with no known cell nearby get
+        an empty prediction cell and a demand of NaN.
+        """
+        n_rows = len(chunk)
+        cells = latlng_to_uint64(chunk['Pickup Lat'], chunk['Pickup Long'], self.predictor.h3_resolution)
+        # Weekdays are 1-indexed in the data; the model uses 0=Monday, 6=Sunday.
+        days = chunk['Placement - Weekday (Mo = 1)'].to_numpy().astype(np.int64) - 1
+        hours = parse_hours(chunk['Placement - Time'])
+
+        # Candidate rows: the order's own cell when known, otherwise each of its fallback cells.
+        known = self.predictor.artifacts.is_known(cells)
+        unknown_rows = np.flatnonzero(~known)
+        unknown_cells, inverse = np.unique(cells[unknown_rows], return_inverse=True)
+        fallbacks = [self.nearest_known(cell) for cell in unknown_cells.tolist()]
+        fallback_counts = np.fromiter((len(f) for f in fallbacks), dtype=np.intp, count=len(fallbacks))
+        fallback_starts = np.concatenate([[0], np.cumsum(fallback_counts)[:-1]]).astype(np.intp)
+        row_counts = fallback_counts[inverse]
+        row_offsets = np.concatenate([[0], np.cumsum(row_counts)[:-1]]).astype(np.intp)
+        positions = np.arange(row_counts.sum()) + np.repeat(fallback_starts[inverse] - row_offsets, row_counts)
+        all_fallbacks = np.concatenate(fallbacks) if fallbacks else np.empty(0, dtype=np.uint64)
+
+        owners = np.concatenate([np.flatnonzero(known), np.repeat(unknown_rows, row_counts)])
+        candidates = np.concatenate([cells[known], all_fallbacks[positions]])
+        slots = days[owners] * 24 + hours[owners]
+
+        # Many orders share a cell and hour: score each distinct pair once.
+        cell_codes, unique_candidates = pd.factorize(candidates)
+        unique_keys, key_inverse = np.unique(cell_codes * 168 + slots, return_inverse=True)
+        predictions = np.empty(0)
+        if len(unique_keys):
+            unique_slots = unique_keys % 168
+            predictions = np.asarray(self.predictor.score_cells(
+                unique_candidates[unique_keys // 168], unique_slots // 24, unique_slots % 24, self.business_ratio))
+        candidate_predictions = predictions[key_inverse.ravel()]
+
+        # The best candidate per order; ties go to the lowest cell, as in the API.
+        order = np.lexsort((candidates, -candidate_predictions, owners))
+        first = order[np.concatenate([[True], owners[order][1:] != owners[order][:-1]])] if len(order) else order
+        prediction_cells = np.zeros(n_rows, dtype=np.uint64)
+        predicted_demand = np.full(n_rows, np.nan)
+        prediction_cells[owners[first]] = candidates[first]
+        predicted_demand[owners[first]] = candidate_predictions[first]
+
+        found = prediction_cells != 0
+        scored = pd.DataFrame({
+            'requested_h3_cell': _format_cells(cells),
+            'prediction_h3_cell': np.where(found, _format_cells(prediction_cells), None),
+            'day_of_week': days,
+            'hour_of_day': hours,
+            'predicted_demand': predicted_demand,
+            'is_fallback': found & ~known,
+        })
+        if self.id_column:
+            scored.insert(0, self.id_column, chunk[self.id_column].to_numpy())
+        return scored
+
+
+# The scorer of a pool worker process, loaded once by its initializer.
+_worker_scorer: Optional[ChunkScorer] = None
+
+
+def _init_worker(*args):
+    global _worker_scorer
+    _worker_scorer = ChunkScorer.load(*args)
+
+
+def _score_in_worker(chunk: pd.DataFrame) -> pd.DataFrame:
+    return _worker_scorer.score(chunk)
+
+
+def score_chunks(chunks: Iterator[pd.DataFrame], workers: int, scorer_args: tuple) -> Iterator[pd.DataFrame]:
+    """
+    Scores chunks in order. With more than one worker, chunks are handed to a process pool,
+    and only a few per worker are read ahead.
+    """
+    if workers <= 1:
+        scorer = ChunkScorer.load(*scorer_args)
+        for chunk in chunks:
+            yield scorer.score(chunk)
+        return
+
+    # Each worker gets its share of the cores for CatBoost, instead of all of them.
+    thread_count = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=scorer_args + (thread_count,)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_in_worker, chunk))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _CsvWriter:
+    def __init__(self, path: str):
+        self.file = open(path, 'w', newline='')
+        self.header = True
+
+    def write(self, frame: pd.DataFrame):
+        frame.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.writer = None
+
+    def write(self, frame: pd.DataFrame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            # Fixed types, so a first chunk with no predictions does not decide them.
+            self.schema = pa.schema([
+                (name, pa.from_numpy_dtype(frame[name].dtype) if pd.api.types.is_numeric_dtype(frame[name]) else pa.string())
+                for name in frame.columns
+            ])
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def score_file(input_path: str, output_path: str, model_dir: str, index_dir: str, h3_resolution: int,
+               max_ring: int, business_ratio: float, workers: int = 1, chunksize: int = 100_000,
+               id_column: Optional[str] = 'Order No',
+               progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+    """
+    Scores every order in a CSV and writes one row per order to `output_path`: Parquet if
+    it ends in '.parquet', CSV otherwise. The file appears once all rows are written.
+    `id_column` is copied to the output when the input has it. `progress` is called with
+    the number of rows written after each chunk.
+    """
+    columns = dict(SCORING_COLUMNS)
+    if id_column and id_column in pd.read_csv(input_path, nrows=0).columns:
+        columns[id_column] = 'object'
+    else:
+        id_column = None
+    chunks = pd.read_csv(input_path, usecols=list(columns), dtype=columns, chunksize=chunksize)
+    scorer_args = (model_dir, index_dir, h3_resolution, max_ring, business_ratio, id_column)
+
+    staging_path = f"{output_path}.partial"
+    writer = _ParquetWriter(staging_path) if output_path.endswith('.parquet') else _CsvWriter(staging_path)
+    stats = {'rows': 0, 'fallback_rows': 0, 'unscored_rows': 0}
+    try:
+        for scored in score_chunks(chunks, workers, scorer_args):
+            writer.write(scored)
+            stats['rows'] += len(scored)
+            stats['fallback_rows'] += int(scored['is_fallback'].sum())
+            stats['unscored_rows'] += int(scored['prediction_h3_cell'].isna().sum())
+            if progress is not None:
+                progress(stats['rows'])
+        writer.close()
+    except BaseException:
+        writer.close()
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+    os.replace(staging_path, output_path)
+    return stats
@@ -0,0 +1,147 @@
+import time
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+
+DAYS_PER_WEEK = 7
+HOURS_PER_DAY = 24
+
+# predict_fn(h3_cells, day_of_week, hour_of_day, business_ratio) -> array of predictions,
+# with one row per cell. Day, hour and ratio may be scalars or arrays of the same length.
+PredictFn = Callable[..., np.ndarray]
+
+
+class DemandCube:
+    """
+    Model predictions precomputed for every (known cell, weekday, hour) over a grid of
+    business ratios in [0, 1]. With `ratio_cuts` (the ratios where the model's prediction
+    can change, see ModelArtifacts.business_ratio_cuts) there is one grid point per interval
+    between cuts and lookups are exact. Otherwise the grid is uniform and lookups interpolate
+    linearly between grid points, with the error measured at build time.
+    """
+
+    def __init__(self, cells: np.ndarray, ratio_grid: np.ndarray, values: np.ndarray,
+                 ratio_cuts: Optional[np.ndarray] = None):
+        # cells are sorted uint64. values has shape (n_cells, 7, 24, n_ratios) so the two
+        # grid points used by an interpolation sit next to each other in memory.
+        self.cells = cells
+        self.ratio_grid = ratio_grid
+        self.values = values
+        self.ratio_cuts = ratio_cuts
+        self.build_seconds = 0.0
+        self.error_bound: Dict[str, float] = {}
+
+    @classmethod
+    def build(cls, predict_fn: PredictFn, cells: np.ndarray, ratio_steps: int = 11,
+              dtype: str = "float32", validation_samples: int = 2000,
+              ratio_cuts: Optional[np.ndarray] = None) -> "DemandCube":
+        """
+        Evaluates the model over the whole input space, then measures the lookup error.
+        `ratio_steps` sets the uniform grid, and is ignored when `ratio_cuts` are given.
+        """
+        if ratio_cuts is not None:
+            ratio_cuts = np.asarray(ratio_cuts, dtype=np.float64)
+            ratio_grid = np.concatenate([[0.0], ratio_cuts])  # The first ratio of each interval
+        elif ratio_steps < 2:
+            raise ValueError("The demand cube needs at least 2 business ratio grid points.")
+        else:
+            ratio_grid = np.linspace(0.0, 1.0, ratio_steps)
+
+        started = time.perf_counter()
+        cells = np.unique(np.asarray(cells, dtype=np.uint64))
+        n_cells = len(cells)
+        values = np.empty((n_cells, DAYS_PER_WEEK, HOURS_PER_DAY, len(ratio_grid)), dtype=dtype)
+
+        # One model call per grid point, covering every cell/day/hour combination in order.
+        slots = DAYS_PER_WEEK * HOURS_PER_DAY
+        grid_cells = np.repeat(cells, slots)
+        grid_days = np.tile(np.repeat(np.arange(DAYS_PER_WEEK), HOURS_PER_DAY), n_cells)
+        grid_hours = np.tile(np.arange(HOURS_PER_DAY), DAYS_PER_WEEK * n_cells)
+        for j, ratio in enumerate(ratio_grid):
+            predictions = predict_fn(grid_cells, grid_days, grid_hours, float(ratio))
+            values[:, :, :, j] = np.asarray(predictions).reshape(n_cells, DAYS_PER_WEEK, HOURS_PER_DAY)
+
+        cube = cls(cells, ratio_grid, values, ratio_cuts)
+        if validation_samples > 0:
+            cube.error_bound = cube.measure_error(predict_fn, validation_samples)
+        cube.build_seconds = time.perf_counter() - started
+        return cube
+
+    def measure_error(self, predict_fn: PredictFn, samples: int, seed: int = 42) -> Dict[str, float]:
+        """Compares cube lookups against the live model on random inputs between grid points."""
+        rng = np.random.default_rng(seed)
+        cell_ids = rng.integers(0, len(self.cells), samples)
+        days = rng.integers(0, DAYS_PER_WEEK, samples)
+        hours = rng.integers(0, HOURS_PER_DAY, samples)
+        ratios = rng.uniform(0.0, 1.0, samples)
+
+        sample_cells = self.cells[cell_ids]
+        live = np.asarray(predict_fn(sample_cells, days, hours, ratios), dtype=np.float64)
+        approx = self._values(cell_ids, days, hours, ratios)
+        abs_error = np.abs(approx - live)
+        return {
+            "samples": int(samples),
+            "max_abs_error": float(abs_error.max()),
+            "p99_abs_error": float(np.percentile(abs_error, 99)),
+            "mean_abs_error": float(abs_error.mean()),
+        }
+
+    def lookup(self, h3_cells: np.ndarray, day_of_week, hour_of_day, business_ratio) -> np.ndarray:
+        """
+        Returns predictions for known uint64 cells. Day, hour and ratio may be scalars or arrays.
+        Raises ValueError for a day or hour out of range, or a cell the cube does not hold.
+        """
+        days = np.asarray(day_of_week)
+        hours = np.asarray(hour_of_day)
+        if ((days < 0) | (days >= DAYS_PER_WEEK)).any() or ((hours < 0) | (hours >= HOURS_PER_DAY)).any():
+            raise ValueError(f"Days must be in [0, {DAYS_PER_WEEK}) and hours in [0, {HOURS_PER_DAY}).")
+        h3_cells = np.asarray(h3_cells, dtype=np.uint64)
+        cell_ids = np.searchsorted(self.cells, h3_cells)
+        if len(h3_cells) and (cell_ids.max() >= len(self.cells) or (self.cells[cell_ids] != h3_cells).any()):
+            raise ValueError("The demand cube only holds the model's known cells.")
+        return self._values(cell_ids, days, hours, business_ratio)
+
+    def _values(self, cell_ids, day_of_week, hour_of_day, business_ratio) -> np.ndarray:
+        ratios = np.clip(np.asarray(business_ratio, dtype=np.float64), 0.0, 1.0)
+        block = self.values[cell_ids, day_of_week, hour_of_day]  # (n, n_ratios)
+        rows = np.arange(len(cell_ids))
+        if self.ratio_cuts is not None:
+            # Predictions are constant between cuts: pick the interval's grid point.
+            index = np.broadcast_to(np.searchsorted(self.ratio_cuts, ratios, side="right"), rows.shape)
+            return block[rows, index].astype(np.float64)
+
+        steps = len(self.ratio_grid) - 1
+        position = ratios * steps
+        lower = np.minimum(np.floor(position).astype(np.intp), steps - 1)
+        weight = position - lower
+        lower = np.broadcast_to(lower, rows.shape)
+        lower_values = block[rows, lower].astype(np.float64)
+        upper_values = block[rows, lower + 1].astype(np.float64)
+        return lower_values * (1.0 - weight) + upper_values * weight
+
+    def to_arrays(self):
+        """Arrays and metadata for services/shared_tables.py."""
+        arrays = {"cells": self.cells, "ratio_grid": self.ratio_grid, "values": self.values}
+        if self.ratio_cuts is not None:
+            arrays["ratio_cuts"] = self.ratio_cuts
+        return arrays, {"build_seconds": self.build_seconds, "error_bound": self.error_bound}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: dict) -> "DemandCube":
+        cube = cls(arrays["cells"], arrays["ratio_grid"], arrays["values"], arrays.get("ratio_cuts"))
+        cube.build_seconds = meta["build_seconds"]
+        cube.error_bound = meta["error_bound"]
+        return cube
+
+    def stats(self) -> dict:
+        return {
+            "cells": len(self.cells),
+            "ratio_grid": np.round(self.ratio_grid, 6).tolist(),
+            # "model_borders": exact lookups; "uniform": interpolated, see error_bound
+            "ratio_grid_kind": "uniform" if self.ratio_cuts is None else "model_borders",
+            "dtype": str(self.values.dtype),
+            "size_bytes": int(self.values.nbytes),
+            "build_seconds": round(self.build_seconds, 3),
+            "error_bound": self.error_bound,
+        }
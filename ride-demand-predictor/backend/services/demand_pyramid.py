@@ -0,0 +1,146 @@
+import time
+from typing import Callable, Dict, Sequence, Tuple
+
+import numpy as np
+
+from core.geo import (bbox_to_cells, cell_centers, cell_resolutions, cells_to_parents, centers_in_bbox,
+                      estimate_bbox_cells)
+
+DAYS_PER_WEEK = 7
+HOURS_PER_DAY = 24
+
+# Map zoom (web map tiles) to the H3 resolution whose hexagons are a few pixels to a
+# few dozen pixels across: (minimum zoom, resolution), checked from the top.
+ZOOM_RESOLUTIONS = ((16, 12), (14, 10), (12, 9), (0, 7))
+
+
+class DemandPyramid:
+    """
+    Predicted demand for every known cell and every (day, hour), summed up to coarser
+    parent resolutions. Each level holds sorted uint64 cells and a (cells, 7, 24) array.
+    """
+
+    def __init__(self, levels: Dict[int, Tuple[np.ndarray, np.ndarray]], business_ratio: float):
+        self.levels = levels
+        self.business_ratio = business_ratio
+        self.build_seconds = 0.0
+        self._centers: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}  # Per level, computed on first use
+
+    @classmethod
+    def build(cls, predict_fn: Callable[..., np.ndarray], known_cells: np.ndarray,
+              resolutions: Sequence[int], business_ratio: float = 0.70) -> "DemandPyramid":
+        started = time.perf_counter()
+        cells = np.unique(np.asarray(known_cells, dtype=np.uint64))
+        n_cells = len(cells)
+        base_resolution = int(cell_resolutions(cells[:1])[0])
+
+        slots = DAYS_PER_WEEK * HOURS_PER_DAY
+        predictions = np.asarray(predict_fn(
+            np.repeat(cells, slots),
+            np.tile(np.repeat(np.arange(DAYS_PER_WEEK), HOURS_PER_DAY), n_cells),
+            np.tile(np.arange(HOURS_PER_DAY), DAYS_PER_WEEK * n_cells),
+            business_ratio,
+        ), dtype=np.float32).reshape(n_cells, DAYS_PER_WEEK, HOURS_PER_DAY)
+
+        levels = {}
+        for resolution in sorted(set(resolutions), reverse=True):
+            if resolution > base_resolution:
+                raise ValueError(f"Pyramid resolution {resolution} is finer than the model's ({base_resolution}).")
+            if resolution == base_resolution:
+                levels[resolution] = (cells, predictions)
+                continue
+            parents = cells_to_parents(cells, resolution)
+            parent_cells, inverse = np.unique(parents, return_inverse=True)
+            totals = np.zeros((len(parent_cells), DAYS_PER_WEEK, HOURS_PER_DAY), dtype=np.float32)
+            np.add.at(totals, inverse.ravel(), predictions)
+            levels[resolution] = (parent_cells, totals)
+
+        pyramid = cls(levels, business_ratio)
+        pyramid.build_seconds = time.perf_counter() - started
+        return pyramid
+
+    def resolution_for_zoom(self, zoom: int) -> int:
+        for min_zoom, resolution in ZOOM_RESOLUTIONS:
+            if zoom >= min_zoom:
+                return self.nearest_level(resolution)
+        return self.coarsest_level()
+
+    def viewport_level(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int,
+                       max_cells: int) -> int:
+        """The level for a zoom, made coarser until the box covers at most `max_cells` cells (if it can)."""
+        resolution = self.resolution_for_zoom(zoom)
+        while estimate_bbox_cells(min_lat, min_lon, max_lat, max_lon, resolution) > max_cells:
+            coarser = self.coarser_level(resolution)
+            if coarser is None:
+                break
+            resolution = coarser
+        return resolution
+
+    def viewport_cells(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int,
+                       max_cells: int) -> Tuple[int, np.ndarray]:
+        """
+        The level for a viewport (see viewport_level) and the candidate cells covering it.
+        When the box covers more cells than the level holds (a zoomed-out map, a low-zoom
+        tile, a box spanning half the globe), the level's own cells are filtered by their
+        centers instead of filling the box, so the cost never exceeds one pass over a level.
+        """
+        resolution = self.viewport_level(min_lat, min_lon, max_lat, max_lon, zoom, max_cells)
+        level_cells, _ = self.levels[resolution]
+        if (max_lon - min_lon >= 180
+                or estimate_bbox_cells(min_lat, min_lon, max_lat, max_lon, resolution) > len(level_cells)):
+            latitudes, longitudes = self.level_centers(resolution)
+            inside = centers_in_bbox(latitudes, longitudes, min_lat, min_lon, max_lat, max_lon, resolution)
+            return resolution, level_cells[inside]
+        return resolution, bbox_to_cells(min_lat, min_lon, max_lat, max_lon, resolution)
+
+    def level_centers(self, resolution: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(latitudes, longitudes) of the centers of a level's cells."""
+        centers = self._centers.get(resolution)
+        if centers is None:
+            centers = self._centers[resolution] = cell_centers(self.levels[resolution][0])
+        return centers
+
+    def nearest_level(self, resolution: int) -> int:
+        """The finest built level that is not finer than the requested resolution."""
+        available = [level for level in self.levels if level <= resolution]
+        return max(available) if available else self.coarsest_level()
+
+    def coarsest_level(self) -> int:
+        return min(self.levels)
+
+    def coarser_level(self, resolution: int):
+        coarser = [level for level in self.levels if level < resolution]
+        return max(coarser) if coarser else None
+
+    def query(self, resolution: int, candidate_cells: np.ndarray, day: int, hour: int):
+        """Demand for the candidate cells (uint64) that exist at this level."""
+        level_cells, values = self.levels[resolution]
+        if len(level_cells) == 0 or len(candidate_cells) == 0:
+            return candidate_cells[:0], np.empty(0, dtype=np.float32)
+        positions = np.minimum(np.searchsorted(level_cells, candidate_cells), len(level_cells) - 1)
+        found = level_cells[positions] == candidate_cells
+        return candidate_cells[found], values[positions[found], day, hour]
+
+    def to_arrays(self):
+        """Arrays and metadata for services/shared_tables.py."""
+        arrays = {}
+        for resolution, (cells, values) in self.levels.items():
+            arrays[f"cells_{resolution}"] = cells
+            arrays[f"values_{resolution}"] = values
+        return arrays, {"resolutions": sorted(self.levels), "business_ratio": self.business_ratio,
+                        "build_seconds": self.build_seconds}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: dict) -> "DemandPyramid":
+        levels = {resolution: (arrays[f"cells_{resolution}"], arrays[f"values_{resolution}"])
+                  for resolution in meta["resolutions"]}
+        pyramid = cls(levels, meta["business_ratio"])
+        pyramid.build_seconds = meta["build_seconds"]
+        return pyramid
+
+    def stats(self) -> dict:
+        return {
+            "business_ratio": self.business_ratio,
+            "build_seconds": round(self.build_seconds, 3),
+            "levels": {resolution: len(cells) for resolution, (cells, _) in sorted(self.levels.items())},
+        }
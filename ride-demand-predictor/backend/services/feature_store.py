@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.geo import latlng_to_cells
+from services.analytics import parse_hours
+
+# Columns read from order files, with compact dtypes.
+TRAINING_COLUMNS = {
+    'Placement - Weekday (Mo = 1)': 'int8',
+    'Placement - Time': 'object',
+    'Pickup Lat': 'float64',
+    'Pickup Long': 'float64',
+    'Personal or Business': 'category',
+}
+# Identifies an order across files, so one that appears in several is only counted once.
+ORDER_ID_COLUMN = 'Order No'
+KEY_COLUMNS = ['h3_cell', 'day_of_week', 'hour_of_day']
+COUNT_COLUMNS = ['ride_count', 'business_count']
+MANIFEST_FILE = 'manifest.json'
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def aggregate_order_file(path: str, resolution: int, chunksize: int = 100_000) -> pd.DataFrame:
+    """
+    Per-(cell, day, hour) ride and business-ride counts for one order file.
+    Counts (rather than ratios) are kept so aggregates from different files can be summed.
+    """
+    partials = [aggregate_orders(chunk, resolution) for chunk in
+                pd.read_csv(path, usecols=list(TRAINING_COLUMNS), dtype=TRAINING_COLUMNS, chunksize=chunksize)]
+    return merge_aggregates(partials)
+
+
+def aggregate_orders(orders: pd.DataFrame, resolution: int) -> pd.DataFrame:
+    rides = pd.DataFrame({
+        'h3_cell': latlng_to_cells(orders['Pickup Lat'], orders['Pickup Long'], resolution),
+        # Weekdays are 1-indexed in the data; the model uses 0=Monday, 6=Sunday.
+        'day_of_week': orders['Placement - Weekday (Mo = 1)'].to_numpy().astype(np.int8) - 1,
+        'hour_of_day': parse_hours(orders['Placement - Time']).astype(np.int8),
+        'ride_count': 1,
+        'business_count': (orders['Personal or Business'] == 'Business').to_numpy().astype(np.int64),
+    })
+    return rides.groupby(KEY_COLUMNS, as_index=False)[COUNT_COLUMNS].sum()
+
+
+def merge_aggregates(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    if not frames:
+        return pd.DataFrame(columns=KEY_COLUMNS + COUNT_COLUMNS)
+    combined = pd.concat(frames, ignore_index=True)
+    return combined.groupby(KEY_COLUMNS, as_index=False)[COUNT_COLUMNS].sum()
+
+
+class FeatureStore:
+    """
+    Persisted, mergeable per-(cell, day, hour) ride aggregates, one Parquet file per
+    day of week. A manifest records which order files (by content hash) have already
+    been merged, so each file is only ever aggregated once. The IDs of the orders each
+    file contributed are kept too (one Parquet file per ingest under `orders/`), so
+    orders that also appear in an earlier file, or twice in one, are counted once.
+
+    An ingest rewrites the day partitions it touches in full, and train.py refits on
+    the whole store: the store holds one row per (cell, day, hour), so both stay small
+    however many orders are merged in.
+
+    An ingest first writes the merged partitions next to the live ones, then records
+    them as pending in the manifest, then moves them into place and marks the file
+    ingested. If it is interrupted after the manifest write, the next FeatureStore
+    opened on the directory finishes moving them, so a retry never merges a file twice.
+    """
+
+    def __init__(self, directory: str, resolution: int = 12):
+        self.directory = directory
+        self.resolution = resolution
+        self.manifest = {'resolution': resolution, 'files': {}}
+        manifest_path = os.path.join(directory, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            if self.manifest['resolution'] != resolution:
+                raise ValueError(f"The feature store at '{directory}' was built at H3 resolution "
+                                 f"{self.manifest['resolution']}, not {resolution}.")
+        self._recover()
+
+    def _partition_path(self, day_of_week: int) -> str:
+        return os.path.join(self.directory, f'day_of_week={day_of_week}', 'aggregates.parquet')
+
+    def _staged_path(self, day_of_week: int) -> str:
+        return self._partition_path(day_of_week) + '.pending'
+
+    def _orders_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'orders', f'{digest}.parquet')
+
+    def _order_ids(self) -> set:
+        """IDs of every order merged so far. Files ingested before IDs were kept have none."""
+        ids = set()
+        for digest in self.manifest['files']:
+            if os.path.exists(self._orders_path(digest)):
+                ids.update(pd.read_parquet(self._orders_path(digest))['order_id'].tolist())
+        return ids
+
+    def _recover(self):
+        """Finishes an ingest recorded as pending, and drops partitions staged by one that was not."""
+        pending = self.manifest.pop('pending', None)
+        if pending is not None:
+            self._commit(pending)
+        staged = [self._staged_path(day_of_week) for day_of_week in range(7)]
+        orders_dir = os.path.join(self.directory, 'orders')
+        if os.path.isdir(orders_dir):
+            staged += [os.path.join(orders_dir, name) for name in os.listdir(orders_dir) if name.endswith('.pending')]
+        for path in staged:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _commit(self, pending: dict):
+        # Staged files already moved into place are gone, so this can run more than once.
+        staged = [(self._staged_path(day_of_week), self._partition_path(day_of_week)) for day_of_week in pending['days']]
+        orders_path = self._orders_path(pending['digest'])
+        staged.append((orders_path + '.pending', orders_path))
+        for staged_path, path in staged:
+            if os.path.exists(staged_path):
+                os.replace(staged_path, path)
+        self.manifest['files'][pending['digest']] = pending['entry']
+        self._save_manifest()
+
+    def ingest(self, path: str, chunksize: int = 100_000) -> Optional[dict]:
+        """
+        Aggregates an order file and merges it in. Returns its manifest entry, or None if it
+        was already ingested. Orders already in the store are skipped and counted in the entry.
+        """
+        digest = file_digest(path)
+        if digest in self.manifest['files']:
+            return None
+
+        seen = self._order_ids()
+        partials, new_ids, duplicates = [], [], 0
+        for chunk in pd.read_csv(path, usecols=list(TRAINING_COLUMNS) + [ORDER_ID_COLUMN],
+                                 dtype={**TRAINING_COLUMNS, ORDER_ID_COLUMN: 'object'}, chunksize=chunksize):
+            ids = chunk[ORDER_ID_COLUMN]
+            is_new = ~(ids.isin(seen) | ids.duplicated())
+            duplicates += int((~is_new).sum())
+            counted = ids[is_new].tolist()
+            seen.update(counted)
+            new_ids.extend(counted)
+            partials.append(aggregate_orders(chunk[is_new], self.resolution))
+        new_aggregates = merge_aggregates(partials)
+        # Only the day partitions that received new rows are rewritten.
+        days = []
+        for day_of_week, new_rows in new_aggregates.groupby('day_of_week'):
+            day_of_week = int(day_of_week)
+            partition_path = self._partition_path(day_of_week)
+            frames = [new_rows]
+            if os.path.exists(partition_path):
+                frames.insert(0, pd.read_parquet(partition_path))
+            merged = merge_aggregates(frames)
+            os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+            merged.to_parquet(self._staged_path(day_of_week), index=False)
+            days.append(day_of_week)
+        orders_path = self._orders_path(digest)
+        os.makedirs(os.path.dirname(orders_path), exist_ok=True)
+        pd.DataFrame({'order_id': new_ids}, dtype='object').to_parquet(orders_path + '.pending', index=False)
+
+        pending = {
+            'digest': digest,
+            'days': days,
+            'entry': {
+                'path': os.path.abspath(path),
+                'rides': int(new_aggregates['ride_count'].sum()),
+                'duplicate_orders': duplicates,
+                'ingested_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            },
+        }
+        # From here on the ingest is committed: it is finished on the next open if interrupted.
+        self.manifest['pending'] = pending
+        self._save_manifest()
+        del self.manifest['pending']
+        self._commit(pending)
+        return pending['entry']
+
+    def _save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def load(self) -> pd.DataFrame:
+        frames = [pd.read_parquet(self._partition_path(day)) for day in range(7)
+                  if os.path.exists(self._partition_path(day))]
+        if not frames:
+            return pd.DataFrame(columns=KEY_COLUMNS + COUNT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def fingerprint(self) -> str:
+        """Identifies the set of ingested files, for stamping the model built from them."""
+        return hashlib.sha256(''.join(sorted(self.manifest['files'])).encode()).hexdigest()[:8]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'files': len(self.manifest['files']),
+            'rides': sum(entry['rides'] for entry in self.manifest['files'].values()),
+        }
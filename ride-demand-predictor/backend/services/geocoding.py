@@ -0,0 +1,135 @@
+import csv
+import json
+import os
+import time
+from typing import List, Optional, Sequence
+
+import h3
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class NominatimGeocoder:
+    """Reverse geocoding over HTTP, rate limited to Nominatim's one request per second."""
+
+    def __init__(self, user_agent: str = 'RidePulse-Nairobi-App/1.0 (your-email@example.com)',
+                 min_interval: float = 1.1, timeout: float = 10):
+        self.user_agent = user_agent
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self._last_request = 0.0
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        import requests  # Only needed when we actually go to the network
+
+        # Only wait for what is left of the interval since the previous request.
+        wait = self.min_interval - (time.monotonic() - self._last_request)
+        if wait > 0:
+            time.sleep(wait)
+        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}"
+        # Nominatim requires a descriptive User-Agent header for API calls.
+        headers = {'User-Agent': self.user_agent}
+        try:
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+            response.raise_for_status() # Raises an exception for bad status codes (4xx or 5xx)
+            address = response.json().get('address', {})
+            # Prioritize more specific names first, falling back to broader ones.
+            return address.get('road', address.get('neighbourhood', address.get('suburb', 'Unknown Area')))
+        except Exception as e:
+            print(f"--> Geocoding error for {lat},{lon}: {e}")
+            return None
+        finally:
+            self._last_request = time.monotonic()
+
+    def reverse_many(self, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[str]]:
+        return [self.reverse(lat, lon) for lat, lon in zip(lats, lons)]
+
+
+class GazetteerGeocoder:
+    """
+    Offline reverse geocoding: the nearest named place in a local gazetteer CSV with
+    `name`, `latitude` and `longitude` columns (e.g. exported from OpenStreetMap or
+    GeoNames). Places further than `max_distance_km` away are not used.
+    """
+
+    def __init__(self, path: str, max_distance_km: float = 2.0):
+        from sklearn.neighbors import BallTree
+
+        names, coords = [], []
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                names.append(row['name'])
+                coords.append((float(row['latitude']), float(row['longitude'])))
+        if not names:
+            raise ValueError(f"The gazetteer at '{path}' has no places.")
+        self.names = names
+        self.max_distance_km = max_distance_km
+        self._tree = BallTree(np.radians(coords), metric='haversine')
+
+    def reverse_many(self, lats: Sequence[float], lons: Sequence[float]) -> List[Optional[str]]:
+        if len(lats) == 0:
+            return []
+        distances, indices = self._tree.query(np.radians(np.column_stack([lats, lons])), k=1)
+        distances_km = distances[:, 0] * EARTH_RADIUS_KM
+        return [
+            self.names[i] if distance <= self.max_distance_km else None
+            for i, distance in zip(indices[:, 0].tolist(), distances_km.tolist())
+        ]
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        return self.reverse_many([lat], [lon])[0]
+
+
+class CachedGeocoder:
+    """
+    Names H3 cells through a persistent on-disk cache. Misses go to each backend in
+    order (e.g. an offline gazetteer, then the rate-limited HTTP geocoder), and every
+    resolved name is written back so rebuilds never repeat a lookup.
+    """
+
+    def __init__(self, cache_path: str, backends: Sequence = ()):
+        self.cache_path = cache_path
+        self.backends = list(backends)
+        self.cache = {}
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                self.cache = json.load(f)
+        self.hits = 0
+        self.misses = 0
+
+    def names_for_cells(self, h3_cells: Sequence[str]) -> List[Optional[str]]:
+        names = [self.cache.get(cell) for cell in h3_cells]
+        missing = [i for i, name in enumerate(names) if name is None]
+        self.hits += len(names) - len(missing)
+        self.misses += len(missing)
+
+        resolved_any = False
+        for backend in self.backends:
+            if not missing:
+                break
+            centers = [h3.cell_to_latlng(h3_cells[i]) for i in missing]
+            resolved = backend.reverse_many([lat for lat, _ in centers], [lon for _, lon in centers])
+            for i, name in zip(missing, resolved):
+                if name is not None:
+                    names[i] = name
+                    self.cache[h3_cells[i]] = name
+                    resolved_any = True
+            missing = [i for i in missing if names[i] is None]
+
+        if resolved_any:
+            self.save()
+        return names
+
+    def name_for_cell(self, h3_cell: str) -> Optional[str]:
+        return self.names_for_cells([h3_cell])[0]
+
+    def save(self):
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # Write then rename, so an interrupted run never leaves a truncated cache.
+        temporary_path = self.cache_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.cache, f, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.cache_path)
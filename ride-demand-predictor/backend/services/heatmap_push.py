@@ -0,0 +1,305 @@
+"""
+Heatmap updates pushed to subscribed clients over the /heatmap/subscribe WebSocket.
+
+A client registers a viewport and a time, either a fixed (day, hour) or the current hour
+plus `hours_ahead`. It is sent every cell on subscribing, then only the cells whose demand
+moved by more than `min_change` (relative) since it was last sent them, and the cells
+that left the viewport. Updates go out when the viewport or time changes, when the hour
+rolls over (for subscribers following the clock) and when a new model is swapped in.
+
+Demand comes from the demand pyramid, so an update is a lookup, not a model call.
+Subscribers at the same level, day and hour are looked up together: overlapping
+viewports share one query over the union of their cells.
+
+Each WebSocket connection is a `HeatmapConnection`: viewport messages are applied at most
+once per `min_interval` (the latest one wins), and a client too slow to read its updates
+has them dropped and is sent one full snapshot instead, so memory per client is bounded.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import anyio
+import numpy as np
+
+from core.geo import isin_sorted, uint64_to_cells
+from services.demand_pyramid import DemandPyramid
+from services.metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+HOUR_SECONDS = 3600
+# 1970-01-01 was a Thursday (0=Monday).
+_EPOCH_WEEKDAY = 3
+# Changes smaller than this are never pushed, however small the value last sent.
+_MIN_ABSOLUTE_CHANGE = 1e-3
+
+
+class Subscription:
+    """One client: its viewport and time, and the demand per cell it was last sent."""
+
+    def __init__(self, send: Callable[[dict], None]):
+        self.send = send
+        self.bbox: Optional[Tuple[float, float, float, float]] = None
+        self.zoom = 0
+        self.fixed_time: Optional[Tuple[int, int]] = None  # (day, hour), or None to follow the clock
+        self.hours_ahead = 0
+        self.resolution: Optional[int] = None
+        self.candidates = np.empty(0, dtype=np.uint64)  # Sorted cells covering the viewport
+        # What the client has: the model version, level, (day, hour) and demand per cell.
+        self.sent_version: Optional[str] = None
+        self.sent_resolution: Optional[int] = None
+        self.sent_time: Optional[Tuple[int, int]] = None
+        self.sent_cells = np.empty(0, dtype=np.uint64)  # Sorted
+        self.sent_demand = np.empty(0, dtype=np.float32)
+
+
+class HeatmapHub:
+    """
+    Keeps every subscription's view of the heatmap up to date. `pyramid_fn` returns the
+    serving (model version, DemandPyramid), or None while no model is loaded.
+    """
+
+    def __init__(self, pyramid_fn: Callable[[], Optional[Tuple[str, DemandPyramid]]], max_cells: int,
+                 min_change: float = 0.05, utc_offset_hours: float = 3.0, max_subscribers: int = 500):
+        self.pyramid_fn = pyramid_fn
+        self.max_cells = max_cells
+        self.min_change = min_change
+        self.utc_offset_seconds = utc_offset_hours * HOUR_SECONDS
+        self.max_subscribers = max_subscribers
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"updates": 0, "queries": 0, "cells_pushed": 0, "cells_unchanged": 0, "cells_removed": 0,
+                       "resyncs": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="heatmap-push-clock", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def subscribe(self, send: Callable[[dict], None]) -> Optional[Subscription]:
+        """A new subscription sending messages through `send`, or None when the hub is full."""
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                return None
+            subscription = Subscription(send)
+            self._subscriptions.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def clock_time(self, hours_ahead: int = 0) -> Tuple[int, int]:
+        """The local (day, hour) `hours_ahead` hours from now."""
+        hours = int((time.time() + self.utc_offset_seconds) // HOUR_SECONDS) + hours_ahead
+        return (hours // 24 + _EPOCH_WEEKDAY) % 7, hours % 24
+
+    def update(self, subscription: Subscription, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+               zoom: int, day: Optional[int] = None, hour: Optional[int] = None, hours_ahead: int = 0):
+        """
+        Moves a subscription to a new viewport and time and sends it what changed. Runs
+        in a worker thread. Raises ValueError for an invalid viewport or time.
+        """
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("The bounding box minimums must not exceed its maximums.")
+        if (day is None) != (hour is None):
+            raise ValueError("Give both day and hour, or neither to follow the current hour.")
+        current = self.pyramid_fn()
+        if current is None:
+            raise ValueError("Model is not available. Please check server logs.")
+        _, pyramid = current
+        resolution, candidates = pyramid.viewport_cells(min_lat, min_lon, max_lat, max_lon, zoom, self.max_cells)
+        candidates = np.unique(candidates)
+        with self._lock:
+            subscription.bbox = (min_lat, min_lon, max_lat, max_lon)
+            subscription.zoom = zoom
+            subscription.fixed_time = None if day is None else (day, hour)
+            subscription.hours_ahead = hours_ahead
+            subscription.resolution = resolution
+            subscription.candidates = candidates
+            self._push([subscription], current, "viewport")
+
+    def resync(self, subscription: Subscription):
+        """Sends a subscription every cell again, e.g. after its undelivered updates were dropped."""
+        current = self.pyramid_fn()
+        if current is None:
+            return
+        with self._lock:
+            self._stats["resyncs"] += 1
+            if subscription.bbox is not None:
+                subscription.sent_resolution = None  # The next update is a reset
+                self._push([subscription], current, "resync")
+
+    def refresh(self, reason: str, following_clock_only: bool = False):
+        """Sends every subscription (or those following the clock) what changed."""
+        with self._lock:
+            if not any(subscription.bbox is not None for subscription in self._subscriptions):
+                return
+        current = self.pyramid_fn()
+        if current is None:
+            return
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.bbox is not None
+                             and not (following_clock_only and subscription.fixed_time is not None)]
+            if subscriptions:
+                self._push(subscriptions, current, reason)
+
+    def _push(self, subscriptions: List[Subscription], current: Tuple[str, DemandPyramid], reason: str):
+        version, pyramid = current
+        groups: Dict[Tuple[int, int, int], List[Subscription]] = {}
+        for subscription in subscriptions:
+            if subscription.resolution not in pyramid.levels:
+                # A new model with other levels: pick the level again.
+                subscription.resolution, candidates = pyramid.viewport_cells(
+                    *subscription.bbox, subscription.zoom, self.max_cells)
+                subscription.candidates = np.unique(candidates)
+            day, hour = subscription.fixed_time or self.clock_time(subscription.hours_ahead)
+            groups.setdefault((subscription.resolution, day, hour), []).append(subscription)
+
+        with time_stage("heatmap_push"):
+            for (resolution, day, hour), members in groups.items():
+                union = members[0].candidates
+                if len(members) > 1:
+                    union = np.unique(np.concatenate([member.candidates for member in members]))
+                cells, demand = pyramid.query(resolution, union, day, hour)
+                self._stats["queries"] += 1
+                for member in members:
+                    found = isin_sorted(cells, member.candidates)
+                    self._send_delta(member, version, resolution, day, hour, cells[found], demand[found], reason)
+
+    def _send_delta(self, subscription: Subscription, version: str, resolution: int, day: int, hour: int,
+                    cells: np.ndarray, demand: np.ndarray, reason: str):
+        """Sends the cells that are new or changed beyond min_change, and those that are gone."""
+        demand = demand.astype(np.float32)
+        # A new level means new cells: the client starts over.
+        reset = subscription.sent_resolution != resolution
+        if reset:
+            changed = np.ones(len(cells), dtype=bool)
+            removed = cells[:0]
+            client_demand = demand
+        else:
+            sent_cells = subscription.sent_cells
+            known = isin_sorted(cells, sent_cells)
+            previous = np.zeros(len(cells), dtype=np.float32)
+            previous[known] = subscription.sent_demand[np.searchsorted(sent_cells, cells[known])]
+            changed = ~known | ~np.isclose(demand, previous, rtol=self.min_change, atol=_MIN_ABSOLUTE_CHANGE)
+            removed = sent_cells[~isin_sorted(sent_cells, cells)]
+            # The client keeps its old values for the cells that are not sent.
+            client_demand = np.where(changed, demand, previous)
+
+        moved_on = subscription.sent_time != (day, hour) or subscription.sent_version != version
+        subscription.sent_version, subscription.sent_resolution, subscription.sent_time = version, resolution, (day, hour)
+        subscription.sent_cells, subscription.sent_demand = cells, client_demand
+        self._stats["updates"] += 1
+        self._stats["cells_pushed"] += int(changed.sum())
+        self._stats["cells_unchanged"] += int(len(changed) - changed.sum())
+        self._stats["cells_removed"] += len(removed)
+        if not (reset or moved_on or changed.any() or len(removed)):
+            return
+        subscription.send({
+            "type": "heatmap",
+            "reason": reason,
+            "reset": bool(reset),
+            "model_version": version,
+            "resolution": resolution,
+            "day": day,
+            "hour": hour,
+            "hotspots": [{"h3_cell": cell, "demand": value}
+                         for cell, value in zip(uint64_to_cells(cells[changed]), demand[changed].tolist())],
+            "removed": uint64_to_cells(removed),
+        })
+
+    def _run(self):
+        while True:
+            now = time.time() + self.utc_offset_seconds
+            # Just after the next hour starts.
+            if self._stop.wait(HOUR_SECONDS - now % HOUR_SECONDS + 0.05):
+                break
+            try:
+                self.refresh("hour", following_clock_only=True)
+            except Exception:
+                logger.exception("❌ Could not push the hourly heatmap update.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "subscribers": len(self._subscriptions),
+                "max_subscribers": self.max_subscribers,
+                "min_change": self.min_change,
+            }
+
+
+class HeatmapConnection:
+    """
+    The event-loop side of one subscription. Messages from worker threads go through a
+    bounded outbox; viewport requests are applied one at a time, at most once per
+    `min_interval` seconds, and only the latest is kept while one is pending.
+    """
+
+    def __init__(self, hub: HeatmapHub, loop: asyncio.AbstractEventLoop, max_queued: int = 16,
+                 min_interval: float = 0.25):
+        self.hub = hub
+        self.loop = loop
+        self.min_interval = min_interval
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.dropped = 0
+        self._latest: Optional[tuple] = None  # The newest viewport request not applied yet
+        self._resync = False
+        self._wake = asyncio.Event()
+        self.subscription = hub.subscribe(self.send)
+
+    def send(self, message: dict):
+        """Called from worker threads (viewport updates, the hour clock, model reloads)."""
+        self.loop.call_soon_threadsafe(self._enqueue, message)
+
+    def _enqueue(self, message: dict):
+        if self.outbox.full():
+            # The client is not keeping up: drop what it has not read and send one snapshot instead.
+            while not self.outbox.empty():
+                self.outbox.get_nowait()
+                self.dropped += 1
+            self.dropped += 1
+            self._resync = True
+            self._wake.set()
+            return
+        self.outbox.put_nowait(message)
+
+    def error(self, detail: str):
+        self._enqueue({"type": "error", "detail": detail})
+
+    def request(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int,
+                day: Optional[int] = None, hour: Optional[int] = None, hours_ahead: int = 0):
+        """Queues a viewport update, replacing any that has not been applied yet."""
+        self._latest = (min_lat, min_lon, max_lat, max_lon, zoom, day, hour, hours_ahead)
+        self._wake.set()
+
+    async def apply_updates(self):
+        """Runs for the life of the connection, applying requests and resyncs in a worker thread."""
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if self._resync:
+                self._resync = False
+                await anyio.to_thread.run_sync(self.hub.resync, self.subscription)
+            viewport, self._latest = self._latest, None
+            if viewport is not None:
+                try:
+                    await anyio.to_thread.run_sync(self.hub.update, self.subscription, *viewport)
+                except ValueError as error:
+                    # A bad message is answered, not fatal.
+                    self.error(str(error))
+                await asyncio.sleep(self.min_interval)
@@ -0,0 +1,113 @@
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from services.demand_pyramid import DemandPyramid
+
+# Cells are checked against a bounding box this many at a time, in rank order.
+BBOX_SCAN_CHUNK = 1024
+
+
+class HotspotIndex:
+    """
+    The cells of every demand pyramid level ranked by predicted demand, per (day, hour).
+    Each level holds a (7, 24, max_k) array of cell positions in descending demand order
+    (ties by position), so the top K cells of a slot are its first K positions. Only the
+    best `max_k` cells of a slot are ranked; a bounding box that runs past them falls back
+    to scanning the slot.
+    """
+
+    def __init__(self, pyramid: DemandPyramid, rankings: Dict[int, np.ndarray],
+                 centers: Dict[int, Tuple[np.ndarray, np.ndarray]]):
+        self.pyramid = pyramid
+        self.rankings = rankings
+        self.centers = centers
+        self.build_seconds = 0.0
+
+    @classmethod
+    def build(cls, pyramid: DemandPyramid, max_k: int = 500) -> "HotspotIndex":
+        started = time.perf_counter()
+        rankings, centers = {}, {}
+        for resolution, (cells, values) in pyramid.levels.items():
+            by_slot = np.moveaxis(values, 0, -1).reshape(-1, len(cells))  # (7 * 24, cells)
+            ranking = np.stack([_top_positions(slot, max_k) for slot in by_slot])
+            ranking = ranking.reshape(values.shape[1], values.shape[2], -1)
+            rankings[resolution] = ranking.astype(np.int32 if len(cells) < 2 ** 31 else np.int64)
+            centers[resolution] = pyramid.level_centers(resolution)
+        index = cls(pyramid, rankings, centers)
+        index.build_seconds = time.perf_counter() - started
+        return index
+
+    def top(self, resolution: int, day: int, hour: int, k: int,
+            bbox: Optional[Tuple[float, float, float, float]] = None):
+        """
+        The `k` highest-demand cells (uint64) of a level and their demand, best first.
+        With a bbox (min_lat, min_lon, max_lat, max_lon), only cells whose centers fall
+        inside it count; ranked cells are scanned in chunks until `k` have been found.
+        A `k` or a box past the ranked cells ranks the slot from the pyramid instead.
+        """
+        cells, values = self.pyramid.levels[resolution]
+        ranking = self.rankings[resolution][day, hour]
+        truncated = len(ranking) < len(cells)
+        if bbox is None:
+            positions = ranking[:k] if k <= len(ranking) or not truncated else _top_positions(values[:, day, hour], k)
+        else:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            lats, lons = self.centers[resolution]
+            found = []
+            remaining = k
+            chunk = max(BBOX_SCAN_CHUNK, 4 * k)
+            for start in range(0, len(ranking), chunk):
+                candidates = ranking[start:start + chunk]
+                inside = candidates[(lats[candidates] >= min_lat) & (lats[candidates] <= max_lat)
+                                    & (lons[candidates] >= min_lon) & (lons[candidates] <= max_lon)]
+                found.append(inside[:remaining])
+                remaining -= len(found[-1])
+                if remaining == 0:
+                    break
+            positions = np.concatenate(found) if found else ranking[:0]
+            if remaining and truncated:
+                # Fewer than k of the ranked cells are inside: rank the slot's cells inside the box.
+                inside = np.flatnonzero((lats >= min_lat) & (lats <= max_lat)
+                                        & (lons >= min_lon) & (lons <= max_lon))
+                positions = inside[_top_positions(values[inside, day, hour], k)]
+        return cells[positions], values[positions, day, hour]
+
+    def to_arrays(self):
+        """Arrays and metadata for services/shared_tables.py. The pyramid is stored separately."""
+        arrays = {}
+        for resolution, ranking in self.rankings.items():
+            arrays[f"ranking_{resolution}"] = ranking
+            arrays[f"lat_{resolution}"], arrays[f"lon_{resolution}"] = self.centers[resolution]
+        return arrays, {"resolutions": sorted(self.rankings), "build_seconds": self.build_seconds}
+
+    @classmethod
+    def from_arrays(cls, pyramid: DemandPyramid, arrays: Dict[str, np.ndarray], meta: dict) -> "HotspotIndex":
+        resolutions = meta["resolutions"]
+        index = cls(pyramid, {resolution: arrays[f"ranking_{resolution}"] for resolution in resolutions},
+                    {resolution: (arrays[f"lat_{resolution}"], arrays[f"lon_{resolution}"])
+                     for resolution in resolutions})
+        index.build_seconds = meta["build_seconds"]
+        return index
+
+    def stats(self) -> dict:
+        return {
+            "max_k": max((ranking.shape[-1] for ranking in self.rankings.values()), default=0),
+            "build_seconds": round(self.build_seconds, 3),
+            "size_bytes": int(sum(ranking.nbytes for ranking in self.rankings.values())),
+            "levels": {resolution: ranking.shape[-1] for resolution, ranking in sorted(self.rankings.items())},
+        }
+
+
+def _top_positions(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the `k` largest values, largest first, ties in position order: the first
+    `k` of a stable descending argsort, found with a partition instead of a full sort.
+    """
+    if k >= len(values):
+        return np.argsort(-values, kind="stable")
+    threshold = -np.partition(-values, k - 1)[k - 1]
+    above = np.flatnonzero(values > threshold)
+    chosen = np.sort(np.concatenate([above, np.flatnonzero(values == threshold)[:k - len(above)]]))
+    return chosen[np.argsort(-values[chosen], kind="stable")]
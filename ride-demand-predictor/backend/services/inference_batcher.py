@@ -0,0 +1,201 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# Histogram bucket upper bounds used by stats().
+BATCH_ROWS_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+QUEUE_WAIT_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+class _PendingRequest:
+    def __init__(self, h3_cells, day_of_week, hour_of_day, business_ratio, weather, predict_fn):
+        self.predict_fn = predict_fn
+        self.h3_cells = np.asarray(h3_cells, dtype=np.uint64)
+        self.rows = len(self.h3_cells)
+        self.weather = weather
+        self.day_of_week = np.broadcast_to(np.asarray(day_of_week), (self.rows,))
+        self.hour_of_day = np.broadcast_to(np.asarray(hour_of_day), (self.rows,))
+        self.business_ratio = np.broadcast_to(np.asarray(business_ratio, dtype=np.float64), (self.rows,))
+        self.enqueued_at = time.perf_counter()
+        self.future: Future = Future()
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot counts values above every bound
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        labels = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+        }
+
+
+class InferenceBatcher:
+    """
+    Coalesces scoring requests from concurrent callers into one model call.
+
+    Callers block on their own future while a background thread collects rows until
+    either `max_batch_rows` is reached or `window_ms` has passed since the oldest
+    queued request, then scores the whole batch and hands each caller its slice.
+    While the thread is not running (before `start` or after `stop`), callers are
+    scored inline, and a caller waits at most `result_timeout` seconds for its batch.
+    """
+
+    def __init__(self, predict_fn: Callable[..., np.ndarray], window_ms: float = 2.0,
+                 max_batch_rows: int = 4096, result_timeout: float = 30.0):
+        self.predict_fn = predict_fn
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch_rows = max_batch_rows
+        self.result_timeout = result_timeout
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Held while checking for the thread and queueing, so stop() cannot strand a request.
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batch_rows = _Histogram(BATCH_ROWS_BUCKETS)
+        self.batch_requests = _Histogram(BATCH_ROWS_BUCKETS)
+        self.queue_wait_ms = _Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self.model_ms = _Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(None)
+        thread.join(timeout=5)
+        # Requests queued behind the stop marker are scored here rather than left waiting.
+        leftover = []
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                leftover.append(request)
+        self._flush_by_scorer(leftover)
+
+    def predict(self, h3_cells: np.ndarray, day_of_week, hour_of_day, business_ratio, weather=None,
+                predict_fn: Optional[Callable[..., np.ndarray]] = None) -> np.ndarray:
+        """
+        Same contract as the model scoring helper; blocks until the batch is scored.
+        `predict_fn` overrides the default scorer, e.g. to pin a request to one model version.
+        Raises TimeoutError if the batch is not scored within `result_timeout` seconds.
+        """
+        request = _PendingRequest(h3_cells, day_of_week, hour_of_day, business_ratio, weather,
+                                  predict_fn or self.predict_fn)
+        if request.rows == 0:
+            return np.empty(0)
+        with self._thread_lock:
+            queued = self._thread is not None
+            if queued:
+                self._queue.put(request)
+        if not queued:
+            self._flush(request.predict_fn, [request], request.rows)
+        try:
+            return request.future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"The inference batch was not scored within {self.result_timeout}s.") from None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            rows = first.rows
+            deadline = first.enqueued_at + self.window_seconds
+            while rows < self.max_batch_rows:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                rows += request.rows
+            self._flush_by_scorer(batch)
+
+    def _flush_by_scorer(self, batch: List[_PendingRequest]):
+        # Requests pinned to different scorers (e.g. during a model swap) are scored apart.
+        scorers = {}
+        for request in batch:
+            scorers.setdefault(request.predict_fn, []).append(request)
+        for predict_fn, requests in scorers.items():
+            self._flush(predict_fn, requests, sum(request.rows for request in requests))
+
+    def _flush(self, predict_fn: Callable[..., np.ndarray], batch: List[_PendingRequest], rows: int):
+        started = time.perf_counter()
+        try:
+            features = [
+                np.concatenate([request.h3_cells for request in batch]),
+                np.concatenate([request.day_of_week for request in batch]),
+                np.concatenate([request.hour_of_day for request in batch]),
+                np.concatenate([request.business_ratio for request in batch]),
+            ]
+            weather = [request.weather for request in batch if request.weather is not None]
+            if weather:
+                # Requests without weather get NaN (unknown) rows.
+                width = np.shape(weather[0])[1]
+                features.append(np.concatenate([
+                    request.weather if request.weather is not None else np.full((request.rows, width), np.nan)
+                    for request in batch]))
+            predictions = np.asarray(predict_fn(*features))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        offset = 0
+        for request in batch:
+            request.future.set_result(predictions[offset:offset + request.rows])
+            offset += request.rows
+
+        with self._stats_lock:
+            self.batch_rows.observe(rows)
+            self.batch_requests.observe(len(batch))
+            self.model_ms.observe((finished - started) * 1000)
+            for request in batch:
+                self.queue_wait_ms.observe((started - request.enqueued_at) * 1000)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "window_ms": self.window_seconds * 1000,
+                "max_batch_rows": self.max_batch_rows,
+                "queued_requests": self._queue.qsize(),
+                "batch_rows": self.batch_rows.to_dict(),
+                "requests_per_batch": self.batch_requests.to_dict(),
+                "queue_wait_ms": self.queue_wait_ms.to_dict(),
+                "model_ms": self.model_ms.to_dict(),
+            }
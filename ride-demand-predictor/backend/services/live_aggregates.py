@@ -0,0 +1,338 @@
+"""
+Ride demand aggregates kept up to date from a live stream of ride placement events.
+
+Rides and business rides are counted per hour bucket in fixed-size ring buffers, overall
+and per H3 cell at several resolutions, so a sliding window is the sum of its last
+buckets and memory stays the same however long the service runs. Each event only
+increments a few counters; a bucket is cleared when the ring comes back round to it.
+Events can be posted to the API or appended to a JSON-lines file that is tailed.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import h3.api.numpy_int as h3_int
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HOUR_SECONDS = 3600
+# 1970-01-01, day 0 of the bucket clock, was a Thursday (0=Monday).
+_EPOCH_WEEKDAY = 3
+
+
+def to_epoch_seconds(value, utc_offset_hours: float) -> float:
+    """
+    Epoch seconds from a number (already epoch seconds), an ISO 8601 string or a datetime.
+    Times without a timezone are local times at `utc_offset_hours`.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone(timedelta(hours=utc_offset_hours)))
+    return value.timestamp()
+
+
+class CellRing:
+    """
+    Per-bucket ride and business-ride counts at one resolution, for at most `max_cells`
+    cells at a time. A cell's slot is freed once it has no rides left in the ring;
+    rides in new cells are dropped (and counted) while every slot is taken.
+    """
+
+    def __init__(self, resolution: int, buckets: int, max_cells: int):
+        self.resolution = resolution
+        self.rides = np.zeros((buckets, max_cells), dtype=np.int32)
+        self.business = np.zeros((buckets, max_cells), dtype=np.int32)
+        self.totals = np.zeros(max_cells, dtype=np.int64)  # Rides per slot across the whole ring
+        self.cells = np.zeros(max_cells, dtype=np.uint64)  # The cell in each slot (0 when free)
+        self.slots: Dict[int, int] = {}
+        self.free = list(range(max_cells - 1, -1, -1))
+        self.dropped = 0
+
+    def add(self, cell: int, row: int, is_business: bool):
+        slot = self.slots.get(cell)
+        if slot is None:
+            if not self.free:
+                self.dropped += 1
+                return
+            slot = self.free.pop()
+            self.slots[cell] = slot
+            self.cells[slot] = cell
+        self.rides[row, slot] += 1
+        self.business[row, slot] += is_business
+        self.totals[slot] += 1
+
+    def clear(self, row: int):
+        self.totals -= self.rides[row]
+        self.rides[row] = 0
+        self.business[row] = 0
+        for slot in np.flatnonzero((self.totals == 0) & (self.cells != 0)).tolist():
+            del self.slots[int(self.cells[slot])]
+            self.cells[slot] = 0
+            self.free.append(slot)
+
+    def window(self, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(cells, rides, business rides) of every cell with rides in these bucket rows."""
+        rides = self.rides[rows].sum(axis=0, dtype=np.int64)
+        used = np.flatnonzero(rides)
+        return self.cells[used], rides[used], self.business[rows][:, used].sum(axis=0, dtype=np.int64)
+
+
+class LiveAggregates:
+    """
+    Rides per hour bucket over the last `window_hours` hours, overall and per cell at each
+    of `resolutions`. Buckets follow local time (`utc_offset_hours`), so hours and weekdays
+    match the order data. `generation` changes whenever the counts do.
+    """
+
+    def __init__(self, resolutions: Sequence[int] = (9, 7), window_hours: int = 168, max_cells: int = 2048,
+                 utc_offset_hours: float = 3.0):
+        self.resolutions = sorted(set(resolutions), reverse=True)
+        self.window_hours = window_hours
+        self.utc_offset_seconds = utc_offset_hours * HOUR_SECONDS
+        self.utc_offset_hours = utc_offset_hours
+        self.rides = np.zeros(window_hours, dtype=np.int64)
+        self.business = np.zeros(window_hours, dtype=np.int64)
+        self.cell_rings = {resolution: CellRing(resolution, window_hours, max_cells) for resolution in self.resolutions}
+        self.head: Optional[int] = None  # The latest bucket (hours since the epoch, local time)
+        self.first: Optional[int] = None  # The earliest bucket counted since startup
+        self.generation = 0
+        self.accepted = 0
+        self.late = 0
+        self.future = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, timestamp: float) -> int:
+        return int((timestamp + self.utc_offset_seconds) // HOUR_SECONDS)
+
+    def _advance(self, bucket: int):
+        """Moves the ring forward to `bucket`, clearing the buckets it wraps onto."""
+        if self.head is None:
+            self.head = self.first = bucket
+            return
+        if bucket <= self.head:
+            return
+        for cleared in range(max(self.head + 1, bucket - self.window_hours + 1), bucket + 1):
+            row = cleared % self.window_hours
+            self.rides[row] = 0
+            self.business[row] = 0
+            for ring in self.cell_rings.values():
+                ring.clear(row)
+        self.head = bucket
+        self.first = max(self.first, bucket - self.window_hours + 1)
+        self.generation += 1
+
+    def add(self, latitude: float, longitude: float, placed_at: Optional[float] = None,
+            is_business: bool = False) -> bool:
+        """
+        Counts one ride placed at epoch seconds `placed_at` (now if None). Returns False for
+        rides older than the window or in a later hour than now, which are not counted.
+        Raises ValueError for coordinates out of range (H3 would wrap them onto another cell).
+        """
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f"({latitude}, {longitude}) is not a valid latitude and longitude.")
+        now = time.time()
+        bucket = self._bucket(now if placed_at is None else placed_at)
+        cell = h3_int.latlng_to_cell(latitude, longitude, self.resolutions[0])
+        cells = [cell] + [h3_int.cell_to_parent(cell, resolution) for resolution in self.resolutions[1:]]
+        with self._lock:
+            self._advance(self._bucket(now))
+            if bucket > self.head:
+                self.future += 1
+                return False
+            if bucket <= self.head - self.window_hours:
+                self.late += 1
+                return False
+            row = bucket % self.window_hours
+            self.rides[row] += 1
+            self.business[row] += is_business
+            for ring, ride_cell in zip(self.cell_rings.values(), cells):
+                ring.add(ride_cell, row, is_business)
+            self.first = min(self.first, bucket)
+            self.accepted += 1
+            self.generation += 1
+        return True
+
+    def refresh(self) -> int:
+        """Clears the buckets that have left the window. Returns the current generation."""
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            return self.generation
+
+    def _window(self, window_hours: Optional[int]) -> np.ndarray:
+        """The buckets of the last `window_hours` hours (all of them by default) since startup."""
+        if self.head is None:
+            return np.empty(0, dtype=np.int64)
+        hours = min(window_hours or self.window_hours, self.window_hours, self.head - self.first + 1)
+        return np.arange(self.head - hours + 1, self.head + 1)
+
+    def hourly_demand(self, window_hours: Optional[int] = None) -> List[dict]:
+        """Same entries as hourly_demand.json, plus the business ratio, over a sliding window."""
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            buckets = self._window(window_hours)
+            rides = self.rides[buckets % self.window_hours]
+            business = self.business[buckets % self.window_hours]
+        hours = buckets % 24
+        counts = np.bincount(hours, weights=rides, minlength=24)
+        business_counts = np.bincount(hours, weights=business, minlength=24)
+        num_days = len(np.unique(buckets // 24))
+        return [
+            {
+                'hour': hour,
+                'demand_count': int(counts[hour]),
+                'average_demand': float(counts[hour] / num_days),
+                'business_ratio': float(business_counts[hour] / counts[hour]),
+            }
+            for hour in np.flatnonzero(counts).tolist()
+        ]
+
+    def daily_demand(self, window_hours: Optional[int] = None) -> List[dict]:
+        """Same entries as daily_demand.json, plus ride counts and the business ratio."""
+        from services.analytics import DAY_NAMES  # Not at the top: analytics imports pandas
+
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            buckets = self._window(window_hours)
+            rides = self.rides[buckets % self.window_hours]
+            business = self.business[buckets % self.window_hours]
+        weekdays = (buckets // 24 + _EPOCH_WEEKDAY) % 7
+        counts = np.bincount(weekdays, weights=rides, minlength=7)
+        business_counts = np.bincount(weekdays, weights=business, minlength=7)
+        # The average divides by how many of each weekday the window covers.
+        days = np.unique(buckets // 24)
+        occurrences = np.bincount((days + _EPOCH_WEEKDAY) % 7, minlength=7)
+        return [
+            {
+                'day_name': DAY_NAMES[day],
+                'average_demand': float(counts[day] / occurrences[day]),
+                'demand_count': int(counts[day]),
+                'business_ratio': float(business_counts[day] / counts[day]),
+            }
+            for day in np.flatnonzero(counts).tolist()
+        ]
+
+    def top_zones(self, resolution: int, k: int, window_hours: Optional[int] = None) -> List[dict]:
+        """The `k` cells with the most rides, as in core_hotspots.json (without names)."""
+        ring = self.cell_rings[resolution]
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            cells, rides, business = ring.window(self._window(window_hours) % self.window_hours)
+        # Ties are broken by cell id, as in the static files.
+        order = np.lexsort((cells, -rides))[:k]
+        zones = []
+        for cell, count, business_count in zip(cells[order].tolist(), rides[order].tolist(),
+                                               business[order].tolist()):
+            lat, lon = h3_int.cell_to_latlng(cell)
+            zones.append({'h3_cell': format(cell, 'x'), 'latitude': lat, 'longitude': lon,
+                          'ride_count': count, 'business_ratio': business_count / count})
+        return zones
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._advance(self._bucket(time.time()))
+            return {
+                'accepted': self.accepted,
+                'late': self.late,
+                'future': self.future,
+                'dropped_cells': {str(r): ring.dropped for r, ring in self.cell_rings.items()},
+                'tracked_cells': {str(r): len(ring.slots) for r, ring in self.cell_rings.items()},
+                'window_hours': self.window_hours,
+                'generation': self.generation,
+            }
+
+
+class EventFileTailer:
+    """
+    Follows a JSON-lines file of ride events (the same fields as POST /events/rides) and
+    adds each new line to the aggregates. A truncated or replaced file is read again
+    from the start; malformed lines are skipped and counted.
+    """
+
+    def __init__(self, path: str, aggregates: LiveAggregates, poll_seconds: float = 1.0, from_start: bool = False):
+        self.path = path
+        self.aggregates = aggregates
+        self.poll_seconds = poll_seconds
+        self.from_start = from_start
+        self.lines = 0
+        self.invalid = 0
+        self._file = None
+        self._inode = None
+        self._partial = ''
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-tailer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self, stat, from_start: bool):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, 'r')
+        if not from_start:
+            self._file.seek(0, os.SEEK_END)
+        self._inode = stat.st_ino
+        self._partial = ''
+
+    def poll(self) -> int:
+        """Reads the lines appended since the last poll. Returns how many were read."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            # Everything in a file created from now on is new.
+            self.from_start = True
+            return 0
+        if self._file is None:
+            self._open(stat, self.from_start)
+        elif stat.st_ino != self._inode or stat.st_size < self._file.tell():
+            self._open(stat, True)
+
+        read = 0
+        # readline, not iteration: tell() is needed on the next poll.
+        for line in iter(self._file.readline, ''):
+            if not line.endswith('\n'):
+                # Still being written: keep it until the rest arrives.
+                self._partial += line
+                break
+            line, self._partial = self._partial + line, ''
+            if not line.strip():
+                continue
+            read += 1
+            try:
+                event = json.loads(line)
+                placed_at = event.get('placed_at')
+                self.aggregates.add(
+                    float(event['latitude']), float(event['longitude']),
+                    None if placed_at is None else to_epoch_seconds(placed_at, self.aggregates.utc_offset_hours),
+                    bool(event.get('is_business', False)))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                self.invalid += 1
+        self.lines += read
+        return read
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except OSError:
+                logger.exception("❌ Could not read ride events from '%s'.", self.path)
+            self._stop.wait(self.poll_seconds)
@@ -0,0 +1,445 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from core.geo import are_cells, cell_resolutions, cells_to_uint64, isin_sorted, uint64_to_cells
+from services.metrics import time_stage
+from services.weather_service import WEATHER_FEATURES
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = 'catboost_model.joblib'
+SCALER_FILE = 'scaler.joblib'
+CATEGORIES_FILE = 'h3_categories.json'
+VERSION_FILE = 'model_version.json'
+# Fast-loading equivalents of the files above: CatBoost's native model format, the
+# scaler's two coefficients and the known cells as a sorted uint64 array. They skip
+# joblib, the scikit-learn import and the JSON parse at startup.
+MODEL_CBM_FILE = 'catboost_model.cbm'
+SCALER_PARAMS_FILE = 'scaler.json'
+KNOWN_CELLS_FILE = 'known_cells.npy'
+# The model version the fast-loading files were written for. They are used, all together,
+# only when it matches VERSION_FILE; otherwise the whole set is loaded from the legacy files.
+FAST_STAMP_FILE = 'fast_artifacts.json'
+# The model's inputs, split the way CatBoost's FeaturesData takes them. Weather-aware models
+# (train.py --weather) take WEATHER_FEATURES after these.
+CATEGORICAL_FEATURES = ['h3_cell']
+NUMERIC_FEATURES = ['day_of_week', 'hour_of_day', 'business_ratio']
+# In the order train.py moves them into place: the version file goes last.
+ARTIFACT_FILES = (MODEL_FILE, MODEL_CBM_FILE, SCALER_FILE, SCALER_PARAMS_FILE, CATEGORIES_FILE,
+                  KNOWN_CELLS_FILE, FAST_STAMP_FILE, VERSION_FILE)
+
+
+class LinearScaler:
+    """The transform of a fitted MinMaxScaler (x * scale + min), without scikit-learn."""
+
+    def __init__(self, scale: Sequence[float], min_: Sequence[float]):
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.min_ = np.asarray(min_, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, scaler) -> "LinearScaler":
+        return cls(scaler.scale_, scaler.min_)
+
+    @classmethod
+    def load(cls, path: str) -> "LinearScaler":
+        with open(path, 'r') as f:
+            params = json.load(f)
+        return cls(params['scale'], params['min'])
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'scale': self.scale_.tolist(), 'min': self.min_.tolist()}, f)
+
+    def transform(self, X) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def use_fast_artifacts(model_dir: str) -> bool:
+    """
+    Whether to load the whole set from the fast-loading files: they must all be there and
+    stamped with the version in VERSION_FILE (or be the only files), so a set is never
+    mixed from two trainings.
+    """
+    if not all(os.path.exists(os.path.join(model_dir, name))
+               for name in (MODEL_CBM_FILE, SCALER_PARAMS_FILE, KNOWN_CELLS_FILE)):
+        return False
+    if not any(os.path.exists(os.path.join(model_dir, name)) for name in (MODEL_FILE, SCALER_FILE, CATEGORIES_FILE)):
+        return True
+    stamp = _read_json(os.path.join(model_dir, FAST_STAMP_FILE))
+    version = _read_json(os.path.join(model_dir, VERSION_FILE))
+    return stamp is not None and version is not None and str(stamp['version']) == str(version['version'])
+
+
+def _phase(profile, name: str):
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def save_fast_artifacts(output_dir: str, model, scaler, h3_cells: Iterable[str], version: str):
+    """
+    Writes the fast-loading copies of a model, its scaler and its known cells, stamped
+    with the model `version` they belong to (the one written to VERSION_FILE).
+    """
+    model.save_model(os.path.join(output_dir, MODEL_CBM_FILE), format='cbm')
+    LinearScaler.from_scaler(scaler).save(os.path.join(output_dir, SCALER_PARAMS_FILE))
+    np.save(os.path.join(output_dir, KNOWN_CELLS_FILE), np.sort(cells_to_uint64(list(h3_cells))))
+    with open(os.path.join(output_dir, FAST_STAMP_FILE), 'w') as f:
+        json.dump({'version': version}, f)
+
+
+class ModelArtifacts:
+    """
+    One loaded set of model artifacts and everything derived from it (known-cell set,
+    demand cube, neighbor index, pyramid...). Never modified once it is serving: a
+    request that picked up this object keeps using it even if a newer one is swapped in.
+    """
+
+    def __init__(self, version: str, model, scaler, known_cells: np.ndarray, model_dir: str):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        # Sorted uint64 cells: membership is a binary search, at 8 bytes per cell.
+        self.known_cells = np.unique(np.asarray(known_cells, dtype=np.uint64))
+        self.model_dir = model_dir
+        feature_names = getattr(model, 'feature_names_', None) or CATEGORICAL_FEATURES + NUMERIC_FEATURES
+        self.numeric_features = [name for name in feature_names if name not in CATEGORICAL_FEATURES]
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.warmup_ms = None
+        # Threads per CatBoost prediction (-1: all cores). Lowered when several processes score at once.
+        self.thread_count = -1
+        self._derived: Dict[str, Any] = {}
+        self._derived_locks: Dict[str, threading.Lock] = {}
+        self._derived_guard = threading.Lock()
+
+    @classmethod
+    def load(cls, model_dir: str, profile=None) -> "ModelArtifacts":
+        """Loads from the fast-loading files when they are current (see use_fast_artifacts)."""
+        if use_fast_artifacts(model_dir):
+            names = (MODEL_CBM_FILE, SCALER_PARAMS_FILE, KNOWN_CELLS_FILE)
+        else:
+            names = (MODEL_FILE, SCALER_FILE, CATEGORIES_FILE)
+        model_path, scaler_path, cells_path = (os.path.join(model_dir, name) for name in names)
+
+        with _phase(profile, 'load_model'):
+            if model_path.endswith('.cbm'):
+                # Imported here rather than at the top: catboost, with the pandas, scipy and
+                # pyarrow it pulls in, would otherwise dominate the app's import time.
+                from catboost import CatBoostRegressor
+                model = CatBoostRegressor()
+                model.load_model(model_path, format='cbm')
+            else:
+                import joblib
+                model = joblib.load(model_path)
+        with _phase(profile, 'load_scaler'):
+            if scaler_path.endswith('.json'):
+                scaler = LinearScaler.load(scaler_path)
+            else:
+                import joblib
+                # Only its coefficients are kept: predictions then skip scikit-learn's input checks.
+                scaler = LinearScaler.from_scaler(joblib.load(scaler_path))
+        with _phase(profile, 'load_known_cells'):
+            if cells_path.endswith('.npy'):
+                known_cells = np.load(cells_path)
+            else:
+                with open(cells_path, 'r') as f:
+                    known_cells = cells_to_uint64(list(json.load(f)))
+        with _phase(profile, 'read_version'):
+            version = read_version(model_dir, (model_path, scaler_path, cells_path))
+        return cls(version, model, scaler, known_cells, model_dir)
+
+    def is_known(self, cells: np.ndarray) -> np.ndarray:
+        """Which of these uint64 cells the model has historical data for."""
+        return isin_sorted(cells, self.known_cells)
+
+    @property
+    def uses_weather(self) -> bool:
+        """Whether the model was trained with weather features."""
+        return self.numeric_features != NUMERIC_FEATURES
+
+    def predict_rows(self, h3_cells, day_of_week, hour_of_day, business_ratio, weather=None) -> np.ndarray:
+        """
+        Scores feature rows with this model in a single call. Cells are uint64; the model
+        was trained on hex strings, so they are formatted here and nowhere else.
+        Day, hour and business ratio may be scalars (broadcast to every cell) or arrays.
+        `weather` is a (rows, len(WEATHER_FEATURES)) array for weather-aware models; NaN
+        or None means unknown, as for training rows without weather. Other models ignore it.
+        """
+        with time_stage("preprocess"):
+            # Filled column by column into the arrays CatBoost reads, without a DataFrame.
+            numeric = np.empty((len(h3_cells), len(self.numeric_features)), dtype=np.float32)
+            numeric[:, 0] = day_of_week
+            numeric[:, 1] = hour_of_day
+            numeric[:, 2] = self.scaler.transform(business_ratio)
+            if self.uses_weather:
+                numeric[:, len(NUMERIC_FEATURES):] = np.nan if weather is None else weather
+            categorical = np.array(uint64_to_cells(h3_cells), dtype=object).reshape(-1, 1)
+        with time_stage("pool"):
+            from catboost import FeaturesData, Pool
+            # Named, so CatBoost matches them to the model's columns ('h3_cell' first, categorical)
+            prediction_pool = Pool(data=FeaturesData(num_feature_data=numeric, cat_feature_data=categorical,
+                                                     num_feature_names=self.numeric_features,
+                                                     cat_feature_names=CATEGORICAL_FEATURES))
+        with time_stage("predict"):
+            return self.model.predict(prediction_pool, thread_count=self.thread_count)
+
+    def business_ratio_cuts(self) -> Optional[np.ndarray]:
+        """
+        The business ratios in (0, 1] at which this model's prediction can change: CatBoost
+        compares the scaled float32 feature with its split borders, so predictions are constant
+        between two cuts. Each cut is the smallest float64 ratio that lands past a border.
+        None if the model does not expose its borders, or the scaler reverses the order.
+        """
+        get_borders = getattr(self.model, 'get_borders', None)
+        if get_borders is None or self.scaler.scale_[0] <= 0:
+            return None
+        feature = len(CATEGORICAL_FEATURES) + NUMERIC_FEATURES.index('business_ratio')
+        borders = np.asarray(get_borders().get(feature, []), dtype=np.float32)
+
+        def bins(ratios):
+            scaled = self.scaler.transform(ratios).astype(np.float32)  # As predict_rows passes it
+            return np.searchsorted(borders, scaled, side='left')  # Borders below the value
+
+        low, high = bins(np.array([0.0, 1.0]))
+        cuts = []
+        for target in range(low + 1, high + 1):
+            # Non-negative float64s sort like their bit patterns, so bisect over those.
+            below, above = np.float64(0.0).view(np.int64), np.float64(1.0).view(np.int64)
+            while above - below > 1:
+                middle = (below + above) // 2
+                if bins(np.array([np.int64(middle).view(np.float64)]))[0] >= target:
+                    above = middle
+                else:
+                    below = middle
+            cuts.append(np.int64(above).view(np.float64))
+        return np.array(cuts, dtype=np.float64)
+
+    def derived(self, name: str, build: Callable[["ModelArtifacts"], Any]) -> Any:
+        """Builds a structure derived from these artifacts once, on first use, and keeps it."""
+        with self._derived_guard:
+            if name in self._derived:
+                return self._derived[name]
+            lock = self._derived_locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+            return self._derived[name]
+
+    def has_derived(self, name: str) -> bool:
+        return name in self._derived
+
+    def validate(self, h3_resolution: int, warmup_rows: int = 256, seed: int = 42):
+        """
+        Checks the artifacts fit together and warms the model up with a synthetic batch
+        over known cells. Raises ValueError if they cannot serve.
+        """
+        if len(self.known_cells) == 0:
+            raise ValueError("The model has no known cells.")
+        if self.numeric_features not in (NUMERIC_FEATURES, NUMERIC_FEATURES + WEATHER_FEATURES):
+            raise ValueError(f"The model's features {self.numeric_features} are not supported.")
+        invalid = ~are_cells(self.known_cells) | (cell_resolutions(self.known_cells) != h3_resolution)
+        if invalid.any():
+            cell = format(int(self.known_cells[invalid][0]), 'x')
+            raise ValueError(f"'{cell}' is not an H3 cell at resolution {h3_resolution}.")
+
+        rng = np.random.default_rng(seed)
+        cells = self.known_cells
+        rows = min(warmup_rows, len(cells) * 7 * 24)
+        started = time.perf_counter()
+        predictions = np.asarray(self.predict_rows(
+            cells[rng.integers(0, len(cells), rows)],
+            rng.integers(0, 7, rows),
+            rng.integers(0, 24, rows),
+            rng.random(rows),
+        ))
+        self.warmup_ms = round((time.perf_counter() - started) * 1000, 2)
+        if predictions.shape != (rows,) or not np.isfinite(predictions).all():
+            raise ValueError("The model returned missing or non-finite predictions for the warm-up batch.")
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "model_dir": self.model_dir,
+            "loaded_at": self.loaded_at,
+            "known_cells": len(self.known_cells),
+            "uses_weather": self.uses_weather,
+            "warmup_ms": self.warmup_ms,
+            "derived": sorted(self._derived),
+        }
+
+
+def read_version(model_dir: str, artifact_paths: Sequence[str]) -> str:
+    """The version stamped by train.py, or a content hash of the loaded files for unstamped artifacts."""
+    version_path = os.path.join(model_dir, VERSION_FILE)
+    if os.path.exists(version_path):
+        with open(version_path, 'r') as f:
+            return str(json.load(f)['version'])
+    digest = hashlib.sha256()
+    for path in artifact_paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return f"sha-{digest.hexdigest()[:12]}"
+
+
+def artifact_signature(model_dir: str) -> tuple:
+    """Modification times and sizes of the artifact files, to notice when they change."""
+    signature = []
+    for name in ARTIFACT_FILES:
+        try:
+            stat = os.stat(os.path.join(model_dir, name))
+        except FileNotFoundError:
+            signature.append((name, None, None))
+        else:
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class ModelRegistry:
+    """
+    Holds the serving `ModelArtifacts` and replaces them without downtime: a new set is
+    loaded, validated and warmed up, then prepared (`prepare` builds derived structures
+    such as the demand cube) off to the side, and swapped in with a single assignment.
+    Callbacks in `on_swap` run afterwards, e.g. to drop caches keyed on the old model.
+    A failed reload leaves the current artifacts serving.
+    """
+
+    def __init__(self, model_dir: str, h3_resolution: int,
+                 prepare: Optional[Callable[[ModelArtifacts], None]] = None,
+                 on_swap: Iterable[Callable[[ModelArtifacts], None]] = (), warmup_rows: int = 256):
+        self.model_dir = model_dir
+        self.h3_resolution = h3_resolution
+        self.prepare = prepare
+        self.on_swap = list(on_swap)
+        self.warmup_rows = warmup_rows
+        self.current: Optional[ModelArtifacts] = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.history = deque(maxlen=10)
+        self._reload_lock = threading.Lock()
+        self._signature = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def reload(self, profile=None) -> ModelArtifacts:
+        """
+        Loads, validates and swaps in the artifacts on disk. Raises if they cannot serve.
+        Each step is timed into `profile` (a StartupProfile) when one is given.
+        """
+        with self._reload_lock:
+            return self._reload(profile)
+
+    def reload_in_background(self) -> bool:
+        """Starts a reload on its own thread. Returns False if one is already running."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._reload()
+            except Exception:
+                pass  # Recorded in last_error; the current artifacts keep serving.
+            finally:
+                self._reload_lock.release()
+
+        threading.Thread(target=run, name="model-reload", daemon=True).start()
+        return True
+
+    def _reload(self, profile=None) -> ModelArtifacts:
+        started = time.perf_counter()
+        signature = artifact_signature(self.model_dir)
+        try:
+            artifacts = ModelArtifacts.load(self.model_dir, profile)
+            # Validated first, so broken artifacts fail fast instead of after the derived builds.
+            with _phase(profile, 'warmup'):
+                artifacts.validate(self.h3_resolution, self.warmup_rows)
+            if self.prepare is not None:
+                with _phase(profile, 'prepare'):
+                    self.prepare(artifacts)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            # Don't retry the same broken files from the watcher.
+            self._signature = signature
+            self.history.append({"status": "failed", "error": self.last_error,
+                                 "at": datetime.now(timezone.utc).isoformat(timespec='seconds')})
+            logger.error("❌ Could not load model artifacts from '%s'. %s", self.model_dir, self.last_error)
+            raise
+
+        previous = self.current
+        self.current = artifacts
+        self._signature = signature
+        self.reloads += 1
+        self.last_error = None
+        for callback in self.on_swap:
+            callback(artifacts)
+        seconds = round(time.perf_counter() - started, 3)
+        self.history.append({"status": "loaded", "version": artifacts.version, "seconds": seconds,
+                             "at": artifacts.loaded_at})
+        replaced = f" (replacing {previous.version})" if previous is not None else ""
+        logger.info("✅ Model %s loaded in %ss%s.", artifacts.version, seconds, replaced)
+        return artifacts
+
+    def start_watching(self, interval_seconds: float):
+        """Polls the artifact files and reloads in the background when they change."""
+        if self._watcher is not None:
+            return
+        if self._signature is None:
+            self._signature = artifact_signature(self.model_dir)
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval_seconds,),
+                                         name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop_watching.set()
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval_seconds: float):
+        pending = None
+        while not self._stop_watching.wait(interval_seconds):
+            signature = artifact_signature(self.model_dir)
+            if signature == self._signature:
+                pending = None
+                continue
+            # Only reload once the files have stopped changing for a whole interval,
+            # so a copy still in progress is not picked up half-written.
+            if signature != pending:
+                pending = signature
+                continue
+            pending = None
+            self.reload_in_background()
+
+    def status(self) -> dict:
+        return {
+            "current": self.current.describe() if self.current is not None else None,
+            "reloading": self.reloading,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "watching": self._watcher is not None,
+            "history": list(self.history),
+        }
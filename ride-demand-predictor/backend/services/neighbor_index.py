@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+import h3
+import numpy as np
+
+from core.geo import grid_disk
+
+logger = logging.getLogger(__name__)
+
+# File names inside the index directory. Each array is a plain .npy so it can be memory-mapped.
+_CELLS_FILE = 'cells.npy'            # uint64, sorted: every unknown cell within the radius
+_DISTANCES_FILE = 'distances.npy'    # uint8: ring distance to the nearest known cells
+_OFFSETS_FILE = 'offsets.npy'        # int64, len(cells) + 1: slice of candidates for each cell
+_CANDIDATES_FILE = 'candidates.npy'  # int32: positions in known_cells
+_KNOWN_FILE = 'known_cells.npy'      # uint64, sorted: the known cells the index was built from
+_META_FILE = 'meta.json'
+
+
+class NeighborIndex:
+    """
+    Maps every resolution-12 cell within `max_ring` of a known cell to the known cells at
+    the minimal ring distance, so a fallback costs one binary search instead of repeated
+    `grid_disk` expansions. Candidates are stored in ascending cell order.
+    """
+
+    def __init__(self, cells, distances, offsets, candidates, known_cells, max_ring: int):
+        self.cells = cells
+        self.distances = distances
+        self.offsets = offsets
+        self.candidates = candidates
+        self.known_cells = known_cells
+        self.max_ring = max_ring
+
+    @classmethod
+    def build(cls, known_h3_cells: Iterable[str], max_ring: int = 5) -> "NeighborIndex":
+        """Multi-source BFS outward from every known cell, one ring at a time."""
+        known = sorted(known_h3_cells)
+        # Each reached cell carries the set of known cells (as positions in `known`) that
+        # are at its minimal distance. A cell first reached at distance d inherits the union
+        # of the sets of its neighbours at distance d - 1.
+        reached = {cell: {i} for i, cell in enumerate(known)}
+        frontier = list(known)
+        layers = []
+        for distance in range(1, max_ring + 1):
+            next_layer = {}
+            for cell in frontier:
+                sources = reached[cell]
+                for neighbor in h3.grid_ring(cell, 1):
+                    if neighbor in reached:
+                        continue
+                    next_layer.setdefault(neighbor, set()).update(sources)
+            reached.update(next_layer)
+            layers.append((distance, next_layer))
+            frontier = list(next_layer)
+
+        rows = sorted(
+            (h3.str_to_int(cell), distance, sorted(sources))
+            for distance, layer in layers
+            for cell, sources in layer.items()
+        )
+        cells = np.fromiter((row[0] for row in rows), dtype=np.uint64, count=len(rows))
+        distances = np.fromiter((row[1] for row in rows), dtype=np.uint8, count=len(rows))
+        counts = np.fromiter((len(row[2]) for row in rows), dtype=np.int64, count=len(rows))
+        offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(counts)])
+        candidates = np.fromiter((i for row in rows for i in row[2]), dtype=np.int32, count=int(offsets[-1]))
+        known_cells = np.fromiter((h3.str_to_int(cell) for cell in known), dtype=np.uint64, count=len(known))
+        return cls(cells, distances, offsets, candidates, known_cells, max_ring)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, _CELLS_FILE), self.cells)
+        np.save(os.path.join(directory, _DISTANCES_FILE), self.distances)
+        np.save(os.path.join(directory, _OFFSETS_FILE), self.offsets)
+        np.save(os.path.join(directory, _CANDIDATES_FILE), self.candidates)
+        np.save(os.path.join(directory, _KNOWN_FILE), self.known_cells)
+        with open(os.path.join(directory, _META_FILE), 'w') as f:
+            json.dump({'max_ring': self.max_ring, 'indexed_cells': len(self.cells),
+                       'known_cells': len(self.known_cells)}, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "NeighborIndex":
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(directory, _META_FILE), 'r') as f:
+            meta = json.load(f)
+
+        def load_array(name):
+            # Plain ndarray views of the mapped files: np.memmap indexing is much slower.
+            return np.load(os.path.join(directory, name), mmap_mode=mmap_mode).view(np.ndarray)
+
+        return cls(
+            load_array(_CELLS_FILE),
+            load_array(_DISTANCES_FILE),
+            load_array(_OFFSETS_FILE),
+            load_array(_CANDIDATES_FILE),
+            load_array(_KNOWN_FILE),
+            meta['max_ring'],
+        )
+
+    def matches(self, known_cells: np.ndarray) -> bool:
+        """True if the index was built from exactly these known cells (sorted uint64)."""
+        return np.array_equal(known_cells, self.known_cells)
+
+    def lookup(self, h3_cell: int) -> Tuple[Optional[int], np.ndarray]:
+        """Returns (ring distance, nearest known uint64 cells), or (None, []) outside the radius."""
+        key = np.uint64(h3_cell)
+        position = int(np.searchsorted(self.cells, key))
+        if position == len(self.cells) or self.cells[position] != key:
+            return None, self.known_cells[:0]
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return int(self.distances[position]), self.known_cells[self.candidates[start:end]]
+
+
+def load_if_current(directory: str, known_cells: np.ndarray, max_ring: int) -> Optional[NeighborIndex]:
+    """Loads a saved index if it exists and still matches the model's known cells."""
+    if not os.path.exists(os.path.join(directory, _META_FILE)):
+        return None
+    started = time.perf_counter()
+    index = NeighborIndex.load(directory)
+    if index.max_ring != max_ring or not index.matches(known_cells):
+        logger.warning("⚠️ Neighbor index at %s is out of date; falling back to ring search. "
+                       "Rebuild it with build_neighbor_index.py.", directory)
+        return None
+    logger.info("✅ Neighbor index loaded (%d cells) in %.1f ms.", len(index.cells), (time.perf_counter() - started) * 1000)
+    return index
+
+
+def search_rings(h3_cell: int, is_known: Callable[[np.ndarray], np.ndarray], max_ring: int):
+    """
+    Without an index: searches outward from a uint64 cell ring by ring. Returns the same
+    (ring distance, known cells in ascending order) as NeighborIndex.lookup.
+    """
+    for k in range(1, max_ring + 1):
+        neighbors = grid_disk(h3_cell, k)
+        known_neighbors = np.sort(neighbors[is_known(neighbors)])
+        if len(known_neighbors):
+            return k, known_neighbors
+    return None, np.empty(0, dtype=np.uint64)
@@ -0,0 +1,206 @@
+"""
+Origin-destination flows between H3 zones, per (day of week, hour of day).
+
+Trips are counted per (slot, origin zone, destination zone), where slot = day * 24 + hour,
+and stored twice in CSR form: rows keyed by (slot, origin) for outbound flows and by
+(slot, destination) for inbound flows. A zone's flows in a slot are then one contiguous
+slice of each, found with a binary search, however many zones there are.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SLOTS = 7 * 24
+
+# File names inside the matrix directory. Each array is a plain .npy so it can be memory-mapped.
+_ZONES_FILE = 'zones.npy'                # uint64, sorted: every origin or destination zone
+_TOTALS_FILE = 'totals.npy'              # int32 (2, slots, zones): trips out of and into each zone
+_META_FILE = 'meta.json'
+_DIRECTIONS = ('outbound', 'inbound')
+# Per direction: row offsets (int64, slots * zones + 1), the other zone of each flow (int32
+# positions in zones), its trip count (int32) and the mean trip distance in km (float32).
+_FLOW_ARRAYS = ('offsets', 'zones', 'trips', 'distance_km')
+
+
+class FlowAggregator:
+    """
+    Running (slot, origin, destination) trip counts and distance sums over chunks of trips.
+    Memory depends on the number of distinct flows, not on the number of trips.
+    """
+
+    def __init__(self):
+        self._partials = []
+
+    def add(self, origins: np.ndarray, destinations: np.ndarray, days: np.ndarray, hours: np.ndarray,
+            distances_km: np.ndarray):
+        slots = np.asarray(days, dtype=np.int64) * 24 + np.asarray(hours, dtype=np.int64)
+        keys = np.rec.fromarrays([slots, origins, destinations], names='slot,origin,destination')
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        self._partials.append((unique_keys, np.bincount(inverse, minlength=len(unique_keys)),
+                               np.bincount(inverse, weights=distances_km, minlength=len(unique_keys))))
+
+    def result(self):
+        """(slots, origins, destinations, trips, distance sums), one entry per distinct flow."""
+        if not self._partials:
+            empty = np.empty(0, dtype=np.uint64)
+            return np.empty(0, dtype=np.int64), empty, empty, np.empty(0, dtype=np.int64), np.empty(0)
+        keys = np.concatenate([partial[0] for partial in self._partials])
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        inverse = inverse.ravel()
+        trips = np.bincount(inverse, weights=np.concatenate([p[1] for p in self._partials]),
+                            minlength=len(unique_keys))
+        distances = np.bincount(inverse, weights=np.concatenate([p[2] for p in self._partials]),
+                                minlength=len(unique_keys))
+        return (unique_keys['slot'], unique_keys['origin'].astype(np.uint64),
+                unique_keys['destination'].astype(np.uint64), trips.astype(np.int64), distances)
+
+
+class ODMatrix:
+    """Outbound and inbound zone-to-zone trip counts per (day, hour), as CSR arrays."""
+
+    def __init__(self, zones: np.ndarray, totals: np.ndarray, flows: Dict[str, Dict[str, np.ndarray]],
+                 resolution: int, trips: int):
+        self.zones = zones
+        self.totals = totals
+        self.flows = flows
+        self.resolution = resolution
+        self.trips = trips
+
+    @classmethod
+    def build(cls, aggregator: FlowAggregator, resolution: int) -> "ODMatrix":
+        slots, origins, destinations, trips, distance_sums = aggregator.result()
+        zones = np.unique(np.concatenate([origins, destinations]))
+        n_rows = SLOTS * len(zones)
+        origin_positions = np.searchsorted(zones, origins)
+        destination_positions = np.searchsorted(zones, destinations)
+        mean_distance = (distance_sums / np.maximum(trips, 1)).astype(np.float32)
+
+        flows = {}
+        totals = np.zeros((2, SLOTS, len(zones)), dtype=np.int32)
+        for i, (direction, row_zones, other_zones) in enumerate((
+                ('outbound', origin_positions, destination_positions),
+                ('inbound', destination_positions, origin_positions))):
+            rows = slots * len(zones) + row_zones
+            # Rows in order, and within a row the busiest flows first.
+            order = np.lexsort((other_zones, -trips, rows))
+            counts = np.bincount(rows, minlength=n_rows)
+            flows[direction] = {
+                'offsets': np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(counts)]),
+                'zones': other_zones[order].astype(np.int32),
+                'trips': trips[order].astype(np.int32),
+                'distance_km': mean_distance[order],
+            }
+            totals[i] = np.bincount(rows, weights=trips, minlength=n_rows).reshape(SLOTS, len(zones))
+        return cls(zones, totals, flows, resolution, int(trips.sum()))
+
+    def save(self, directory: str):
+        """
+        Each file is written under a temporary name and moved into place, so a server that
+        has the previous files mapped keeps reading them. The metadata goes last.
+        """
+        os.makedirs(directory, exist_ok=True)
+        arrays = {_ZONES_FILE: self.zones, _TOTALS_FILE: self.totals}
+        for direction in _DIRECTIONS:
+            for name in _FLOW_ARRAYS:
+                arrays[f'{direction}_{name}.npy'] = self.flows[direction][name]
+        for file_name, array in arrays.items():
+            staging_path = os.path.join(directory, f'.{file_name}')
+            with open(staging_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(staging_path, os.path.join(directory, file_name))
+        staging_path = os.path.join(directory, f'.{_META_FILE}')
+        with open(staging_path, 'w') as f:
+            json.dump({'resolution': self.resolution, 'zones': len(self.zones), 'trips': self.trips,
+                       'flows': len(self.flows['outbound']['trips'])}, f, indent=2)
+        os.replace(staging_path, os.path.join(directory, _META_FILE))
+
+    @classmethod
+    def load(cls, directory: str) -> "ODMatrix":
+        with open(os.path.join(directory, _META_FILE), 'r') as f:
+            meta = json.load(f)
+
+        def load_array(name):
+            # Plain ndarray views of the mapped files: np.memmap indexing is much slower.
+            return np.load(os.path.join(directory, name), mmap_mode='r').view(np.ndarray)
+
+        flows = {direction: {name: load_array(f'{direction}_{name}.npy') for name in _FLOW_ARRAYS}
+                 for direction in _DIRECTIONS}
+        return cls(load_array(_ZONES_FILE), load_array(_TOTALS_FILE), flows, meta['resolution'], meta['trips'])
+
+    def zone_position(self, zone: int) -> Optional[int]:
+        position = int(np.searchsorted(self.zones, np.uint64(zone)))
+        if position == len(self.zones) or self.zones[position] != zone:
+            return None
+        return position
+
+    def top_flows(self, direction: str, zone: int, day: int, hour: int, k: int):
+        """
+        The `k` busiest flows out of ('outbound') or into ('inbound') a uint64 zone in a slot:
+        (other zones, trips, mean distance in km), busiest first. Empty for unknown zones.
+        """
+        flows = self.flows[direction]
+        position = self.zone_position(zone)
+        if position is None:
+            return self.zones[:0], flows['trips'][:0], flows['distance_km'][:0]
+        row = (day * 24 + hour) * len(self.zones) + position
+        start = flows['offsets'][row]
+        end = min(flows['offsets'][row + 1], start + k)
+        return self.zones[flows['zones'][start:end]], flows['trips'][start:end], flows['distance_km'][start:end]
+
+    def zone_totals(self, zone: int, day: int, hour: int) -> Tuple[int, int]:
+        """(trips out of, trips into) a uint64 zone in a slot."""
+        position = self.zone_position(zone)
+        if position is None:
+            return 0, 0
+        return int(self.totals[0, day * 24 + hour, position]), int(self.totals[1, day * 24 + hour, position])
+
+    def net_flow(self, day: int, hour: int):
+        """
+        (zones, outbound trips, inbound trips) of every zone with trips in a slot, by net flow
+        (inbound - outbound) from most positive (riders end up there) to most negative.
+        """
+        outbound, inbound = self.totals[0, day * 24 + hour], self.totals[1, day * 24 + hour]
+        positions = np.flatnonzero((outbound > 0) | (inbound > 0))
+        positions = positions[np.argsort(outbound[positions].astype(np.int64) - inbound[positions], kind='stable')]
+        return self.zones[positions], outbound[positions], inbound[positions]
+
+    def stats(self) -> dict:
+        size = self.zones.nbytes + self.totals.nbytes + sum(
+            array.nbytes for arrays in self.flows.values() for array in arrays.values())
+        return {'resolution': self.resolution, 'zones': len(self.zones), 'trips': self.trips,
+                'flows': len(self.flows['outbound']['trips']), 'size_bytes': int(size)}
+
+
+class ODMatrixStore:
+    """The matrix saved in a directory, loaded on first use and again whenever it is rebuilt."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._matrix: Optional[ODMatrix] = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[ODMatrix]:
+        """The latest saved matrix, or None if none has been built."""
+        try:
+            stat = os.stat(os.path.join(self.directory, _META_FILE))
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    started = time.perf_counter()
+                    self._matrix = ODMatrix.load(self.directory)
+                    self._signature = signature
+                    logger.info("✅ OD matrix loaded (%d zones, %d flows) in %.1f ms.", len(self._matrix.zones),
+                                len(self._matrix.flows['outbound']['trips']), (time.perf_counter() - started) * 1000)
+        return self._matrix
@@ -0,0 +1,195 @@
+"""
+Demand predictions for one loaded set of model artifacts, shared by the API, the offline
+scripts and test_model.py so that they all answer the same way: single locations,
+batches, grids of cells x days x hours and disks around a point, with the fallback to
+the nearest known cells for locations the model has no history for.
+
+Cells are uint64 throughout; callers format them as hex strings for output.
+"""
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import h3.api.numpy_int as h3_int
+import numpy as np
+
+from core.geo import grid_disk, latlng_to_uint64
+from services import metrics, neighbor_index
+from services.metrics import time_stage
+from services.model_registry import ModelArtifacts
+
+FALLBACK_RINGS = metrics.REGISTRY.counter(
+    "ridepulse_fallback_searches_total",
+    "Neighbour searches for unknown cells, by the ring where known cells were found ('none' if not found).",
+    ["ring"])
+
+# Scores known uint64 cells: (cells, day_of_week, hour_of_day, business_ratio[, weather]) -> demand.
+# Day, hour and business ratio are scalars or arrays, as in ModelArtifacts.predict_rows.
+ScoreFn = Callable[..., np.ndarray]
+# Weather at uint64 cells: (cells, day_of_week, hour_of_day) -> (cells, len(WEATHER_FEATURES)) array.
+WeatherFn = Callable[[np.ndarray, object, object], np.ndarray]
+
+
+class Predictor:
+    """
+    Wraps `ModelArtifacts` with the fallback search and the prediction shapes callers need.
+    Known cells are scored with `score`, which defaults to the model itself; the API
+    passes one that answers from the demand cube or goes through the inference batcher.
+    For weather-aware models, `weather` supplies the conditions at the scored cells.
+    """
+
+    def __init__(self, artifacts: ModelArtifacts, h3_resolution: int = 12, max_ring: int = 5,
+                 index: Optional[neighbor_index.NeighborIndex] = None, score: Optional[ScoreFn] = None,
+                 weather: Optional[WeatherFn] = None):
+        self.artifacts = artifacts
+        self.h3_resolution = h3_resolution
+        self.max_ring = max_ring
+        self.index = index
+        self.score = score or artifacts.predict_rows
+        self.weather = weather if artifacts.uses_weather else None
+
+    @classmethod
+    def load(cls, model_dir: str, h3_resolution: int = 12, max_ring: int = 5,
+             index_dir: Optional[str] = None, weather: Optional[WeatherFn] = None) -> "Predictor":
+        """Loads artifacts (and their neighbor index, if one is current) for use outside the API."""
+        artifacts = ModelArtifacts.load(model_dir)
+        index = neighbor_index.load_if_current(index_dir or os.path.join(model_dir, 'neighbor_index'),
+                                               artifacts.known_cells, max_ring)
+        return cls(artifacts, h3_resolution, max_ring, index, weather=weather)
+
+    @property
+    def version(self) -> str:
+        return self.artifacts.version
+
+    def score_cells(self, cells: np.ndarray, day_of_week, hour_of_day, business_ratio) -> np.ndarray:
+        """Scores known uint64 cells with `score`, adding their weather when the model uses it."""
+        if self.weather is None:
+            return self.score(cells, day_of_week, hour_of_day, business_ratio)
+        return self.score(cells, day_of_week, hour_of_day, business_ratio,
+                          self.weather(cells, day_of_week, hour_of_day))
+
+    def nearest_known(self, h3_cell: int) -> Tuple[Optional[int], np.ndarray]:
+        """
+        The closest cells we have historical data for, in ascending cell order.
+        Returns (ring distance, known uint64 cells), or (None, empty array) if nothing is close enough.
+        """
+        with time_stage("neighbor_search"):
+            if self.index is not None:
+                k, known_neighbors = self.index.lookup(h3_cell)
+            else:
+                k, known_neighbors = neighbor_index.search_rings(h3_cell, self.artifacts.is_known, self.max_ring)
+        FALLBACK_RINGS.inc(str(k) if k is not None else "none")
+        return k, known_neighbors
+
+    def resolve(self, requested_cells: np.ndarray) -> List[np.ndarray]:
+        """
+        Candidate uint64 cells per requested cell: the cell itself when known, otherwise its
+        nearest known neighbours (empty if there are none). Repeated unknown cells share one search.
+        """
+        fallback_candidates: Dict[int, np.ndarray] = {}
+        candidates_per_item = []
+        for cell, is_known in zip(requested_cells.tolist(), self.artifacts.is_known(requested_cells).tolist()):
+            if is_known:
+                candidates_per_item.append(np.array([cell], dtype=np.uint64))
+                continue
+            if cell not in fallback_candidates:
+                fallback_candidates[cell] = self.nearest_known(cell)[1]
+            candidates_per_item.append(fallback_candidates[cell])
+        return candidates_per_item
+
+    def predict_cell(self, h3_cell: int, day_of_week: int, hour_of_day: int, business_ratio: float) -> dict:
+        """
+        Demand at one uint64 cell, or at its best nearest known neighbour. `prediction_h3_cell`
+        is 0 and `predicted_demand` NaN when no known cell is close enough; `ring` is the
+        fallback distance (0 for a known cell).
+        """
+        if self.artifacts.is_known([h3_cell])[0]:
+            ring, candidates = 0, np.array([h3_cell], dtype=np.uint64)
+        else:
+            ring, candidates = self.nearest_known(h3_cell)
+        result = {"requested_h3_cell": h3_cell, "prediction_h3_cell": 0, "predicted_demand": float("nan"),
+                  "is_fallback": ring != 0, "ring": ring}
+        if len(candidates):
+            predictions = self.score_cells(candidates, day_of_week, hour_of_day, business_ratio)
+            best = int(predictions.argmax())
+            result["prediction_h3_cell"] = int(candidates[best])
+            result["predicted_demand"] = predictions[best]
+        return result
+
+    def predict(self, latitude: float, longitude: float, day_of_week: int, hour_of_day: int,
+                business_ratio: float) -> dict:
+        """Same as predict_cell, for the cell containing a point."""
+        with time_stage("h3_convert"):
+            h3_cell = h3_int.latlng_to_cell(latitude, longitude, self.h3_resolution)
+        return self.predict_cell(h3_cell, day_of_week, hour_of_day, business_ratio)
+
+    def predict_batch(self, latitudes: Sequence[float], longitudes: Sequence[float], day_of_week: Sequence[int],
+                      hour_of_day: Sequence[int], business_ratio: Sequence[float]) -> Dict[str, np.ndarray]:
+        """
+        Predicts demand for many locations at once. Cells are resolved in one pass, fallback
+        searches run once per distinct unknown cell, and every candidate row is scored in a
+        single call. Returns one column per output field, with uint64 cells; items with
+        no known data nearby have a prediction cell of 0 and a demand of NaN.
+        """
+        n_items = len(latitudes)
+        if any(len(column) != n_items for column in (longitudes, day_of_week, hour_of_day, business_ratio)):
+            raise ValueError("All input arrays must have the same length.")
+
+        with time_stage("h3_convert"):
+            requested_cells = latlng_to_uint64(latitudes, longitudes, self.h3_resolution)
+        candidates_per_item = self.resolve(requested_cells)
+
+        counts = np.fromiter((len(c) for c in candidates_per_item), dtype=np.intp, count=n_items)
+        owners = np.repeat(np.arange(n_items), counts)
+        predictions = np.empty(0)
+        if counts.sum():
+            predictions = self.score_cells(
+                np.concatenate(candidates_per_item),
+                np.asarray(day_of_week)[owners],
+                np.asarray(hour_of_day)[owners],
+                np.asarray(business_ratio)[owners],
+            )
+
+        prediction_cells = np.zeros(n_items, dtype=np.uint64)
+        predicted_demand = np.full(n_items, np.nan)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        for i in np.flatnonzero(counts):
+            item_predictions = predictions[offsets[i]:offsets[i + 1]]
+            best = int(item_predictions.argmax())
+            prediction_cells[i] = candidates_per_item[i][best]
+            predicted_demand[i] = item_predictions[best]
+
+        return {
+            "requested_h3_cell": requested_cells,
+            "prediction_h3_cell": prediction_cells,
+            "predicted_demand": predicted_demand,
+        }
+
+    def predict_grid(self, cells: np.ndarray, days: Sequence[int], hours: Sequence[int],
+                     business_ratio: float) -> np.ndarray:
+        """
+        Demand of known uint64 cells for every combination of the given days and hours,
+        scored in one call. Returns a (cells, days, hours) array.
+        """
+        cells = np.asarray(cells, dtype=np.uint64)
+        days, hours = np.asarray(days), np.asarray(hours)
+        slots = len(days) * len(hours)
+        if not len(cells) or not slots:
+            return np.empty((len(cells), len(days), len(hours)))
+        predictions = self.score_cells(
+            np.repeat(cells, slots),
+            np.tile(np.repeat(days, len(hours)), len(cells)),
+            np.tile(np.tile(hours, len(days)), len(cells)),
+            business_ratio,
+        )
+        return np.asarray(predictions).reshape(len(cells), len(days), len(hours))
+
+    def predict_around(self, center_cell: int, radius: int, day_of_week: int, hour_of_day: int,
+                       business_ratio: float) -> Tuple[np.ndarray, np.ndarray]:
+        """The known uint64 cells within `radius` rings of a cell and their demand."""
+        with time_stage("heatmap_grid"):
+            grid_cells = grid_disk(center_cell, radius)
+            known_cells = grid_cells[self.artifacts.is_known(grid_cells)]
+        if not len(known_cells):
+            return known_cells, np.empty(0)
+        return known_cells, np.asarray(self.score_cells(known_cells, day_of_week, hour_of_day, business_ratio),
+                                       dtype=np.float64)
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+
+class _Flight:
+    """A computation in progress that concurrent callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ResponseCache:
+    """
+    Thread-safe in-process cache with LRU eviction and an optional TTL.
+    Concurrent misses for the same key are collapsed into a single computation.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds or None
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Bumped by invalidate() so computations that started before it are not stored.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if self.max_entries <= 0:
+            return compute()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+            generation = self._generation
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            self._store(key, flight.value, generation)
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is flight:
+                    del self._in_flight[key]
+            flight.done.set()
+        return flight.value
+
+    def get_or_compute_many(self, keys: List[Hashable],
+                            compute_missing: Callable[[List[Hashable]], List[Any]]) -> List[Any]:
+        """
+        Looks up several keys at once. `compute_missing` gets all the missing keys in one
+        call (so they can be scored in one model pass) and returns their values in order.
+        Unlike get_or_compute, concurrent misses for the same key are not collapsed.
+        """
+        if self.max_entries <= 0:
+            return list(compute_missing(list(keys)))
+
+        values = [None] * len(keys)
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None:
+                    expires_at, value = entry
+                    if expires_at is None or expires_at > now:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        values[i] = value
+                        continue
+                    del self._entries[key]
+                    self.expirations += 1
+                self.misses += 1
+                missing.append(i)
+            generation = self._generation
+
+        if missing:
+            computed = compute_missing([keys[i] for i in missing])
+            for i, value in zip(missing, computed):
+                values[i] = value
+                self._store(keys[i], value, generation)
+        return values
+
+    def _store(self, key: Hashable, value: Any, generation: int):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """
+        Drops every entry, e.g. after the model changes. Computations already running
+        finish for their own callers, but later callers start a fresh one.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._in_flight = {}
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
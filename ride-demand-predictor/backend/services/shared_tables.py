@@ -0,0 +1,100 @@
+"""
+Derived tables (demand cube, demand pyramid, hotspot index) stored as .npy files and
+memory-mapped read-only, so every worker process on a machine reads the same pages from
+the OS page cache instead of holding its own copy.
+
+Tables live in `<directory>/<model version>/<table name>-<params hash>/`, where the hash
+covers the settings the table was built with, so changing one of them builds a new copy.
+The first worker to need a table builds and writes it; the others (and restarted workers)
+map the files.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from typing import Callable, Dict, Optional, Protocol, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_META_FILE = "meta.json"
+# Older model versions kept on disk, for workers still serving them during a reload.
+KEEP_VERSIONS = 2
+
+
+class SharedTable(Protocol):
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], dict]: ...
+
+
+def _version_dir(directory: str, version: str) -> str:
+    return os.path.join(directory, re.sub(r"[^A-Za-z0-9._-]", "_", version))
+
+
+def params_key(params: dict) -> str:
+    """A short hash of JSON-serializable build parameters."""
+    encoded = json.dumps(params, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+
+def load_or_build(directory: str, version: str, name: str, build: Callable[[], SharedTable],
+                  from_arrays: Callable[[Dict[str, np.ndarray], dict], SharedTable],
+                  params: Optional[dict] = None) -> SharedTable:
+    """
+    Maps a table written earlier for this model version and these build `params`, or
+    builds it with `build`, writes it and maps the written files. `from_arrays` rebuilds
+    the table from its arrays (memory-mapped) and JSON metadata.
+    """
+    params = params or {}
+    table_dir = os.path.join(_version_dir(directory, version), f"{name}-{params_key(params)}")
+    if not os.path.exists(os.path.join(table_dir, _META_FILE)):
+        _write(table_dir, build(), params)
+        _prune(directory, version)
+        _prune_builds(table_dir, name)
+    with open(os.path.join(table_dir, _META_FILE)) as f:
+        meta = json.load(f)
+    arrays = {key: np.load(os.path.join(table_dir, f"{key}.npy"), mmap_mode="r") for key in meta["arrays"]}
+    logger.info("✅ Mapped shared table '%s' (%.1f MB) from '%s'.",
+                name, sum(array.nbytes for array in arrays.values()) / 1e6, table_dir)
+    return from_arrays(arrays, meta["meta"])
+
+
+def _write(table_dir: str, table: SharedTable, params: dict):
+    arrays, meta = table.to_arrays()
+    parent = os.path.dirname(table_dir)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=parent)
+    try:
+        for key, array in arrays.items():
+            np.save(os.path.join(staging, f"{key}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(staging, _META_FILE), "w") as f:
+            json.dump({"arrays": list(arrays), "meta": meta, "params": params}, f)
+        try:
+            os.rename(staging, table_dir)
+        except OSError:
+            # Another worker wrote the same table first; theirs is identical.
+            if not os.path.exists(os.path.join(table_dir, _META_FILE)):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _prune(directory: str, version: str):
+    """Removes tables of all but the newest KEEP_VERSIONS model versions. Mapped files stay readable."""
+    current = os.path.basename(_version_dir(directory, version))
+    others = [entry for entry in os.scandir(directory)
+              if entry.is_dir() and entry.name != current and not entry.name.startswith(".")]
+    others.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in others[KEEP_VERSIONS - 1:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _prune_builds(table_dir: str, name: str):
+    """Removes copies of this table built with other parameters. Mapped files stay readable."""
+    current = os.path.basename(table_dir)
+    for entry in os.scandir(os.path.dirname(table_dir)):
+        if entry.is_dir() and entry.name != current and entry.name.rsplit("-", 1)[0] == name:
+            shutil.rmtree(entry.path, ignore_errors=True)
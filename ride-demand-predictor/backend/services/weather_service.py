@@ -0,0 +1,246 @@
+"""
+Weather conditions for weather-aware models, per coarse H3 region and hour of the week.
+
+Predictions read them from a `WeatherCache`, which only ever answers from memory: cells
+are mapped to their region, and (region, slot) pairs missing from the cache are scored
+with missing weather while a background thread fetches them from the `WeatherProvider`,
+all the misses of a batch or heatmap in one call. Entries are refreshed shortly before
+they expire, as long as they are still being used.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.geo import cells_to_parents, cells_to_uint64
+from services.metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+# The model inputs a weather-aware model adds, in this order.
+WEATHER_FEATURES = ['temperature', 'precipitation_mm']
+SLOTS = 7 * 24
+# Columns of the stand-in weather file: one row per (region, day, hour).
+WEATHER_FILE_COLUMNS = ['region', 'day_of_week', 'hour_of_day'] + WEATHER_FEATURES
+
+
+class WeatherProvider:
+    """Where weather comes from. Implementations may be slow: only the cache's refresh thread calls them."""
+
+    def fetch(self, regions: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        """
+        Conditions for uint64 regions at slots (day * 24 + hour, for the next occurrence of
+        that weekday and hour), as a (len(regions), len(WEATHER_FEATURES)) array. NaN where unknown.
+        """
+        raise NotImplementedError
+
+
+class FileWeatherProvider(WeatherProvider):
+    """
+    A local stand-in for a forecast service, for tests and offline use: a CSV with
+    WEATHER_FILE_COLUMNS (written by build_weather_file.py), re-read when it changes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._table: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _current_table(self) -> Dict[Tuple[int, int], Tuple[float, float]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return {}
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                frame = read_weather_file(self.path)
+                regions = cells_to_uint64(frame['region'].tolist()).tolist()
+                slots = (frame['day_of_week'].to_numpy() * 24 + frame['hour_of_day'].to_numpy()).tolist()
+                values = frame[WEATHER_FEATURES].to_numpy(dtype=np.float64).tolist()
+                self._table = {(region, slot): tuple(row) for region, slot, row in zip(regions, slots, values)}
+                self._signature = signature
+            return self._table
+
+    def fetch(self, regions: np.ndarray, slots: np.ndarray) -> np.ndarray:
+        table = self._current_table()
+        missing = (np.nan,) * len(WEATHER_FEATURES)
+        return np.array([table.get((region, slot), missing)
+                         for region, slot in zip(np.asarray(regions, dtype=np.uint64).tolist(),
+                                                 np.asarray(slots).tolist())],
+                        dtype=np.float64).reshape(-1, len(WEATHER_FEATURES))
+
+
+def read_weather_file(path: str):
+    import pandas as pd
+
+    return pd.read_csv(path, usecols=WEATHER_FILE_COLUMNS,
+                       dtype={'region': 'object', 'day_of_week': 'int64', 'hour_of_day': 'int64'})
+
+
+def write_weather_file(frame, path: str):
+    """Writes WEATHER_FILE_COLUMNS under a temporary name and moves it into place."""
+    staging_path = os.path.join(os.path.dirname(os.path.abspath(path)), f".{os.path.basename(path)}")
+    frame[WEATHER_FILE_COLUMNS].to_csv(staging_path, index=False)
+    os.replace(staging_path, path)
+
+
+class WeatherCache:
+    """
+    Weather per (uint64 region, slot) held in memory with a time to live. `lookup` never
+    waits on the provider: misses and expired entries are queued for the refresh thread,
+    and callbacks in `on_update` run after each fetch (e.g. to drop cached responses).
+    """
+
+    def __init__(self, provider: WeatherProvider, resolution: int = 7, ttl_seconds: float = 1800.0,
+                 refresh_seconds: float = 60.0, on_update: Iterable[Callable[[], None]] = ()):
+        self.provider = provider
+        self.resolution = resolution
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self.on_update = list(on_update)
+        # (region, slot) -> [weather values, expires at, used since fetched]
+        self._entries: Dict[Tuple[int, int], List] = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "fetches": 0, "fetched_keys": 0, "failures": 0}
+        self.last_fetch_ms = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="weather-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def lookup(self, h3_cells: np.ndarray, day_of_week, hour_of_day) -> np.ndarray:
+        """
+        Weather at uint64 cells, as a (len(cells), len(WEATHER_FEATURES)) array, NaN where
+        the cache has nothing yet. Day and hour are scalars or arrays, as in predict_rows.
+        Each distinct (region, slot) is looked up once.
+        """
+        cells = np.asarray(h3_cells, dtype=np.uint64)
+        if not len(cells):
+            return np.empty((0, len(WEATHER_FEATURES)))
+        with time_stage("weather_lookup"):
+            regions, region_codes = np.unique(cells_to_parents(cells, self.resolution), return_inverse=True)
+            slots = np.asarray(day_of_week, dtype=np.int64) * 24 + np.asarray(hour_of_day, dtype=np.int64)
+            keys, key_inverse = np.unique(region_codes.ravel() * SLOTS + slots, return_inverse=True)
+            regions = regions.tolist()
+            values = np.full((len(keys), len(WEATHER_FEATURES)), np.nan)
+            now = time.monotonic()
+            queued, hits, stale = [], 0, 0
+            for i, key in enumerate(keys.tolist()):
+                entry_key = (regions[key // SLOTS], key % SLOTS)
+                entry = self._entries.get(entry_key)
+                if entry is None:
+                    queued.append(entry_key)
+                    continue
+                values[i] = entry[0]
+                entry[2] = True
+                if entry[1] <= now:
+                    queued.append(entry_key)
+                    stale += 1
+                else:
+                    hits += 1
+            with self._lock:
+                self._stats["hits"] += hits
+                self._stats["stale"] += stale
+                self._stats["misses"] += len(keys) - hits - stale
+                new_keys = [key for key in queued if key not in self._pending]
+                self._pending.update(new_keys)
+            if new_keys:
+                self._wake.set()
+            return values[key_inverse.ravel()]
+
+    def refresh(self) -> int:
+        """
+        Fetches every queued key and every used entry that would expire before the next
+        refresh, in one provider call; drops expired entries nobody used. Returns the
+        number of keys fetched. A failed fetch keeps the cached values and retries later.
+        """
+        now = time.monotonic()
+        with self._lock:
+            keys, self._pending = self._pending, set()
+        for key, entry in list(self._entries.items()):
+            if entry[1] <= now + self.refresh_seconds:
+                if entry[2]:
+                    keys.add(key)
+                elif entry[1] <= now:
+                    del self._entries[key]
+        if not keys:
+            return 0
+
+        keys = sorted(keys)
+        regions = np.fromiter((key[0] for key in keys), dtype=np.uint64, count=len(keys))
+        slots = np.fromiter((key[1] for key in keys), dtype=np.int64, count=len(keys))
+        started = time.perf_counter()
+        try:
+            values = np.asarray(self.provider.fetch(regions, slots), dtype=np.float64)
+            values = values.reshape(len(keys), len(WEATHER_FEATURES))
+        except Exception:
+            logger.exception("❌ Weather fetch failed for %d regions and hours; keeping cached values.", len(keys))
+            with self._lock:
+                self._stats["failures"] += 1
+                self._pending.update(key for key in keys if key not in self._entries)
+            return 0
+        self.last_fetch_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        expires_at = time.monotonic() + self.ttl_seconds
+        for key, row in zip(keys, values.tolist()):
+            self._entries[key] = [row, expires_at, False]
+        with self._lock:
+            self._stats["fetches"] += 1
+            self._stats["fetched_keys"] += len(keys)
+        for callback in self.on_update:
+            callback()
+        return len(keys)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.refresh()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "resolution": self.resolution,
+                "ttl_seconds": self.ttl_seconds,
+                "refresh_seconds": self.refresh_seconds,
+                "last_fetch_ms": self.last_fetch_ms,
+                "refreshing": self._thread is not None,
+            }
+
+
+def weather_frame(h3_cells, day_of_week, hour_of_day, provider: WeatherProvider, resolution: int):
+    """
+    Weather columns (a DataFrame) for rows of uint64 cells, days and hours, straight from
+    a provider. For training and offline use, where waiting on the provider is fine.
+    """
+    import pandas as pd
+
+    cells = np.asarray(h3_cells, dtype=np.uint64)
+    regions, region_codes = np.unique(cells_to_parents(cells, resolution), return_inverse=True)
+    slots = np.asarray(day_of_week, dtype=np.int64) * 24 + np.asarray(hour_of_day, dtype=np.int64)
+    keys, key_inverse = np.unique(region_codes.ravel() * SLOTS + slots, return_inverse=True)
+    values = np.asarray(provider.fetch(regions[keys // SLOTS], keys % SLOTS), dtype=np.float64)
+    return pd.DataFrame(values[key_inverse.ravel()], columns=WEATHER_FEATURES)
@@ -0,0 +1,142 @@
+"""
+Response encodings for endpoints that return many cells at once.
+
+Clients pick an encoding with the `Accept` header:
+
+- `application/json` (default): the documented JSON shape, serialized without building
+  one Pydantic object per point.
+- `application/x-ridepulse-columns`: raw little-endian column buffers. The body is a
+  uint32 header length, a UTF-8 JSON header `{"meta": {...}, "columns": [{"name",
+  "dtype", "length"}, ...]}`, then each column's bytes in header order. The header and
+  every column are zero-padded to a multiple of 8 bytes so each buffer can be viewed
+  directly as a typed array (e.g. `BigUint64Array`, `Float32Array`).
+- `application/msgpack`: `{"meta": {...}, "columns": {name: {"dtype", "data"}}}` where
+  `data` holds the same raw buffers. Requires the optional `msgpack` package.
+- `application/vnd.apache.arrow.stream`: an Arrow IPC stream with `meta` stored as
+  schema metadata. Requires the optional `pyarrow` package.
+
+H3 cells are sent as uint64 and demand as float32 in every columnar encoding. A column
+may be 2-D (one fixed-size row of values per item, e.g. a weekly profile): its header
+entry then carries a `shape`, and Arrow encodes it as a fixed-size list.
+"""
+import importlib.util
+import json
+import struct
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi.responses import Response
+
+from services.metrics import time_stage
+
+# The optional encoders are only imported when the first response needs them, so
+# that they add nothing to startup; pyarrow in particular takes a noticeable share.
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+HAS_MSGPACK = importlib.util.find_spec("msgpack") is not None
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+JSON = "application/json"
+COLUMNS = "application/x-ridepulse-columns"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+
+def supported_media_types() -> List[str]:
+    media_types = [JSON, COLUMNS]
+    if HAS_MSGPACK:
+        media_types.append(MSGPACK)
+    if HAS_PYARROW:
+        media_types.append(ARROW)
+    return media_types
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Picks the supported media type the client prefers most, defaulting to JSON."""
+    if not accept:
+        return JSON
+    supported = supported_media_types()
+    preferences = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type in supported and quality > 0:
+            preferences.append((-quality, position, media_type))
+    return min(preferences)[2] if preferences else JSON
+
+
+def json_response(payload) -> Response:
+    """Serializes plain Python data straight to a JSON response."""
+    with time_stage("serialize"):
+        if HAS_ORJSON:
+            import orjson
+
+            body = orjson.dumps(payload)
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return Response(content=body, media_type=JSON, headers={"Vary": "Accept"})
+
+
+def columnar_response(media_type: str, columns: Dict[str, np.ndarray], meta: dict) -> Response:
+    with time_stage("serialize"):
+        media_type, body = _encode_columns(media_type, columns, meta)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def _encode_columns(media_type: str, columns: Dict[str, np.ndarray], meta: dict):
+    # Fix byte order and dtype once so every encoding carries identical buffers.
+    columns = {name: np.ascontiguousarray(values, dtype=np.dtype(values.dtype).newbyteorder("<"))
+               for name, values in columns.items()}
+    if media_type == MSGPACK:
+        import msgpack
+
+        body = msgpack.packb({
+            "meta": meta,
+            "columns": {name: {"dtype": values.dtype.str, "data": values.tobytes(), **_shape(values)}
+                        for name, values in columns.items()},
+        })
+    elif media_type == ARROW:
+        import pyarrow as pa
+
+        table = pa.table({name: _arrow_array(pa, values) for name, values in columns.items()})
+        table = table.replace_schema_metadata({"meta": json.dumps(meta)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    else:
+        media_type = COLUMNS
+        body = _pack_columns(columns, meta)
+    return media_type, body
+
+
+def _shape(values: np.ndarray) -> dict:
+    return {"shape": list(values.shape)} if values.ndim > 1 else {}
+
+
+def _arrow_array(pa, values: np.ndarray):
+    if values.ndim > 1:
+        return pa.FixedSizeListArray.from_arrays(pa.array(values.reshape(-1)), int(np.prod(values.shape[1:])))
+    return pa.array(values)
+
+
+def _pad(buffer: bytes) -> bytes:
+    return buffer + b"\0" * (-len(buffer) % 8)
+
+
+def _pack_columns(columns: Dict[str, np.ndarray], meta: dict) -> bytes:
+    header = json.dumps({
+        "meta": meta,
+        "columns": [{"name": name, "dtype": values.dtype.str, "length": len(values), **_shape(values)}
+                    for name, values in columns.items()],
+    }).encode("utf-8")
+    # 4 bytes of length prefix + header, padded so the first column starts 8-byte aligned.
+    header = header + b" " * (-(len(header) + 4) % 8)
+    parts = [struct.pack("<I", len(header)), header]
+    parts.extend(_pad(values.tobytes()) for values in columns.values())
+    return b"".join(parts)
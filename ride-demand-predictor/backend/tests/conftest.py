@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The backend modules import each other as top-level packages (core, services, ...).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.geo import latlng_to_uint64  # noqa: E402
+from services.demand_pyramid import DemandPyramid  # noqa: E402
+
+NAIROBI = (-1.2843, 36.8248)
+
+
+@pytest.fixture(scope="session")
+def nairobi_cells():
+    """A few thousand resolution-12 cells spread over central Nairobi."""
+    rng = np.random.default_rng(0)
+    latitudes = NAIROBI[0] - 0.05 + rng.random(3000) * 0.1
+    longitudes = NAIROBI[1] - 0.05 + rng.random(3000) * 0.1
+    return np.unique(latlng_to_uint64(latitudes, longitudes, 12))
+
+
+def synthetic_demand(cells, day_of_week, hour_of_day, business_ratio):
+    """Deterministic demand per (cell, day, hour), so tests can check exact values."""
+    return (np.asarray(cells, dtype=np.uint64) % np.uint64(97)).astype(np.float32) / 10 \
+        + np.asarray(day_of_week, dtype=np.float32) + np.asarray(hour_of_day, dtype=np.float32) / 100
+
+
+@pytest.fixture(scope="session")
+def pyramid(nairobi_cells):
+    return DemandPyramid.build(synthetic_demand, nairobi_cells, (12, 10, 9, 7))
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostRegressor
+
+from services.demand_cube import DemandCube
+from services.model_registry import LinearScaler, ModelArtifacts
+
+CUTS = np.array([0.25, 0.6])
+
+
+def step_model(h3_cells, day_of_week, hour_of_day, business_ratio):
+    """Constant between the cuts, like a tree ensemble."""
+    level = np.searchsorted(CUTS, np.asarray(business_ratio, dtype=np.float64), side="right")
+    return (np.asarray(h3_cells, dtype=np.uint64) % 7 + np.asarray(day_of_week) * 10
+            + np.asarray(hour_of_day) + level * 100).astype(np.float64) * np.ones(len(h3_cells))
+
+
+@pytest.fixture(scope="module")
+def cells(nairobi_cells):
+    return nairobi_cells[:50]
+
+
+def test_lookups_on_model_borders_are_exact(cells):
+    cube = DemandCube.build(step_model, cells, validation_samples=500, ratio_cuts=CUTS)
+    assert cube.error_bound["max_abs_error"] == 0
+    ratios = np.array([0.0, 0.2499999, 0.25, 0.5, np.nextafter(0.6, 0), 0.6, 1.0])
+    picked = np.resize(cells, len(ratios))
+    assert cube.lookup(picked, 3, 8, ratios) == pytest.approx(step_model(picked, 3, 8, ratios))
+    assert cube.stats()["ratio_grid_kind"] == "model_borders"
+
+
+def test_uniform_grid_interpolates_and_reports_its_error(cells):
+    cube = DemandCube.build(step_model, cells, ratio_steps=11, validation_samples=500)
+    assert cube.stats()["ratio_grid_kind"] == "uniform"
+    assert cube.error_bound["max_abs_error"] > 0
+    assert cube.lookup(cells[:1], 0, 0, 0.55)[0] == pytest.approx(step_model(cells[:1], 0, 0, 0.55)[0] + 50)
+
+
+@pytest.mark.parametrize("day, hour", [(7, 0), (-1, 0), (0, 24), (np.array([0, 7]), 3)])
+def test_out_of_range_day_or_hour_is_rejected(cells, day, hour):
+    cube = DemandCube.build(step_model, cells, validation_samples=0, ratio_cuts=CUTS)
+    with pytest.raises(ValueError):
+        cube.lookup(cells[:2], day, hour, 0.5)
+
+
+def test_unknown_cells_are_rejected(cells, nairobi_cells):
+    cube = DemandCube.build(step_model, cells, validation_samples=0, ratio_cuts=CUTS)
+    unknown = np.setdiff1d(nairobi_cells, cells)[:1]
+    with pytest.raises(ValueError):
+        cube.lookup(np.append(cells[:1], unknown), 0, 0, 0.5)
+    with pytest.raises(ValueError):
+        cube.lookup(np.array([np.iinfo(np.uint64).max], dtype=np.uint64), 0, 0, 0.5)
+
+
+def test_arrays_round_trip_keeps_the_cuts(cells):
+    cube = DemandCube.build(step_model, cells, validation_samples=0, ratio_cuts=CUTS)
+    copy = DemandCube.from_arrays(*cube.to_arrays())
+    assert copy.lookup(cells, 1, 2, 0.3) == pytest.approx(cube.lookup(cells, 1, 2, 0.3))
+
+
+def test_business_ratio_cuts_match_a_trained_model(cells):
+    rng = np.random.default_rng(0)
+    rows = 2000
+    data = {"h3_cell": [format(int(cell), "x") for cell in rng.choice(cells, rows)],
+            "day_of_week": rng.integers(0, 7, rows), "hour_of_day": rng.integers(0, 24, rows),
+            "business_ratio": rng.random(rows)}
+    target = data["hour_of_day"] + 40 * np.sin(6 * data["business_ratio"])
+    model = CatBoostRegressor(iterations=30, depth=4, cat_features=["h3_cell"], verbose=False, random_seed=0,
+                              allow_writing_files=False)
+    model.fit(pd.DataFrame(data), target)
+    # A scaler that is not the identity, so cuts must be mapped back through it
+    artifacts = ModelArtifacts("test", model, LinearScaler([0.5], [0.25]), cells, "")
+
+    cuts = artifacts.business_ratio_cuts()
+    assert len(cuts) > 0 and (np.diff(cuts) > 0).all() and ((cuts > 0) & (cuts <= 1)).all()
+    cube = DemandCube.build(artifacts.predict_rows, cells[:10], validation_samples=300, ratio_cuts=cuts)
+    assert cube.error_bound["max_abs_error"] < 1e-4
+    edges = np.concatenate([cuts, np.nextafter(cuts, 0)])
+    picked = np.resize(cells[:10], len(edges))
+    assert cube.lookup(picked, 2, 7, edges) == pytest.approx(artifacts.predict_rows(picked, 2, 7, edges), abs=1e-4)
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import feature_store
+from services.feature_store import COUNT_COLUMNS, KEY_COLUMNS, FeatureStore
+
+
+def write_orders(path, seed, rows=400):
+    rng = np.random.default_rng(seed)
+    hours = rng.integers(1, 13, rows)
+    pd.DataFrame({
+        'Order No': [f"Order_No_{seed}_{i}" for i in range(rows)],
+        'Placement - Weekday (Mo = 1)': rng.integers(1, 8, rows),
+        'Placement - Time': [f"{hour}:{minute:02d}:00 {half}" for hour, minute, half
+                             in zip(hours, rng.integers(0, 60, rows), rng.choice(['AM', 'PM'], rows))],
+        'Pickup Lat': -1.2843 + rng.normal(0, 0.01, rows),
+        'Pickup Long': 36.8248 + rng.normal(0, 0.01, rows),
+        'Personal or Business': rng.choice(['Personal', 'Business'], rows),
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def table(store):
+    return store.load().sort_values(KEY_COLUMNS).reset_index(drop=True)[KEY_COLUMNS + COUNT_COLUMNS]
+
+
+@pytest.fixture
+def orders(tmp_path):
+    return [write_orders(tmp_path / f"orders_{seed}.csv", seed) for seed in (1, 2)]
+
+
+@pytest.fixture
+def expected(tmp_path, orders):
+    store = FeatureStore(str(tmp_path / "clean"))
+    for path in orders:
+        assert store.ingest(path)
+    return table(store)
+
+
+def test_files_are_merged_once(tmp_path, orders, expected):
+    store = FeatureStore(str(tmp_path / "store"))
+    assert store.ingest(orders[0]) and store.ingest(orders[1])
+    assert not store.ingest(orders[0])
+    pd.testing.assert_frame_equal(table(store), expected)
+    assert store.stats() == {'files': 2, 'rides': 800}
+    reopened = FeatureStore(str(tmp_path / "store"))
+    assert not reopened.ingest(orders[1]) and reopened.fingerprint() == store.fingerprint()
+
+
+def test_interrupted_while_moving_partitions_is_finished_on_reopen(tmp_path, orders, expected, monkeypatch):
+    directory = str(tmp_path / "store")
+    FeatureStore(directory).ingest(orders[0])
+    replace = os.replace
+    moves = []
+
+    def crash_after_two_moves(source, target):
+        if source.endswith('.pending') and len(moves) == 2:
+            raise OSError("Interrupted")
+        moves.append(target)
+        replace(source, target)
+
+    monkeypatch.setattr(feature_store.os, "replace", crash_after_two_moves)
+    with pytest.raises(OSError):
+        FeatureStore(directory).ingest(orders[1])
+    monkeypatch.setattr(feature_store.os, "replace", replace)
+
+    retry = FeatureStore(directory)
+    assert not retry.ingest(orders[1])  # Already committed: it is not merged a second time
+    pd.testing.assert_frame_equal(table(retry), expected)
+    assert retry.stats() == {'files': 2, 'rides': 800}
+
+
+def test_interrupted_before_the_manifest_write_is_retried(tmp_path, orders, expected, monkeypatch):
+    directory = str(tmp_path / "store")
+    FeatureStore(directory).ingest(orders[0])
+
+    def crash(self):
+        raise OSError("Interrupted")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(FeatureStore, "_save_manifest", crash)
+        with pytest.raises(OSError):
+            FeatureStore(directory).ingest(orders[1])
+    assert any(name.endswith('.pending') for _, _, names in os.walk(directory) for name in names)
+
+    retry = FeatureStore(directory)
+    assert not any(name.endswith('.pending') for _, _, names in os.walk(directory) for name in names)
+    assert retry.ingest(orders[1])
+    pd.testing.assert_frame_equal(table(retry), expected)
+
+
+def test_orders_already_ingested_are_counted_once(tmp_path, orders, expected):
+    first = pd.read_csv(orders[0])
+    second = pd.read_csv(orders[1])
+    # An export that overlaps both files, with one order repeated.
+    overlap = pd.concat([first.iloc[300:], second.iloc[:50], second.iloc[:1]], ignore_index=True)
+    overlap.to_csv(tmp_path / "overlap.csv", index=False)
+
+    store = FeatureStore(str(tmp_path / "store"))
+    assert store.ingest(orders[0])
+    entry = store.ingest(str(tmp_path / "overlap.csv"))
+    assert entry['rides'] == 50 and entry['duplicate_orders'] == 101
+    reopened = FeatureStore(str(tmp_path / "store"))
+    assert reopened.ingest(orders[1])['duplicate_orders'] == 50
+    pd.testing.assert_frame_equal(table(reopened), expected)
+    assert reopened.stats() == {'files': 3, 'rides': 800}
+
+
+def test_resolution_mismatch_is_refused(tmp_path, orders):
+    FeatureStore(str(tmp_path / "store"), resolution=12).ingest(orders[0])
+    with pytest.raises(ValueError):
+        FeatureStore(str(tmp_path / "store"), resolution=9)
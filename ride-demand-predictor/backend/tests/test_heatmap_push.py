@@ -0,0 +1,214 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from core.geo import uint64_to_cells
+from services import heatmap_push
+from services.demand_pyramid import DemandPyramid
+from services.heatmap_push import HeatmapConnection, HeatmapHub
+
+BOX = (-1.30, 36.80, -1.27, 36.84)
+SHIFTED = (-1.30, 36.82, -1.27, 36.86)
+
+
+class Client:
+    """Applies pushed messages the way the frontend's subscribeHeatmap does."""
+
+    def __init__(self):
+        self.messages = []
+        self.state = {}
+
+    def send(self, message):
+        self.messages.append(message)
+        if message["type"] != "heatmap":
+            return
+        if message["reset"]:
+            self.state.clear()
+        for cell in message["removed"]:
+            del self.state[cell]
+        self.state.update({point["h3_cell"]: point["demand"] for point in message["hotspots"]})
+
+
+def truth(pyramid, box, zoom, day, hour):
+    resolution, candidates = pyramid.viewport_cells(*box, zoom, 5000)
+    cells, demand = pyramid.query(resolution, candidates, day, hour)
+    return dict(zip(uint64_to_cells(cells), demand.tolist()))
+
+
+def assert_close(state, expected, rtol):
+    assert state.keys() == expected.keys()
+    for cell, value in expected.items():
+        assert state[cell] == pytest.approx(value, rel=rtol, abs=1e-3)
+
+
+@pytest.fixture
+def hub(pyramid):
+    return HeatmapHub(lambda: ("v1", pyramid), max_cells=5000, min_change=0.05)
+
+
+def test_first_update_is_a_full_reset(hub, pyramid):
+    client = Client()
+    hub.update(hub.subscribe(client.send), *BOX, 15, day=2, hour=16)
+    assert client.messages[0]["reset"] is True
+    assert client.state == pytest.approx(truth(pyramid, BOX, 15, 2, 16))
+
+
+def test_unchanged_viewport_sends_nothing(hub):
+    client = Client()
+    subscription = hub.subscribe(client.send)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    assert len(client.messages) == 1
+
+
+def test_viewport_shift_sends_new_and_removed_cells_only(hub, pyramid):
+    client = Client()
+    subscription = hub.subscribe(client.send)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    hub.update(subscription, *SHIFTED, 15, day=2, hour=16)
+    delta = client.messages[-1]
+    assert delta["reset"] is False and delta["removed"]
+    assert len(delta["hotspots"]) < len(client.state)
+    assert client.state == pytest.approx(truth(pyramid, SHIFTED, 15, 2, 16))
+
+
+def test_time_change_pushes_only_cells_beyond_the_threshold(hub, pyramid):
+    client = Client()
+    subscription = hub.subscribe(client.send)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    hub.update(subscription, *BOX, 15, day=2, hour=17)
+    delta = client.messages[-1]
+    assert delta["hour"] == 17 and not delta["removed"]
+    assert len(delta["hotspots"]) < len(client.state)
+    assert_close(client.state, truth(pyramid, BOX, 15, 2, 17), rtol=0.05)
+
+
+def test_level_change_resets(hub, pyramid):
+    client = Client()
+    subscription = hub.subscribe(client.send)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    hub.update(subscription, *BOX, 9, day=2, hour=16)
+    assert client.messages[-1]["reset"] is True and client.messages[-1]["removed"] == []
+    assert client.state == pytest.approx(truth(pyramid, BOX, 9, 2, 16))
+
+
+def test_world_viewport_is_cheap_and_resets_to_the_coarsest_level(hub, pyramid):
+    client = Client()
+    subscription = hub.subscribe(client.send)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    hub.update(subscription, -90, -180, 90, 180, 2, day=2, hour=16)
+    message = client.messages[-1]
+    assert message["reset"] is True and message["resolution"] == pyramid.coarsest_level()
+    assert len(client.state) == len(pyramid.levels[pyramid.coarsest_level()][0])
+
+
+def test_invalid_viewport_is_rejected(hub):
+    with pytest.raises(ValueError):
+        hub.update(hub.subscribe(Client().send), -1.2, 36.8, -1.3, 36.9, 15)
+
+
+def test_model_swap_pushes_changed_cells_and_shares_one_query(pyramid):
+    scaled = DemandPyramid({resolution: (cells, values * np.where(np.arange(len(cells)) % 2, 1.0, 1.5)[:, None, None]
+                                         .astype(np.float32))
+                            for resolution, (cells, values) in pyramid.levels.items()}, pyramid.business_ratio)
+    current = ["v1", pyramid]
+    hub = HeatmapHub(lambda: tuple(current), max_cells=5000)
+    first, second = Client(), Client()
+    hub.update(hub.subscribe(first.send), *BOX, 15, day=2, hour=16)
+    hub.update(hub.subscribe(second.send), *SHIFTED, 15, day=2, hour=16)
+    current[:] = ["v2", scaled]
+    queries = hub.stats()["queries"]
+    hub.refresh("model")
+    assert hub.stats()["queries"] == queries + 1  # Overlapping viewports at the same level and hour
+    for client, box in ((first, BOX), (second, SHIFTED)):
+        message = client.messages[-1]
+        assert message["reason"] == "model" and message["model_version"] == "v2"
+        assert 0 < len(message["hotspots"]) < len(client.state)
+        assert client.state == pytest.approx(truth(scaled, box, 15, 2, 16))
+
+
+def test_hour_rollover_only_updates_subscribers_following_the_clock(hub, monkeypatch):
+    clock = [1_700_000_000.0]
+    monkeypatch.setattr(heatmap_push.time, "time", lambda: clock[0])
+    following, fixed = Client(), Client()
+    hub.update(hub.subscribe(following.send), *BOX, 15)
+    hub.update(hub.subscribe(fixed.send), *BOX, 15, day=0, hour=3)
+    clock[0] += 3600
+    hub.refresh("hour", following_clock_only=True)
+    assert following.messages[-1]["reason"] == "hour"
+    assert following.messages[-1]["hour"] == hub.clock_time()[1]
+    assert len(fixed.messages) == 1
+
+
+def test_resync_resends_every_cell(hub, pyramid):
+    client = Client()
+    subscription = hub.subscribe(client.send)
+    hub.update(subscription, *BOX, 15, day=2, hour=16)
+    client.state.clear()
+    hub.resync(subscription)
+    assert client.messages[-1]["reset"] is True
+    assert client.state == pytest.approx(truth(pyramid, BOX, 15, 2, 16))
+
+
+def test_unsubscribe_frees_the_slot(pyramid):
+    hub = HeatmapHub(lambda: ("v1", pyramid), max_cells=5000, max_subscribers=1)
+    subscription = hub.subscribe(Client().send)
+    assert hub.subscribe(Client().send) is None
+    hub.unsubscribe(subscription)
+    assert hub.subscribe(Client().send) is not None
+
+
+def run_connection(hub, scenario, **kwargs):
+    async def main():
+        connection = HeatmapConnection(hub, asyncio.get_running_loop(), **kwargs)
+        task = asyncio.create_task(connection.apply_updates())
+        try:
+            await scenario(connection)
+        finally:
+            task.cancel()
+            hub.unsubscribe(connection.subscription)
+        return connection
+
+    return asyncio.run(main())
+
+
+def drain(connection):
+    messages = []
+    while not connection.outbox.empty():
+        messages.append(connection.outbox.get_nowait())
+    return messages
+
+
+def test_connection_coalesces_bursts_of_viewport_messages(hub):
+    calls = []
+    update = hub.update
+    hub.update = lambda subscription, *viewport: calls.append(viewport) or update(subscription, *viewport)
+
+    async def scenario(connection):
+        for shift in range(20):
+            connection.request(BOX[0], BOX[1] + shift * 0.001, BOX[2], BOX[3] + shift * 0.001, 15, 2, 16)
+        await asyncio.sleep(0.2)
+
+    connection = run_connection(hub, scenario, min_interval=0.5)
+    assert len(calls) == 1 and calls[0][1] == pytest.approx(BOX[1] + 0.019)
+    assert len(drain(connection)) == 1
+
+
+def test_slow_client_gets_one_snapshot_instead_of_a_backlog(hub, pyramid):
+    async def scenario(connection):
+        connection.request(*BOX, 15, 2, 16)
+        await asyncio.sleep(0.1)
+        for hour in range(17, 24):  # Nobody reads the outbox
+            await asyncio.to_thread(hub.update, connection.subscription, *BOX, 15, 2, hour)
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.2)
+
+    connection = run_connection(hub, scenario, max_queued=3, min_interval=0.0)
+    messages = drain(connection)
+    assert connection.dropped > 0 and len(messages) <= 3
+    client = Client()
+    for message in messages:
+        client.send(message)
+    assert any(message["reason"] == "resync" and message["reset"] for message in messages)
+    assert_close(client.state, truth(pyramid, BOX, 15, 2, 23), rtol=0.05)
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from services.demand_pyramid import DemandPyramid
+from services.hotspot_index import HotspotIndex, _top_positions
+
+DOWNTOWN = (-1.30, 36.80, -1.27, 36.84)
+
+
+def brute_force(pyramid, resolution, day, hour, k, bbox=None):
+    """The first k cells of a full stable sort, as the index used to store."""
+    cells, values = pyramid.levels[resolution]
+    positions = np.argsort(-values[:, day, hour], kind="stable")
+    if bbox is not None:
+        index = HotspotIndex.build(pyramid, max_k=1)
+        lats, lons = index.centers[resolution]
+        min_lat, min_lon, max_lat, max_lon = bbox
+        positions = positions[(lats[positions] >= min_lat) & (lats[positions] <= max_lat)
+                              & (lons[positions] >= min_lon) & (lons[positions] <= max_lon)]
+    return cells[positions[:k]]
+
+
+@pytest.fixture
+def tied_pyramid(pyramid):
+    """Demand rounded to whole rides, so many cells tie at the cut."""
+    return DemandPyramid({resolution: (cells, np.round(values / 4).astype(np.float32))
+                          for resolution, (cells, values) in pyramid.levels.items()}, pyramid.business_ratio)
+
+
+@pytest.mark.parametrize("k", [1, 7, 50, 200])
+def test_top_positions_match_a_stable_argsort(k):
+    values = np.random.default_rng(k).integers(0, 5, 100).astype(np.float32)
+    assert _top_positions(values, k).tolist() == np.argsort(-values, kind="stable")[:k].tolist()
+
+
+def test_only_max_k_cells_are_ranked_per_slot(pyramid):
+    index = HotspotIndex.build(pyramid, max_k=20)
+    for resolution, (cells, _) in pyramid.levels.items():
+        assert index.rankings[resolution].shape == (7, 24, min(20, len(cells)))
+    assert index.stats()["max_k"] == 20
+
+
+@pytest.mark.parametrize("day, hour", [(0, 3), (4, 17)])
+def test_top_matches_a_full_sort_with_ties(tied_pyramid, day, hour):
+    index = HotspotIndex.build(tied_pyramid, max_k=30)
+    for resolution in tied_pyramid.levels:
+        for k in (1, 30, 45):  # 45 is past the ranked cells
+            cells, demand = index.top(resolution, day, hour, k)
+            np.testing.assert_array_equal(cells, brute_force(tied_pyramid, resolution, day, hour, k))
+            assert (np.diff(demand) <= 0).all()
+
+
+def test_bbox_past_the_ranked_cells_scans_the_slot(tied_pyramid):
+    index = HotspotIndex.build(tied_pyramid, max_k=10)
+    for resolution in (12, 9):
+        ranked = tied_pyramid.levels[resolution][0][index.rankings[resolution][2, 8]]
+        assert np.isin(ranked, brute_force(tied_pyramid, resolution, 2, 8, 10, DOWNTOWN)).sum() < 10
+        cells, _ = index.top(resolution, 2, 8, 10, DOWNTOWN)
+        np.testing.assert_array_equal(cells, brute_force(tied_pyramid, resolution, 2, 8, 10, DOWNTOWN))
+        assert len(cells) == 10
+
+
+def test_empty_bbox_returns_nothing(pyramid):
+    cells, demand = HotspotIndex.build(pyramid, max_k=10).top(12, 1, 1, 5, (40.0, -75.0, 41.0, -74.0))
+    assert len(cells) == 0 and len(demand) == 0
+
+
+def test_arrays_round_trip(pyramid):
+    index = HotspotIndex.build(pyramid, max_k=15)
+    copy = HotspotIndex.from_arrays(pyramid, *index.to_arrays())
+    np.testing.assert_array_equal(copy.top(10, 5, 20, 15, DOWNTOWN)[0], index.top(10, 5, 20, 15, DOWNTOWN)[0])
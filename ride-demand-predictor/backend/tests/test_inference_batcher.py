@@ -0,0 +1,103 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from services.inference_batcher import InferenceBatcher
+
+
+class Scorer:
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def __call__(self, h3_cells, day_of_week, hour_of_day, business_ratio, *weather):
+        self.calls.append(len(h3_cells))
+        time.sleep(self.delay)
+        return h3_cells.astype(np.float64) + day_of_week * 10 + hour_of_day * 100 + business_ratio
+
+
+def expected(cells, day, hour, ratio):
+    return np.asarray(cells, dtype=np.float64) + day * 10 + hour * 100 + ratio
+
+
+def test_predict_is_scored_inline_before_start_and_after_stop():
+    scorer = Scorer()
+    batcher = InferenceBatcher(scorer, result_timeout=1)
+    np.testing.assert_array_equal(batcher.predict([1, 2], 3, 4, 0.5), expected([1, 2], 3, 4, 0.5))
+    batcher.start()
+    batcher.stop()
+    np.testing.assert_array_equal(batcher.predict([5], 1, 2, 0.0), expected([5], 1, 2, 0.0))
+    assert scorer.calls == [2, 1]
+
+
+def test_start_after_stop_runs_a_new_thread():
+    batcher = InferenceBatcher(Scorer(), result_timeout=1)
+    for _ in range(2):
+        batcher.start()
+        batcher.start()  # Already running: no second thread
+        np.testing.assert_array_equal(batcher.predict([7], 0, 0, 1.0), expected([7], 0, 0, 1.0))
+        batcher.stop()
+    batcher.stop()  # Not running: nothing to do
+
+
+def test_concurrent_requests_share_one_batch():
+    scorer = Scorer()
+    batcher = InferenceBatcher(scorer, window_ms=200, result_timeout=5)
+    batcher.start()
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.predict([i], 1, 1, 0.5)))
+               for i in range(5)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        batcher.stop()
+    assert scorer.calls == [5]
+    for i in range(5):
+        np.testing.assert_array_equal(results[i], expected([i], 1, 1, 0.5))
+
+
+def test_requests_queued_when_stopping_are_still_scored():
+    scorer = Scorer(delay=0.2)
+    batcher = InferenceBatcher(scorer, window_ms=0, result_timeout=5)
+    batcher.start()
+    results = []
+    first = threading.Thread(target=lambda: results.append(batcher.predict([1], 0, 0, 0.0)))
+    first.start()
+    time.sleep(0.05)  # The first batch is being scored
+    second = threading.Thread(target=lambda: results.append(batcher.predict([2], 0, 0, 0.0)))
+    second.start()
+    time.sleep(0.05)
+    batcher.stop()
+    first.join(1)
+    second.join(1)
+    assert sorted(float(result[0]) for result in results) == [1.0, 2.0]
+
+
+def test_a_stuck_batch_times_out():
+    batcher = InferenceBatcher(Scorer(delay=1.0), window_ms=0, result_timeout=0.1)
+    batcher.start()
+    try:
+        with pytest.raises(TimeoutError):
+            batcher.predict([1], 0, 0, 0.0)
+    finally:
+        batcher.stop()
+
+
+def test_scoring_errors_reach_the_caller():
+    def broken(*features):
+        raise RuntimeError("model failed")
+
+    batcher = InferenceBatcher(broken, result_timeout=1)
+    with pytest.raises(RuntimeError):
+        batcher.predict([1], 0, 0, 0.0)
+    batcher.start()
+    try:
+        with pytest.raises(RuntimeError):
+            batcher.predict([1], 0, 0, 0.0)
+    finally:
+        batcher.stop()
@@ -0,0 +1,107 @@
+import json
+
+import h3.api.numpy_int as h3_int
+import numpy as np
+import pytest
+
+from services import live_aggregates
+from services.live_aggregates import HOUR_SECONDS, CellRing, EventFileTailer, LiveAggregates
+
+# 2026-10-19 00:00 Nairobi time (UTC+3), a Monday
+MONDAY = 1792357200.0
+CITY = (-1.2843, 36.8248)
+SUBURB = (-1.2210, 36.8900)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [MONDAY + 30 * 60]
+    monkeypatch.setattr(live_aggregates.time, "time", lambda: now[0])
+    return now
+
+
+def test_cell_ring_recycles_slots_once_their_rides_leave_the_ring():
+    ring = CellRing(9, buckets=3, max_cells=2)
+    ring.add(11, row=0, is_business=True)
+    ring.add(22, row=1, is_business=False)
+    ring.add(33, row=1, is_business=False)  # Every slot is taken
+    assert ring.dropped == 1 and set(ring.slots) == {11, 22}
+
+    ring.add(11, row=1, is_business=False)
+    ring.clear(0)
+    assert set(ring.slots) == {11, 22}  # Cell 11 still has a ride in row 1
+    ring.clear(1)
+    assert ring.slots == {} and len(ring.free) == 2 and not ring.cells.any()
+
+    ring.add(33, row=2, is_business=True)
+    cells, rides, business = ring.window(np.arange(3))
+    assert cells.tolist() == [33] and rides.tolist() == [1] and business.tolist() == [1]
+
+
+def test_cell_ring_window_sums_only_the_requested_rows():
+    ring = CellRing(9, buckets=4, max_cells=8)
+    for row, cell, is_business in [(0, 5, True), (1, 5, False), (1, 6, True), (3, 6, False)]:
+        ring.add(cell, row, is_business)
+    cells, rides, business = ring.window(np.array([1, 3]))
+    assert dict(zip(cells.tolist(), rides.tolist())) == {5: 1, 6: 2}
+    assert dict(zip(cells.tolist(), business.tolist())) == {5: 0, 6: 1}
+
+
+def test_rides_expire_as_the_window_slides(clock):
+    aggregates = LiveAggregates(resolutions=(9,), window_hours=3, max_cells=4)
+    assert aggregates.add(*CITY, is_business=True)
+    clock[0] += HOUR_SECONDS
+    assert aggregates.add(*SUBURB)
+    assert [(entry['hour'], entry['demand_count']) for entry in aggregates.hourly_demand()] == [(0, 1), (1, 1)]
+
+    clock[0] += 2 * HOUR_SECONDS  # Hour 0 leaves the three-hour window
+    assert [entry['hour'] for entry in aggregates.hourly_demand()] == [1]
+    zones = aggregates.top_zones(9, k=5)
+    assert [zone['h3_cell'] for zone in zones] == [format(h3_int.latlng_to_cell(*SUBURB, 9), 'x')]
+    assert aggregates.stats()['tracked_cells'] == {'9': 1}
+
+    clock[0] += 10 * HOUR_SECONDS  # A long gap clears the whole ring
+    assert aggregates.hourly_demand() == [] and aggregates.stats()['tracked_cells'] == {'9': 0}
+
+
+def test_window_hours_narrows_the_window(clock):
+    aggregates = LiveAggregates(resolutions=(9, 7), window_hours=24)
+    aggregates.add(*CITY)
+    clock[0] += 2 * HOUR_SECONDS
+    aggregates.add(*CITY)
+    aggregates.add(*SUBURB, is_business=True)
+    assert sum(entry['demand_count'] for entry in aggregates.hourly_demand(window_hours=1)) == 2
+    assert aggregates.daily_demand()[0]['day_name'] == 'Monday'
+    assert aggregates.top_zones(7, k=1)[0]['ride_count'] == 2
+    assert sum(zone['ride_count'] for zone in aggregates.top_zones(7, k=5)) == 3
+
+
+def test_late_and_future_rides_are_not_counted(clock):
+    aggregates = LiveAggregates(resolutions=(9,), window_hours=3)
+    assert not aggregates.add(*CITY, placed_at=clock[0] - 5 * HOUR_SECONDS)
+    assert not aggregates.add(*CITY, placed_at=clock[0] + 2 * HOUR_SECONDS)
+    assert aggregates.add(*CITY, placed_at=clock[0] - HOUR_SECONDS)
+    assert {key: aggregates.stats()[key] for key in ('accepted', 'late', 'future')} == \
+        {'accepted': 1, 'late': 1, 'future': 1}
+
+
+@pytest.mark.parametrize("latitude, longitude", [(95.0, 36.8), (-1.28, 400.0), (float('nan'), 36.8)])
+def test_out_of_range_coordinates_are_rejected(clock, latitude, longitude):
+    aggregates = LiveAggregates(resolutions=(9,), window_hours=3)
+    with pytest.raises(ValueError):
+        aggregates.add(latitude, longitude)
+    assert aggregates.stats()['accepted'] == 0
+
+
+def test_tailer_counts_valid_lines_and_skips_bad_ones(clock, tmp_path):
+    path = tmp_path / "events.jsonl"
+    aggregates = LiveAggregates(resolutions=(9,), window_hours=3)
+    tailer = EventFileTailer(str(path), aggregates, from_start=True)
+    lines = [{"latitude": CITY[0], "longitude": CITY[1], "is_business": True},
+             {"latitude": 95, "longitude": 36.8}, {"longitude": 36.8}]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines) + "not json\n" + '{"latitude": -1.3')
+    assert tailer.poll() == 4
+    assert tailer.invalid == 3 and aggregates.stats()['accepted'] == 1
+    with open(path, "a") as f:
+        f.write(', "longitude": 36.8}\n')  # The rest of the partial line
+    assert tailer.poll() == 1 and aggregates.stats()['accepted'] == 2
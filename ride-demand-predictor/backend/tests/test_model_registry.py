@@ -0,0 +1,89 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostRegressor
+from sklearn.preprocessing import MinMaxScaler
+
+from core.geo import cells_to_uint64, uint64_to_cells
+from services.model_registry import (CATEGORIES_FILE, FAST_STAMP_FILE, KNOWN_CELLS_FILE, MODEL_FILE, SCALER_FILE,
+                                     SCALER_PARAMS_FILE, VERSION_FILE, ModelArtifacts, ModelRegistry,
+                                     use_fast_artifacts)
+from train import save_artifacts
+
+
+def train_set(model_dir, cells, version):
+    rng = np.random.default_rng(0)
+    rows = 300
+    frame = pd.DataFrame({"h3_cell": rng.choice(uint64_to_cells(cells), rows),
+                          "day_of_week": rng.integers(0, 7, rows), "hour_of_day": rng.integers(0, 24, rows),
+                          "business_ratio": rng.random(rows)})
+    scaler = MinMaxScaler().fit(frame[["business_ratio"]])
+    model = CatBoostRegressor(iterations=5, depth=2, cat_features=["h3_cell"], verbose=False,
+                              allow_writing_files=False)
+    model.fit(frame, rng.random(rows))
+    save_artifacts(str(model_dir), model, scaler, uint64_to_cells(cells), {"version": version})
+
+
+@pytest.fixture
+def model_dir(tmp_path, nairobi_cells):
+    train_set(tmp_path, nairobi_cells[:40], "v1")
+    return tmp_path
+
+
+def test_a_trained_set_loads_from_the_fast_files(model_dir, nairobi_cells):
+    assert use_fast_artifacts(str(model_dir))
+    artifacts = ModelArtifacts.load(str(model_dir))
+    assert artifacts.version == "v1"
+    np.testing.assert_array_equal(artifacts.known_cells, np.sort(nairobi_cells[:40]))
+
+
+def test_replaced_originals_load_the_whole_set_from_them(model_dir, nairobi_cells):
+    # A new model written without fast copies, e.g. by an older train.py
+    cells = nairobi_cells[40:60]
+    with open(model_dir / CATEGORIES_FILE, "w") as f:
+        json.dump({cell: code for code, cell in enumerate(uint64_to_cells(cells))}, f)
+    with open(model_dir / VERSION_FILE, "w") as f:
+        json.dump({"version": "v2"}, f)
+    os.utime(model_dir / KNOWN_CELLS_FILE)  # Newer than the originals: mtimes must not matter
+
+    assert not use_fast_artifacts(str(model_dir))
+    artifacts = ModelArtifacts.load(str(model_dir))
+    assert artifacts.version == "v2"
+    np.testing.assert_array_equal(artifacts.known_cells, np.sort(cells))
+
+
+@pytest.mark.parametrize("removed", [FAST_STAMP_FILE, VERSION_FILE, SCALER_PARAMS_FILE])
+def test_an_unstamped_or_incomplete_fast_set_is_not_used(model_dir, removed):
+    os.remove(model_dir / removed)
+    assert not use_fast_artifacts(str(model_dir))
+    ModelArtifacts.load(str(model_dir))
+
+
+def test_fast_files_alone_are_used(model_dir, nairobi_cells):
+    for name in (MODEL_FILE, SCALER_FILE, CATEGORIES_FILE, FAST_STAMP_FILE):
+        os.remove(model_dir / name)
+    assert use_fast_artifacts(str(model_dir))
+    np.testing.assert_array_equal(ModelArtifacts.load(str(model_dir)).known_cells,
+                                  np.sort(cells_to_uint64(uint64_to_cells(nairobi_cells[:40]))))
+
+
+def test_reload_validates_before_preparing_and_swapping(model_dir, nairobi_cells):
+    prepared = []
+
+    def prepare(artifacts):
+        assert artifacts.warmup_ms is not None  # Already validated
+        prepared.append(artifacts.version)
+
+    registry = ModelRegistry(str(model_dir), 12, prepare=prepare)
+    registry.reload()
+    assert prepared == ["v1"] and registry.current.version == "v1"
+
+    train_set(model_dir, nairobi_cells[:40], "v2")
+    wrong_resolution = ModelRegistry(str(model_dir), 9, prepare=prepare)
+    with pytest.raises(ValueError):
+        wrong_resolution.reload()
+    assert prepared == ["v1"]  # Invalid artifacts are never prepared
+    assert wrong_resolution.current is None and wrong_resolution.failures == 1
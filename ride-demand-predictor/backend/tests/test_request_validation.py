@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+BATCH = {"latitudes": [-1.2843, -1.3178], "longitudes": [36.8248, 36.8304], "day_of_week": [2, 2],
+         "hour_of_day": [16, 16], "business_ratio": [0.95, 0.7]}
+
+
+@pytest.fixture(scope="module")
+def client():
+    # No lifespan: requests are rejected before any model is needed.
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("field, value, bad_index", [
+    ("latitudes", [-1.2843, 90.5], 1),
+    ("latitudes", [-91.0, -1.3178], 0),
+    ("longitudes", [36.8248, 180.5], 1),
+    ("longitudes", [-181.0, 36.8304], 0),
+])
+def test_batch_rejects_out_of_range_coordinates(client, field, value, bad_index):
+    response = client.post("/predict/batch", json={**BATCH, field: value})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", field, bad_index]
+
+
+@pytest.mark.parametrize("params, field, bad_index", [
+    ({"lat": [-1.2843, 95.0], "lon": [36.8248, 36.8304]}, "lat", 1),
+    ({"lat": [-90.5], "lon": [36.8248]}, "lat", 0),
+    ({"lat": [-1.2843, -1.3178], "lon": [181.0, 36.8304]}, "lon", 0),
+    ({"lat": [-1.2843], "lon": [-180.5]}, "lon", 0),
+])
+def test_profile_rejects_out_of_range_coordinates(client, params, field, bad_index):
+    response = client.get("/profile", params=params)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", field, bad_index]
+
+
+def test_profile_accepts_coordinates_in_range(client):
+    # The bounds are inclusive. Past validation, the answer depends on whether a model is loaded.
+    response = client.get("/profile", params={"lat": [-90.0, 90.0], "lon": [-180.0, 180.0]})
+    assert response.status_code != 422
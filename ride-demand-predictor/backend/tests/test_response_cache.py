@@ -0,0 +1,63 @@
+import threading
+import time
+
+from services.response_cache import ResponseCache
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("key", compute)))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["value"] * 3
+    assert len(calls) == 1
+
+
+def test_invalidate_during_a_slow_compute_starts_a_fresh_one():
+    cache = ResponseCache()
+    started, release = threading.Event(), threading.Event()
+
+    def stale_compute():
+        started.set()
+        release.wait(5)
+        return "old model"
+
+    stale_results = []
+    leader = threading.Thread(target=lambda: stale_results.append(cache.get_or_compute("key", stale_compute)))
+    leader.start()
+    assert started.wait(5)
+
+    cache.invalidate()
+    # Not coalesced onto the computation that began before the invalidation.
+    assert cache.get_or_compute("key", lambda: "new model") == "new model"
+
+    release.set()
+    leader.join(5)
+    assert stale_results == ["old model"]
+    # The stale result is not stored over the fresh one.
+    assert cache.get_or_compute("key", lambda: "recomputed") == "new model"
+    assert cache.stats()["coalesced"] == 0
+
+
+def test_invalidate_drops_entries():
+    cache = ResponseCache()
+    assert cache.get_or_compute("key", lambda: 1) == 1
+    cache.invalidate()
+    assert cache.get_or_compute("key", lambda: 2) == 2
+    assert cache.get_or_compute_many(["key", "other"], lambda keys: [3] * len(keys)) == [2, 3]
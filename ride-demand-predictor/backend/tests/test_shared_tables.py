@@ -0,0 +1,61 @@
+import json
+import os
+
+import numpy as np
+
+from services import shared_tables
+from services.demand_pyramid import DemandPyramid
+
+
+class Builds:
+    def __init__(self, pyramid):
+        self.pyramid = pyramid
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self.pyramid
+
+
+def load(directory, build, params, version="v1"):
+    return shared_tables.load_or_build(str(directory), version, "demand_pyramid", build,
+                                       DemandPyramid.from_arrays, params)
+
+
+def test_same_params_map_the_written_table(tmp_path, pyramid):
+    build = Builds(pyramid)
+    params = {"resolutions": [12, 10, 9, 7], "business_ratio": 0.7}
+    first = load(tmp_path, build, params)
+    second = load(tmp_path, build, dict(reversed(params.items())))
+    assert build.count == 1
+    assert isinstance(second.levels[12][1], np.memmap)
+    np.testing.assert_array_equal(second.levels[9][1], first.levels[9][1])
+
+
+def test_changed_params_rebuild_and_replace_the_old_copy(tmp_path, pyramid):
+    build = Builds(pyramid)
+    load(tmp_path, build, {"resolutions": [12, 10, 9, 7], "dtype": "float32"})
+    load(tmp_path, build, {"resolutions": [12, 10, 9, 7], "dtype": "float16"})
+    assert build.count == 2
+    tables = os.listdir(tmp_path / "v1")
+    assert len(tables) == 1 and tables[0].startswith("demand_pyramid-")
+    with open(tmp_path / "v1" / tables[0] / "meta.json") as f:
+        assert json.load(f)["params"] == {"resolutions": [12, 10, 9, 7], "dtype": "float16"}
+
+
+def test_nested_params_are_part_of_the_key(tmp_path, pyramid):
+    build = Builds(pyramid)
+    load(tmp_path, build, {"demand_cube": None})
+    load(tmp_path, build, {"demand_cube": {"ratio_steps": 11}})
+    load(tmp_path, build, {"demand_cube": {"ratio_steps": 21}})
+    assert build.count == 3
+
+
+def test_other_tables_and_versions_are_kept(tmp_path, pyramid):
+    build = Builds(pyramid)
+    load(tmp_path, build, {"a": 1})
+    shared_tables.load_or_build(str(tmp_path), "v1", "demand_pyramid_copy", build,
+                                DemandPyramid.from_arrays, {"a": 2})
+    load(tmp_path, build, {"a": 1}, version="v2")
+    assert build.count == 3
+    assert len(os.listdir(tmp_path / "v1")) == 2 and len(os.listdir(tmp_path / "v2")) == 1
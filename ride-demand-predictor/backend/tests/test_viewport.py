@@ -0,0 +1,88 @@
+import time
+
+import numpy as np
+import pytest
+
+from core.geo import bbox_to_cells, cells_to_parents, centers_in_bbox, tile_to_bbox
+from services.demand_pyramid import DemandPyramid
+
+from conftest import NAIROBI, synthetic_demand
+
+MAX_CELLS = 5000
+CITY_BOX = (-1.32, 36.78, -1.26, 36.86)
+
+
+def tile_containing(lat, lon, z):
+    n = 2 ** z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n)
+    return x, y
+
+
+def test_zoomed_in_viewport_uses_the_finest_level(pyramid):
+    box = (-1.285, 36.82, -1.28, 36.83)
+    resolution, cells = pyramid.viewport_cells(*box, 17, MAX_CELLS)
+    assert resolution == 12
+    assert len(cells) and len(cells) <= MAX_CELLS
+
+
+def test_large_viewport_falls_back_to_a_coarser_level(pyramid):
+    resolution, cells = pyramid.viewport_cells(*CITY_BOX, 16, MAX_CELLS)
+    assert resolution < 12
+    assert len(cells) <= MAX_CELLS
+
+
+def test_filtered_and_filled_candidates_agree(pyramid):
+    resolution = 9
+    filled = pyramid.query(resolution, bbox_to_cells(*CITY_BOX, resolution), 2, 16)[0]
+    level_cells = pyramid.levels[resolution][0]
+    latitudes, longitudes = pyramid.level_centers(resolution)
+    filtered = level_cells[centers_in_bbox(latitudes, longitudes, *CITY_BOX, resolution)]
+    assert set(filled.tolist()) <= set(filtered.tolist())
+
+
+@pytest.mark.parametrize("z", [0, 1, 2, 3])
+def test_low_zoom_tiles_contain_the_city_and_stay_fast(pyramid, z):
+    x, y = tile_containing(*NAIROBI, z)
+    started = time.perf_counter()
+    resolution, candidates = pyramid.viewport_cells(*tile_to_bbox(z, x, y), z, MAX_CELLS)
+    cells, demand = pyramid.query(resolution, candidates, 2, 16)
+    assert time.perf_counter() - started < 1.0
+    assert resolution == pyramid.coarsest_level()
+    assert set(cells.tolist()) == set(pyramid.levels[resolution][0].tolist())
+    assert len(demand) == len(cells)
+
+
+def test_low_zoom_tile_without_the_city_is_empty(pyramid):
+    x, y = tile_containing(40.0, -100.0, 2)
+    resolution, candidates = pyramid.viewport_cells(*tile_to_bbox(2, x, y), 2, MAX_CELLS)
+    assert len(pyramid.query(resolution, candidates, 0, 0)[0]) == 0
+
+
+def test_world_viewport_returns_every_coarse_cell(pyramid):
+    started = time.perf_counter()
+    resolution, candidates = pyramid.viewport_cells(-90, -180, 90, 180, 2, MAX_CELLS)
+    assert time.perf_counter() - started < 1.0
+    assert resolution == pyramid.coarsest_level()
+    np.testing.assert_array_equal(candidates, pyramid.levels[resolution][0])
+
+
+def test_half_globe_boxes_are_never_filled():
+    with pytest.raises(ValueError):
+        bbox_to_cells(-10, -90, 10, 90, 7)
+
+
+def test_coarse_levels_sum_their_children(pyramid, nairobi_cells):
+    cells, demand = pyramid.query(7, pyramid.levels[7][0], 3, 8)
+    expected = synthetic_demand(nairobi_cells, 3, 8, 0.7)
+    parents = cells_to_parents(nairobi_cells, 7)
+    for cell, value in zip(cells.tolist(), demand.tolist()):
+        assert value == pytest.approx(expected[parents == cell].sum(), rel=1e-4)
+
+
+def test_pyramid_round_trips_through_arrays(pyramid):
+    restored = DemandPyramid.from_arrays(*pyramid.to_arrays())
+    restored_level, restored_cells = restored.viewport_cells(*CITY_BOX, 13, MAX_CELLS)
+    level, cells = pyramid.viewport_cells(*CITY_BOX, 13, MAX_CELLS)
+    assert restored_level == level
+    np.testing.assert_array_equal(np.sort(restored_cells), np.sort(cells))
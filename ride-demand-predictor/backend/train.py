@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import MinMaxScaler
+
+from core.config import H3_RESOLUTION, MODEL_DIR, WEATHER_FILE, WEATHER_RESOLUTION
+from core.geo import cells_to_uint64
+from services.feature_store import FeatureStore
+from services.model_registry import (ARTIFACT_FILES, CATEGORIES_FILE, MODEL_FILE, SCALER_FILE, VERSION_FILE,
+                                     save_fast_artifacts)
+from services.weather_service import WEATHER_FEATURES, FileWeatherProvider, weather_frame
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/backend/`; the data lives in the project's `data/` folder.
+TRAIN_DATA_PATH = '../../data/Train.csv'
+FEATURE_STORE_DIR = './feature_store'
+CHUNK_SIZE = 100_000
+
+# Same model as the training notebook.
+ITERATIONS = 500
+RANDOM_STATE = 42
+HOLDOUT_FRACTION = 0.2
+
+
+def build_training_frame(aggregates):
+    """One row per (cell, day, hour) with rides, as in the notebook's groupby."""
+    data = aggregates[aggregates['ride_count'] > 0]
+    return pd.DataFrame({
+        'h3_cell': data['h3_cell'].astype(str).to_numpy(),
+        'day_of_week': data['day_of_week'].to_numpy().astype(np.int64),
+        'hour_of_day': data['hour_of_day'].to_numpy().astype(np.int64),
+        'business_ratio': (data['business_count'] / data['ride_count']).to_numpy(),
+        'demand_count': data['ride_count'].to_numpy().astype(np.int64),
+    })
+
+
+def add_weather(frame, weather_file, resolution=WEATHER_RESOLUTION):
+    """
+    Adds the weather features each row would be served with: the conditions of its
+    region and hour in the weather file (NaN where the file has none).
+    """
+    weather = weather_frame(cells_to_uint64(frame['h3_cell'].tolist()), frame['day_of_week'].to_numpy(),
+                            frame['hour_of_day'].to_numpy(), FileWeatherProvider(weather_file), resolution)
+    frame = frame.copy()
+    for name in WEATHER_FEATURES:
+        frame[name] = weather[name].to_numpy()
+    return frame
+
+
+def fit_model(features, target, iterations):
+    model = CatBoostRegressor(iterations=iterations, cat_features=['h3_cell'], random_state=RANDOM_STATE,
+                              verbose=0, allow_writing_files=False)
+    model.fit(features, target)
+    return model
+
+
+def train(frame, iterations=ITERATIONS, holdout=HOLDOUT_FRACTION):
+    """
+    Fits the scaler and model the API expects: business_ratio is scaled before it
+    reaches the model. A holdout split is scored first, then the shipped model is
+    refit on every row. Weather columns (see add_weather) are used when the frame has them.
+    """
+    scaler = MinMaxScaler()
+    columns = ['h3_cell', 'day_of_week', 'hour_of_day', 'business_ratio']
+    columns += [name for name in WEATHER_FEATURES if name in frame.columns]
+    features = frame[columns].copy()
+    features['business_ratio'] = scaler.fit_transform(features[['business_ratio']])[:, 0]
+    target = frame['demand_count']
+
+    metrics = {}
+    if holdout > 0:
+        X_train, X_test, y_train, y_test = train_test_split(features, target, test_size=holdout,
+                                                            random_state=RANDOM_STATE)
+        predictions = fit_model(X_train, y_train, iterations).predict(X_test)
+        metrics = {
+            'holdout_mae': round(float(mean_absolute_error(y_test, predictions)), 4),
+            'holdout_r2': round(float(r2_score(y_test, predictions)), 4),
+        }
+        print(f"Holdout MAE: {metrics['holdout_mae']:.4f}, R²: {metrics['holdout_r2']:.4f}")
+
+    return fit_model(features, target, iterations), scaler, metrics
+
+
+def save_artifacts(output_dir, model, scaler, h3_cells, version_info):
+    """
+    Writes the model, scaler, categories (plus their fast-loading copies) and version
+    stamp as one set: everything is written to a staging folder first and moved into
+    place with the version file last.
+    """
+    staging_dir = os.path.join(output_dir, f".staging-{version_info['version']}")
+    os.makedirs(staging_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(staging_dir, MODEL_FILE))
+    joblib.dump(scaler, os.path.join(staging_dir, SCALER_FILE))
+    categories = {cell: code for code, cell in enumerate(sorted(h3_cells))}
+    with open(os.path.join(staging_dir, CATEGORIES_FILE), 'w') as f:
+        json.dump(categories, f, indent=4)
+    save_fast_artifacts(staging_dir, model, scaler, categories, version_info['version'])
+    with open(os.path.join(staging_dir, VERSION_FILE), 'w') as f:
+        json.dump(version_info, f, indent=2)
+
+    for name in ARTIFACT_FILES:  # The version file goes last
+        os.replace(os.path.join(staging_dir, name), os.path.join(output_dir, name))
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    print(f"Saved model version {version_info['version']} to {output_dir}")
+
+
+def run(inputs, store_dir=FEATURE_STORE_DIR, output_dir=MODEL_DIR, chunksize=CHUNK_SIZE,
+        iterations=ITERATIONS, holdout=HOLDOUT_FRACTION, skip_training=False, weather_file=None):
+    store = FeatureStore(store_dir, H3_RESOLUTION)
+    for path in inputs:
+        if not os.path.exists(path):
+            print(f"Error: Cannot find order data at '{path}'.")
+            return
+        started = time.perf_counter()
+        entry = store.ingest(path, chunksize)
+        if entry is None:
+            print(f"Skipped '{path}': already in the feature store.")
+            continue
+        print(f"Ingested '{path}' in {time.perf_counter() - started:.2f}s.")
+        if entry['duplicate_orders']:
+            print(f"Warning: Skipped {entry['duplicate_orders']} orders in '{path}' that were already in the "
+                  f"feature store or repeated in the file.")
+
+    stats = store.stats()
+    print(f"Feature store: {stats['files']} files, {stats['rides']} rides.")
+    if skip_training:
+        return
+    if stats['rides'] == 0:
+        print("Error: The feature store is empty; ingest some orders first.")
+        return
+
+    frame = build_training_frame(store.load())
+    if weather_file:
+        if not os.path.exists(weather_file):
+            print(f"Error: Cannot find the weather file at '{weather_file}' (see build_weather_file.py).")
+            return
+        frame = add_weather(frame, weather_file)
+        print(f"Weather features from '{weather_file}' ({frame['temperature'].notna().mean():.0%} of rows "
+              f"with a temperature).")
+    print(f"Training on {len(frame)} (cell, day, hour) rows...")
+    started = time.perf_counter()
+    model, scaler, metrics = train(frame, iterations, holdout)
+    trained_at = datetime.now(timezone.utc)
+    version_info = {
+        'version': f"{trained_at.strftime('%Y%m%d%H%M%S')}-{store.fingerprint()}",
+        'trained_at': trained_at.isoformat(timespec='seconds'),
+        'h3_resolution': H3_RESOLUTION,
+        'training_rows': len(frame),
+        'rides': stats['rides'],
+        'source_files': sorted(entry['path'] for entry in store.manifest['files'].values()),
+        'iterations': iterations,
+        'features': list(model.feature_names_),
+        'weather': {'file': weather_file, 'resolution': WEATHER_RESOLUTION} if weather_file else None,
+        'metrics': metrics,
+        'training_seconds': round(time.perf_counter() - started, 2),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    save_artifacts(output_dir, model, scaler, frame['h3_cell'].unique(), version_info)
+    print("\n✅ Training complete!")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Merge new orders into the feature store and retrain the demand model from it.")
+    parser.add_argument('inputs', nargs='*', default=[TRAIN_DATA_PATH],
+                        help="Order CSVs to ingest (same columns as Train.csv). Files already "
+                             "in the feature store are skipped.")
+    parser.add_argument('--store', default=FEATURE_STORE_DIR, help="Feature store folder.")
+    parser.add_argument('--output', default=MODEL_DIR, help="Where to write the model artifacts.")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Rows read per chunk.")
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help="CatBoost iterations.")
+    parser.add_argument('--holdout', type=float, default=HOLDOUT_FRACTION,
+                        help="Fraction of rows scored before the final fit (0 to skip).")
+    parser.add_argument('--weather', nargs='?', const=WEATHER_FILE, metavar='FILE',
+                        help="Train a weather-aware model, with features from this weather file "
+                             f"(default: {WEATHER_FILE}).")
+    parser.add_argument('--ingest-only', action='store_true', help="Update the feature store without training.")
+    args = parser.parse_args(argv)
+    run(args.inputs, args.store, args.output, args.chunksize, args.iterations, args.holdout,
+        skip_training=args.ingest_only, weather_file=args.weather)
+
+
+if __name__ == '__main__':
+    main()
@@ -75,4 +75,52 @@ export const getHeatmapData = async (params) => {
     // Return empty array on error so the app doesn't crash
     return [];
   }
-};
\ No newline at end of file
+};
+
+// Weekly demand (7 days x 24 hours) for one or more locations: [{ latitude, longitude }, ...]
+export const getDemandProfiles = async (locations, businessRatio = 0.7) => {
+  try {
+    const params = new URLSearchParams({ business_ratio: businessRatio });
+    locations.forEach(({ latitude, longitude }) => {
+      params.append('lat', latitude);
+      params.append('lon', longitude);
+    });
+    const response = await apiService.get('/profile', { params });
+    return response.data.profiles;
+  } catch (error) {
+    console.error("Error fetching demand profiles:", error);
+    throw error.response?.data?.detail || "An unknown error occurred.";
+  }
+};
+
+// Pushed viewport heatmaps. `viewport` is { min_lat, min_lon, max_lat, max_lon, zoom } plus
+// { day, hour } (or neither, to follow the current hour). `onUpdate` gets the full list of
+// hotspots after every update; the server only sends the cells that changed.
+export const subscribeHeatmap = (viewport, onUpdate) => {
+  const socket = new WebSocket(`${API_URL.replace(/^http/, 'ws')}/heatmap/subscribe`);
+  const demandByCell = new Map();
+  let current = viewport;
+
+  socket.onopen = () => socket.send(JSON.stringify(current));
+  socket.onmessage = (event) => {
+    const message = JSON.parse(event.data);
+    if (message.type === 'error') {
+      console.error("Heatmap subscription error:", message.detail);
+      return;
+    }
+    if (message.reset) demandByCell.clear();
+    message.removed.forEach((cell) => demandByCell.delete(cell));
+    message.hotspots.forEach(({ h3_cell, demand }) => demandByCell.set(h3_cell, demand));
+    onUpdate(Array.from(demandByCell, ([h3_cell, demand]) => ({ h3_cell, demand })), message);
+  };
+  socket.onerror = (error) => console.error("Heatmap subscription error:", error);
+
+  return {
+    // Call when the map moves or the time changes.
+    update: (newViewport) => {
+      current = newViewport;
+      if (socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(current));
+    },
+    close: () => socket.close(),
+  };
+};
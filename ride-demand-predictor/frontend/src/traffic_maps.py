@@ -1,25 +1,115 @@
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+
 import folium
 from folium.plugins import HeatMap
+import h3
+import h3.api.numpy_int as h3_int
 import numpy as np
 import pandas as pd
 from branca.element import Template, MacroElement
 
+# The H3 helpers are shared with the API, in the backend package.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+
+from core.geo import latlng_to_uint64  # noqa: E402
+
+# --- CONFIGURATION ---
+# Run from `ride-demand-predictor/frontend/src/`; the data lives in the project's `data/` folder.
+TRAIN_DATA_PATH = '../../../data/Train.csv'
+OUTPUT_FILE = 'traffic_map.html'
+CHUNK_SIZE = 100_000
+NAIROBI_CENTER = [-1.286389, 36.817223]
+DEFAULT_ZOOM = 11
+# Heat points are spread over this many pixels, so cells much smaller than that only add points.
+HEAT_RADIUS = 15
+# Smallest on-screen cell edge, in pixels, when picking the H3 resolution for a zoom.
+MIN_CELL_PIXELS = 4
+
+POINT_COLUMNS = {'Pickup Lat': 'float64', 'Pickup Long': 'float64'}
+
+
+def resolution_for_zoom(zoom, latitude=NAIROBI_CENTER[0]):
+    """
+    The finest H3 resolution whose cells are still at least MIN_CELL_PIXELS wide at a zoom
+    level: finer cells would only add points that the heat layer blurs together.
+    """
+    meters_per_pixel = 156543.03 * math.cos(math.radians(latitude)) / 2 ** zoom
+    for resolution in range(15, -1, -1):
+        if h3.average_hexagon_edge_length(resolution, 'm') >= MIN_CELL_PIXELS * meters_per_pixel:
+            return resolution
+    return 0
+
+
+def count_rides_per_cell(path, resolution, chunksize=CHUNK_SIZE):
+    """
+    Streams the pickup coordinates of an order CSV into ride counts per H3 cell.
+    Returns (uint64 cells, rides), sorted by cell. Memory depends on the number of cells.
+    """
+    partial_cells, partial_counts = [], []
+    for chunk in pd.read_csv(path, usecols=list(POINT_COLUMNS), dtype=POINT_COLUMNS, chunksize=chunksize):
+        chunk = chunk.dropna()
+        cells, counts = np.unique(latlng_to_uint64(chunk['Pickup Lat'], chunk['Pickup Long'], resolution),
+                                  return_counts=True)
+        partial_cells.append(cells)
+        partial_counts.append(counts)
+    if not partial_cells:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    cells, inverse = np.unique(np.concatenate(partial_cells), return_inverse=True)
+    rides = np.bincount(inverse.ravel(), weights=np.concatenate(partial_counts), minlength=len(cells))
+    return cells, rides.astype(np.int64)
+
 
-def generate_traffic_data(num_points=150):
-    np.random.seed(42)
+def cell_centroids(cells):
+    """Hex ids and centroid coordinates (rounded to 6 decimals, ~0.1 m) of uint64 cells."""
+    centers = np.array([h3_int.cell_to_latlng(cell) for cell in cells.tolist()]).reshape(-1, 2)
+    return pd.DataFrame({
+        'h3_cell': [format(cell, 'x') for cell in cells.tolist()],
+        'lat': centers[:, 0].round(6),
+        'lon': centers[:, 1].round(6),
+    })
 
-    lat = np.random.uniform(-1.45, -1.15, num_points)
-    lon = np.random.uniform(36.65, 37.00, num_points)
-    weight = np.random.randint(1, 10, num_points)
-    return pd.DataFrame({'lat': lat, 'lon': lon, 'weight': weight})
 
-traffic_data = generate_traffic_data()
+def tile_positions(latitudes, longitudes, zoom):
+    """x and y of the z/x/y web map tiles containing each point."""
+    n = 2 ** zoom
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    x = np.floor((np.asarray(longitudes, dtype=np.float64) + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+
+def write_tiles(hotspots, directory, zoom):
+    """
+    Writes the cells as one JSON file per z/x/y tile at `zoom`, with one array per column.
+    The files are written to a staging directory that then replaces `directory`.
+    Returns the [x, y] of every tile written.
+    """
+    staging_dir = f"{directory}.partial"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    xs, ys = tile_positions(hotspots['lat'], hotspots['lon'], zoom)
+    tiles = []
+    for (x, y), tile in hotspots.groupby([xs, ys], sort=True):
+        os.makedirs(os.path.join(staging_dir, str(zoom), str(x)), exist_ok=True)
+        with open(os.path.join(staging_dir, str(zoom), str(x), f"{y}.json"), 'w') as f:
+            json.dump({column: tile[column].tolist() for column in ('h3_cell', 'lat', 'lon', 'rides')}, f,
+                      separators=(',', ':'))
+        tiles.append([int(x), int(y)])
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(staging_dir, directory)
+    return tiles
 
 
 legend_html = '''
 {% macro html(this, kwargs) %}
 <div style="
-    position: fixed; 
+    position: fixed;
     bottom: 50px;
     left: 50px;
     width: 180px;
@@ -31,13 +121,13 @@ legend_html = '''
     box-shadow: 0 0 10px rgba(0,0,0,0.2);
     ">
     <p style="margin-top:0; font-weight:bold; text-align:center;">Traffic Key</p>
-    <div style="background: linear-gradient(to right, #0000ff, #00ffff, #ffff00, #ff0000); 
+    <div style="background: linear-gradient(to right, #0000ff, #00ffff, #ffff00, #ff0000);
                 height: 20px;
                 margin-bottom: 10px;
                 border-radius:3px;"></div>
     <div style="display: flex; justify-content: space-between; margin-bottom:5px;">
-        <span>Flowing</span>
-        <span>Gridlock</span>
+        <span>Few rides</span>
+        <span>Many rides</span>
     </div>
     <div style="border-top:1px solid #ddd; margin:8px 0; padding-top:8px;">
         <div style="display:flex; align-items:center; margin-bottom:4px;">
@@ -57,18 +147,86 @@ legend_html = '''
 {% endmacro %}
 '''
 
-def create_kenya_traffic_map(data, output_file="traffic_map.html"):
-   
-    m = folium.Map(location=[-1.286389, 36.817223], zoom_start=11, 
+# Loads the tiles overlapping the view as the map moves and redraws the heat layer with them.
+tile_loader_js = '''
+{% macro script(this, kwargs) %}
+(function() {
+    var map = {{ this.map_name }};
+    var heat = {{ this.heat_name }};
+    var tiles = {{ this.tiles|tojson }};
+    var loaded = {};
+
+    function tileX(lon, n) { return Math.floor((lon + 180) / 360 * n); }
+    function tileY(lat, n) {
+        var r = lat * Math.PI / 180;
+        return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+    }
+
+    function redraw() {
+        var points = [];
+        Object.keys(loaded).forEach(function(key) {
+            var tile = loaded[key];
+            if (!tile) { return; }
+            for (var i = 0; i < tile.rides.length; i++) {
+                points.push([tile.lat[i], tile.lon[i], tile.rides[i]]);
+            }
+        });
+        heat.setLatLngs(points);
+    }
+
+    function refresh() {
+        var bounds = map.getBounds(), n = Math.pow(2, {{ this.zoom }});
+        var minX = tileX(bounds.getWest(), n), maxX = tileX(bounds.getEast(), n);
+        var minY = tileY(bounds.getNorth(), n), maxY = tileY(bounds.getSouth(), n);
+        var pending = tiles.filter(function(tile) {
+            var key = tile[0] + '/' + tile[1];
+            return tile[0] >= minX && tile[0] <= maxX && tile[1] >= minY && tile[1] <= maxY && !(key in loaded);
+        }).map(function(tile) {
+            var key = tile[0] + '/' + tile[1];
+            loaded[key] = null;
+            return fetch({{ this.url|tojson }} + key + '.json')
+                .then(function(response) { return response.json(); })
+                .then(function(data) { loaded[key] = data; });
+        });
+        if (pending.length) { Promise.all(pending).then(redraw); }
+    }
+
+    map.on('moveend', refresh);
+    refresh();
+})();
+{% endmacro %}
+'''
+
+
+def create_kenya_traffic_map(hotspots, output_file=OUTPUT_FILE, zoom=DEFAULT_ZOOM, tiles_dir=None):
+    """
+    Saves the map with a heat point per cell centroid, weighted by its rides. With
+    `tiles_dir`, the points go to JSON tiles in that directory (next to the map) and
+    the page fetches the ones in view, instead of carrying every point inline.
+    """
+    m = folium.Map(location=NAIROBI_CENTER, zoom_start=zoom,
                   tiles='cartodbpositron', control_scale=True)
 
+    inline_points = [] if tiles_dir else hotspots[['lat', 'lon', 'rides']].values.tolist()
+    heatmap = HeatMap(inline_points,
+                      radius=HEAT_RADIUS,
+                      blur=8,
+                      gradient={0.1: 'blue', 0.3: 'cyan', 0.5: 'lime', 0.7: 'yellow', 1: 'red'},
+                      )
+    heatmap.add_to(m)
 
-    HeatMap(data[['lat', 'lon', 'weight']].values, 
-            radius=15, 
-            blur=8,
-            gradient={0.1: 'blue', 0.3: 'cyan', 0.5: 'lime', 0.7: 'yellow', 1: 'red'},
-            zoom=10
-           ).add_to(m)
+    if tiles_dir:
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        tiles = write_tiles(hotspots, os.path.join(output_dir, tiles_dir), zoom)
+        loader = MacroElement()
+        loader._template = Template(tile_loader_js)
+        loader.map_name = m.get_name()
+        loader.heat_name = heatmap.get_name()
+        loader.tiles = tiles
+        loader.zoom = zoom
+        loader.url = f"{tiles_dir.strip('/')}/{zoom}/"
+        m.get_root().add_child(loader)
+        print(f"Wrote {len(tiles)} data tiles to '{os.path.join(output_dir, tiles_dir)}'.")
 
 
     landmarks = [
@@ -76,14 +234,14 @@ def create_kenya_traffic_map(data, output_file="traffic_map.html"):
         {"name": "JKIA Airport", "coords": [-1.3192, 36.9278], "desc": "Jomo Kenyatta International Airport"},
         {"name": "KICC", "coords": [-1.2886, 36.8233], "desc": "Kenyatta International Convention Centre"}
     ]
-    
- 
+
+
     accident_zones = [
         {"name": "Thika Road", "coords": [-1.2136, 36.8997], "desc": "High accident rate area"},
         {"name": "Mombasa Road", "coords": [-1.3195, 36.8348], "desc": "Frequent truck accidents"}
     ]
-    
-  
+
+
     police_points = [
         {"name": "Ruiru Checkpoint", "coords": [-1.1475, 36.9638], "desc": "24/7 traffic police presence"},
         {"name": "Langata Road", "coords": [-1.3286, 36.8125], "desc": "Morning traffic control"}
@@ -96,14 +254,14 @@ def create_kenya_traffic_map(data, output_file="traffic_map.html"):
             popup=f"<b>{loc['name']}</b><br>{loc['desc']}",
             icon=folium.Icon(color="green", icon="info-sign")
         ).add_to(m)
-    
+
     for loc in accident_zones:
         folium.Marker(
             location=loc["coords"],
             popup=f"<b>⚠ {loc['name']}</b><br>{loc['desc']}",
             icon=folium.Icon(color="red", icon="exclamation-sign")
         ).add_to(m)
-    
+
     for loc in police_points:
         folium.Marker(
             location=loc["coords"],
@@ -111,14 +269,14 @@ def create_kenya_traffic_map(data, output_file="traffic_map.html"):
             icon=folium.Icon(color="blue", icon="flag")
         ).add_to(m)
 
- 
+
     macro = MacroElement()
     macro._template = Template(legend_html)
     m.get_root().add_child(macro)
 
-   
+
     title_html = '''
-    <h3 style="position:fixed; top:10px; left:50px; z-index:9999; 
+    <h3 style="position:fixed; top:10px; left:50px; z-index:9999;
     background-color:white; padding:10px; border-radius:5px;
     box-shadow:0 0 5px rgba(0,0,0,0.2); font-size:16px;">
     Nairobi Traffic Heatmap</h3>
@@ -128,4 +286,41 @@ def create_kenya_traffic_map(data, output_file="traffic_map.html"):
     m.save(output_file)
     print(f"Interactive Kenya traffic map saved to {output_file}")
 
-create_kenya_traffic_map(traffic_data)
\ No newline at end of file
+
+def generate_traffic_map(input_path=TRAIN_DATA_PATH, output_file=OUTPUT_FILE, zoom=DEFAULT_ZOOM, resolution=None,
+                         tiles_dir=None, chunksize=CHUNK_SIZE):
+    """
+    Builds the traffic map from an order CSV: pickups are counted per H3 cell at a
+    resolution that suits the zoom (unless given), and each cell becomes one heat point.
+    Returns the cells, their centroids and rides.
+    """
+    if resolution is None:
+        resolution = resolution_for_zoom(zoom)
+    cells, rides = count_rides_per_cell(input_path, resolution, chunksize)
+    hotspots = cell_centroids(cells)
+    hotspots['rides'] = rides
+    print(f"{int(rides.sum())} rides in {len(cells)} resolution-{resolution} cells.")
+    create_kenya_traffic_map(hotspots, output_file, zoom, tiles_dir)
+    return hotspots
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Nairobi traffic heatmap from order data.")
+    parser.add_argument('--input', default=TRAIN_DATA_PATH, help="Order CSV (same columns as Train.csv).")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="HTML file to write the map to.")
+    parser.add_argument('--zoom', type=int, default=DEFAULT_ZOOM, help="Initial map zoom; picks the H3 resolution.")
+    parser.add_argument('--resolution', type=int, help="H3 resolution to count rides at (default: from the zoom).")
+    parser.add_argument('--tiles-dir', help="Write the points as JSON tiles to this directory, next to the map, "
+                                            "instead of inline. The map must then be served over HTTP.")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_SIZE, help="Rows read per chunk.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.input):
+        print(f"Error: Cannot find order data at '{args.input}'.")
+        return
+
+    generate_traffic_map(args.input, args.output, args.zoom, args.resolution, args.tiles_dir, args.chunksize)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,68 +1,55 @@
-import pandas as pd
-import joblib
-import json
 import os
+import sys
+from functools import lru_cache
+
+# The predictor is shared with the API, in the backend package.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from services.prediction_service import Predictor  # noqa: E402
 
 #1.Define Paths to Saved Artifacts
 MODEL_DIR = './backend/ml_models/'
-MODEL_PATH = os.path.join(MODEL_DIR, 'catboost_model.joblib')
-SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.joblib')
-H3_MAP_PATH = os.path.join(MODEL_DIR, 'h3_categories.json')
+
+
+@lru_cache(maxsize=None)
+def load_predictor(model_dir: str = MODEL_DIR) -> Predictor:
+    """Loads the model artifacts once; later calls reuse them."""
+    predictor = Predictor.load(model_dir)
+    print("✅ Model and artifacts loaded successfully.")
+    return predictor
+
 
 def predict_demand(sample_input: dict):
     """
-    Loads model artifacts, preprocesses a single input, and returns a demand prediction.
-    
+    Predicts demand for a single input with the same predictor as the API.
+
     Args:
         sample_input (dict): A dictionary containing the features for prediction.
-    
+
     Returns:
         float: The predicted demand count.
     """
     try:
-        #2.Load the Model and Preprocessing Artifacts
-        model = joblib.load(MODEL_PATH)
-        scaler = joblib.load(SCALER_PATH)
-        with open(H3_MAP_PATH, 'r') as f:
-            h3_to_code_map = json.load(f)
-        
-        print("✅ Model and artifacts loaded successfully.")
-
+        #2.Load the Model and Preprocessing Artifacts (first call only)
+        predictor = load_predictor()
     except FileNotFoundError as e:
         print(f"❌ Error loading artifacts: {e}")
         print("Please ensure the model files exist in the './backend/ml_models/' directory.")
         return None
 
-    #3.Preprocess the Input Data
-    # Convert the sample input dictionary to a pandas DataFrame
-    input_df = pd.DataFrame([sample_input])
-    print("\nOriginal Input:")
-    print(input_df)
+    print("\nInput:")
+    print(sample_input)
 
-    # Scale the numerical feature ('business_ratio')
-    input_df['business_ratio'] = scaler.transform(input_df[['business_ratio']])
+    #3.Predict for the requested cell (scaling and feature preparation happen in the predictor)
+    prediction = predictor.predict_cell(int(sample_input['h3_cell'], 16), sample_input['day_of_week'],
+                                        sample_input['hour_of_day'], sample_input['business_ratio'])
 
-    # Ensure the categorical column 'h3_cell' has the correct data type.
-    # We must define all possible categories the model was trained on.
-    all_known_h3_cells = list(h3_to_code_map.keys())
-    input_df['h3_cell'] = pd.Categorical(input_df['h3_cell'], categories=all_known_h3_cells)
-    
     # Check if the h3_cell is valid (i.e., was seen during training)
-    if input_df['h3_cell'].isnull().any():
+    if prediction['is_fallback']:
         print(f"❌ Error: H3 cell '{sample_input['h3_cell']}' was not in the training data.")
         return None
 
-    # Ensure column order matches what the model was trained on
-    features_order = ['h3_cell', 'day_of_week', 'hour_of_day', 'business_ratio']
-    processed_input_df = input_df[features_order]
-
-    print("\nPreprocessed Input (ready for model):")
-    print(processed_input_df)
-
-    # --- 4. Make the Prediction ---
-    predicted_demand = model.predict(processed_input_df)
-    
-    return predicted_demand[0]
+    return prediction['predicted_demand']
 
 
 #This block runs when the script is executed directly
@@ -88,4 +75,4 @@ if __name__ == "__main__":
         print(f"Predicted Rounded Demand: {round(prediction)}")
         print("\nThis means the model predicts there will be approximately",
               f"{round(prediction)} ride requests in this specific zone at this time.")
-        print("="*30)
\ No newline at end of file
+        print("="*30)